@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+
+"""
+Assembler and linker for Curve25519 Engine microcode.
+
+The mnemonics, their codings and operands, the instruction fields and the constant
+ROM names all come from engine.py, so the assembler follows any change to the ISA.
+Source files hold one or more routines; each is linked into the 1k-word microcode
+store at its own `mpstart`, with its length as `mplen`:
+
+    ; r31 <- r0^4
+    .routine square2
+    .reg x r0
+        MUL r1, x, x
+        MUL r31, r1, r1
+        FIN
+
+    .routine select        ; r31 <- r0 if r2 == 0 else r1
+        PSA r31, r1
+        BRZ take_a, r2     ; BRZ target, Ra: branch if Ra == 0
+        FIN
+    take_a:
+        PSA r31, r0
+        FIN
+
+Operands are registers (`r0`-`r31`, or a name given with `.reg name rN`) and, for
+A and B, constant ROM entries (`#zero`, `#one`, `#field`, `#am24`, ...). BRZ takes a
+label in the same routine, or a raw offset. `.word` places a literal word.
+
+The sequencer only branches within [mpstart, mpstart + mplen - 1): a branch to the
+last instruction of a program stops it instead. When a routine branches to its last
+instruction, the linker appends a FIN, so the branch lands where it was meant to.
+`check` verifies the branches of linked (or hand-packed) microcode against that
+window.
+
+MLZ results are not members of the field until reduced by the TRD/SUB pair:
+
+    MLZ r2, r0, r1
+    TRD r3, r2
+    SUB r2, r2, r3
+
+The linker follows them along every path through a routine (registers are assumed
+reduced on entry), and rejects any other use of one than being moved or reduced, as
+well as a routine that can end (at FIN, or by running or branching out of it) with
+one still unreduced, as the host would read it back.
+
+    python3 -m gateware.curve25519.asm ladder.s inversion.s -o microcode.bin --table microcode.json --listing
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+from gateware.curve25519.engine import opcodes, num_registers, microcode_depth, constant_defs
+from gateware.curve25519.iss import Instruction, fields, track_lazy
+
+
+class AssemblerError(Exception):
+    pass
+
+
+constants = {const[1].replace(" ", "_").lower(): code for code, const in constant_defs.items()}
+mnemonics = {mnemonic for mnemonic, value in opcodes.items() if 0 <= value[0] < opcodes["MAX"][0]}
+
+
+def encode(mnemonic, **values):
+    """Pack an instruction; `values` are instruction_layout fields, others are 0"""
+    word = opcodes[mnemonic][0]
+    for name, value in values.items():
+        offset, bits = fields[name]
+        if name == "immediate":
+            if not -(1 << (bits - 1)) <= value < (1 << (bits - 1)):
+                raise AssemblerError("branch offset {} does not fit in {} bits".format(value, bits))
+            value &= (1 << bits) - 1
+        elif not 0 <= value < (1 << bits):
+            raise AssemblerError("{} value {} does not fit in {} bits".format(name, value, bits))
+        word |= value << offset
+    return word
+
+
+class Line():
+    """One statement of a routine, as parsed"""
+    def __init__(self, location, mnemonic, operands, source):
+        self.location = location
+        self.mnemonic = mnemonic
+        self.operands = operands
+        self.source = source
+
+    def error(self, message):
+        return AssemblerError("{}: {}".format(self.location, message))
+
+
+class Routine():
+    def __init__(self, name, location):
+        self.name = name
+        self.location = location
+        self.lines = []
+        self.labels = {}
+        self.registers = {}
+
+    def __len__(self):
+        return len(self.lines)
+
+    def register(self, line, token, allow_const):
+        token = token.strip()
+        if token.startswith("#"):
+            if not allow_const:
+                raise line.error("{} can't be written".format(token))
+            name = token[1:].lower()
+            if name not in constants:
+                raise line.error("unknown constant {}; the constant ROM has {}".format(
+                    token, ", ".join("#" + n for n in constants)))
+            return constants[name], 1
+        token = self.registers.get(token, token)
+        match = re.fullmatch(r"[rR](\d+)", token)
+        if match is None or int(match.group(1)) >= num_registers:
+            raise line.error("{} is not a register".format(token))
+        return int(match.group(1)), 0
+
+    def encode(self, index, line):
+        """The microcode word for statement `index`"""
+        if line.mnemonic == ".word":
+            return line.operands[0]
+        names = opcodes[line.mnemonic][2]
+        if len(line.operands) != len(names):
+            raise line.error("{} takes {} operand(s): {}".format(line.mnemonic, len(names), ", ".join(names) or "none"))
+        values = {}
+        for name, token in zip(names, line.operands):
+            if name == "wd":
+                values["wd"], _ = self.register(line, token, allow_const=False)
+            elif name in ("ra", "rb"):
+                values[name], values["c" + name[1]] = self.register(line, token, allow_const=True)
+            elif name == "immediate":
+                if token in self.labels:
+                    values["immediate"] = self.labels[token] - (index + 1)
+                else:
+                    try:
+                        values["immediate"] = int(token, 0)
+                    except ValueError:
+                        raise line.error("unknown label {} (branches can't leave their routine)".format(token)) from None
+        try:
+            return encode(line.mnemonic, **values)
+        except AssemblerError as e:
+            raise line.error(str(e)) from None
+
+    def words(self):
+        words = [self.encode(index, line) for index, line in enumerate(self.lines)]
+        # the sequencer stops on a branch to the last instruction of a program, so
+        # give such branches an instruction to land on
+        last = len(self.lines) - 1
+        if any(line.mnemonic == "BRZ" and Instruction(words[index]).offset + index + 1 == last
+               for index, line in enumerate(self.lines)):
+            words.append(encode("FIN"))
+        return words
+
+
+def parse(text, filename="<string>"):
+    """Parse assembler source into routines; statements before the first `.routine`
+    form a routine named after the file"""
+    routines = []
+    routine = None
+    registers = {}
+    for number, raw in enumerate(text.splitlines(), 1):
+        location = "{}:{}".format(filename, number)
+        source = re.split(r";|//", raw, 1)[0].strip()
+        match = re.match(r"([A-Za-z_]\w*)\s*:\s*(.*)$", source)
+        label = None
+        if match is not None:
+            label, source = match.group(1), match.group(2)
+        if routine is None and (label or (source and not source.lower().startswith((".routine", ".reg")))):
+            routine = Routine(os.path.splitext(os.path.basename(filename))[0], location)
+            routine.registers = registers
+            routines.append(routine)
+        if label is not None:
+            if label in routine.labels:
+                raise AssemblerError("{}: label {} is already defined".format(location, label))
+            routine.labels[label] = len(routine.lines)
+        if not source:
+            continue
+        tokens = source.split(None, 1)
+        keyword = tokens[0].lower()
+        rest = tokens[1] if len(tokens) > 1 else ""
+        if keyword == ".routine":
+            if not re.fullmatch(r"[A-Za-z_]\w*", rest.strip()):
+                raise AssemblerError("{}: .routine needs a name".format(location))
+            routine = Routine(rest.strip(), location)
+            routine.registers = dict(registers)
+            routines.append(routine)
+        elif keyword == ".reg":
+            parts = rest.replace(",", " ").split()
+            if len(parts) != 2 or not re.fullmatch(r"[rR]\d+", parts[1]) or int(parts[1][1:]) >= num_registers:
+                raise AssemblerError("{}: expected .reg NAME rN".format(location))
+            (routine.registers if routine is not None else registers)[parts[0]] = parts[1]
+        elif keyword == ".word":
+            try:
+                value = int(rest, 0)
+            except ValueError:
+                raise AssemblerError("{}: .word needs a number".format(location)) from None
+            routine.lines.append(Line(location, ".word", [value & 0xFFFF_FFFF], raw.strip()))
+        elif keyword.upper() in mnemonics:
+            operands = [token.strip() for token in rest.split(",")] if rest.strip() else []
+            routine.lines.append(Line(location, keyword.upper(), operands, raw.strip()))
+        else:
+            raise AssemblerError("{}: unknown instruction {}".format(location, tokens[0]))
+    for routine in routines:
+        if not routine.lines:
+            raise AssemblerError("{}: routine {} is empty".format(routine.location, routine.name))
+    return routines
+
+
+def check(words, mpstart, mplen):
+    """Problems with the program at [mpstart, mpstart + mplen) of `words` (a whole
+    microcode store), as the sequencer would run it: illegal opcodes, and branches
+    that would stop the program instead of landing in it"""
+    problems = []
+    if not 0 < mplen < microcode_depth or mpstart + mplen > microcode_depth:
+        return ["mplen {} at mpstart 0x{:03x} does not fit the {}-word microcode store".format(mplen, mpstart, microcode_depth)]
+    mpc_stop = mpstart + mplen - 1
+    for mpc in range(mpstart, mpstart + mplen):
+        instruction = Instruction(words[mpc])
+        if instruction.mnemonic is None:
+            problems.append("0x{:03x}: illegal opcode {}".format(mpc, instruction.opcode))
+        elif instruction.mnemonic == "BRZ":
+            target = (mpc + 1 + instruction.offset) & (microcode_depth - 1)
+            if not mpstart <= target < mpc_stop:
+                problems.append("0x{:03x}: BRZ target 0x{:03x} is outside [0x{:03x}, 0x{:03x}), where the sequencer can branch".format(
+                    mpc, target, mpstart, mpc_stop))
+    return problems
+
+
+def lazy_flow(words):
+    """Follow unreduced MLZ results through a routine, both ways of every branch. Returns
+    (index, register) for each instruction that may read one as a field element, and
+    for each instruction that ends the routine (FIN, or running or branching out of it)
+    while a register may still hold one"""
+    instructions = [Instruction(word) for word in words]
+    entry = {0: {}}
+    pending = [0]
+    found = set()
+    exits = set()
+    while pending:
+        index = pending.pop()
+        state = dict(entry[index])
+        instruction = instructions[index]
+        found.update((index, reg) for reg in track_lazy(instruction, state))
+        unreduced = [reg for reg, tag in state.items() if tag == "lazy"]
+        if instruction.mnemonic == "FIN":
+            exits.update((index, reg) for reg in unreduced)
+            continue
+        if instruction.mnemonic is None:
+            continue
+        successors = [index + 1]
+        if instruction.mnemonic == "BRZ":
+            successors.append(index + 1 + instruction.offset)
+        for successor in successors:
+            if not 0 <= successor < len(instructions):
+                exits.update((index, reg) for reg in unreduced)
+                continue
+            merged = state
+            if successor in entry:
+                # lazy on any path is lazy; a TRD is only known if it is on every path
+                before = entry[successor]
+                merged = {reg: "lazy" if "lazy" in (before.get(reg), state.get(reg)) else before.get(reg)
+                          for reg in set(before) | set(state)
+                          if "lazy" in (before.get(reg), state.get(reg)) or before.get(reg) == state.get(reg)}
+                if merged == before:
+                    continue
+            entry[successor] = merged
+            pending.append(successor)
+    return sorted(found), sorted(exits)
+
+
+def lazy_reads(words):
+    """(index, register) for each instruction of a routine that may read an unreduced
+    MLZ result as a field element"""
+    return lazy_flow(words)[0]
+
+
+def lazy_exits(words):
+    """(index, register) for each instruction of a routine that may end it with an
+    unreduced MLZ result left in a register, for the host to read"""
+    return lazy_flow(words)[1]
+
+
+class Image():
+    """Linked microcode: the store's contents, and {routine: (mpstart, mplen)}"""
+    def __init__(self):
+        self.words = []
+        self.table = {}
+        self.listing = []
+
+    def write_bin(self, path):
+        with open(path, "wb") as f:
+            for word in self.words:
+                f.write(word.to_bytes(4, "little"))
+
+    def write_table(self, path):
+        with open(path, "w") as f:
+            json.dump({name: {"mpstart": start, "mplen": length} for name, (start, length) in self.table.items()}, f, indent=1)
+
+    def write_rust(self, path):
+        """A Rust module with the microcode and the start and length of each routine"""
+        with open(path, "w") as f:
+            f.write("// generated by gateware/curve25519/asm.py; do not edit\n")
+            f.write("pub const MICROCODE: [u32; {}] = [\n".format(len(self.words)))
+            for index in range(0, len(self.words), 8):
+                f.write("    " + " ".join("0x{:08x},".format(word) for word in self.words[index:index + 8]) + "\n")
+            f.write("];\n")
+            for name, (start, length) in self.table.items():
+                f.write("pub const {}_START: u32 = 0x{:03x};\n".format(name.upper(), start))
+                f.write("pub const {}_LEN: u32 = {};\n".format(name.upper(), length))
+
+
+def link(routines, base=0):
+    """Place the routines one after the other from `base`, and check them"""
+    image = Image()
+    image.words = [0] * base
+    for routine in routines:
+        if routine.name in image.table:
+            raise AssemblerError("{}: routine {} is already defined".format(routine.location, routine.name))
+        words = routine.words()
+        misused, left = lazy_flow(words)
+        if misused:
+            index, reg = misused[0]
+            raise routine.lines[index].error("r{} may hold an MLZ result that is not reduced (TRD, then SUB) yet".format(reg))
+        if left:
+            index, reg = left[0]
+            line = routine.lines[min(index, len(routine.lines) - 1)]
+            raise line.error("r{} may still hold an MLZ result that is not reduced (TRD, then SUB) when the routine ends".format(reg))
+        start = len(image.words)
+        if start + len(words) > microcode_depth:
+            raise AssemblerError("{}: routine {} does not fit; {} words are left in the microcode store".format(
+                routine.location, routine.name, microcode_depth - start))
+        image.words += words
+        image.table[routine.name] = (start, len(words))
+        image.listing.append("{}:".format(routine.name))
+        for index, word in enumerate(words):
+            source = routine.lines[index].source if index < len(routine.lines) else "(padding)"
+            image.listing.append("  0x{:03x}  {:08x}  {:28}  {}".format(start + index, word, str(Instruction(word)), source))
+    for name, (start, length) in image.table.items():
+        problems = check(image.words + [0] * (microcode_depth - len(image.words)), start, length)
+        if problems:
+            raise AssemblerError("routine {}: {}".format(name, "; ".join(problems)))
+    return image
+
+
+def assemble(text, filename="<string>", base=0):
+    return link(parse(text, filename), base)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assemble and link Curve25519 Engine microcode")
+    parser.add_argument("sources", nargs="+", help="Assembler files; their routines are linked in order")
+    parser.add_argument("-o", "--output", help="Write the microcode image here (little-endian 32-bit words)")
+    parser.add_argument("--table", help="Write the {routine: mpstart, mplen} table here, as JSON")
+    parser.add_argument("--rust", help="Write the image and the table here, as a Rust module")
+    parser.add_argument("--base", type=lambda x: int(x, 0), default=0, help="Address of the first routine")
+    parser.add_argument("--listing", action="store_true", help="Print the linked program")
+    args = parser.parse_args()
+
+    routines = []
+    try:
+        for path in args.sources:
+            with open(path) as f:
+                routines += parse(f.read(), path)
+        image = link(routines, args.base)
+    except AssemblerError as e:
+        print("error: {}".format(e))
+        return 1
+    if args.output:
+        image.write_bin(args.output)
+    if args.table:
+        image.write_table(args.table)
+    if args.rust:
+        image.write_rust(args.rust)
+    if args.listing:
+        print("\n".join(image.listing))
+    for name, (start, length) in image.table.items():
+        print("{:24} mpstart 0x{:03x} mplen {}".format(name, start, length))
+    print("{} of {} words used".format(len(image.words), microcode_depth))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
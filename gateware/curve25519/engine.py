@@ -10,25 +10,29 @@ prime_string = "$2^{{255}}-19$"  # 2\ :sup:`255`-19
 field_latex = "$\mathbf{{F}}_{{{{2^{{255}}}}-19}}$"
 
 opcode_bits = 6  # number of bits used to encode the opcode field
-opcodes = {  # mnemonic : [bit coding, docstring]
-    "UDF" : [-1, "Placeholder for undefined opcodes"],
-    "PSA" : [0, "Wd $\gets$ Ra  // pass A"],
-    "PSB" : [1, "Wd $\gets$ Rb  // pass B"],
-    "MSK" : [2, "Wd $\gets$ Replicate(Ra[0], 256) & Rb  // for doing cswap()"],
-    "XOR" : [3, "Wd $\gets$ Ra ^ Rb  // bitwise XOR"],
-    "NOT" : [4, "Wd $\gets$ ~Ra   // binary invert"],
-    "ADD" : [5, "Wd $\gets$ Ra + Rb  // 256-bit binary add, must be followed by TRD,SUB"],
-    "SUB" : [6, "Wd $\gets$ Ra - Rb  // 256-bit binary subtraction, this is not the same as a subtraction in the finite field"],
-    "MUL" : [7, f"Wd $\gets$ Ra * Rb  // multiplication in {field_latex} - result is reduced"],
-    "TRD" : [8, "If Ra $\geqq 2^{{255}}-19$ then Wd $\gets$ $2^{{255}}-19$, else Wd $\gets$ 0  // Test reduce"],
-    "BRZ" : [9, "If Ra == 0 then mpc[9:0] $\gets$ mpc[9:0] + immediate[9:0] + 1, else mpc $\gets$ mpc + 1  // Branch if zero"],
-    "FIN" : [10, "halt execution and assert interrupt to host CPU that microcode execution is done"],
-    "SHL" : [11, "Wd $\gets$ Ra << 1  // shift Ra left by one and store in Wd"],
-    "XBT" : [12, "Wd[0] $\gets$ Ra[254]  // extract the 255th bit of Ra and put it into the 0th bit of Wd"],
-    "MAX" : [13, "Maximum opcode number (for bounds checking)"],
+opcodes = {  # mnemonic : [bit coding, docstring, operands in assembler order]
+    "UDF" : [-1, "Placeholder for undefined opcodes", []],
+    "PSA" : [0, "Wd $\gets$ Ra  // pass A", ["wd", "ra"]],
+    "PSB" : [1, "Wd $\gets$ Rb  // pass B", ["wd", "rb"]],
+    "MSK" : [2, "Wd $\gets$ Replicate(Ra[0], 256) & Rb  // for doing cswap()", ["wd", "ra", "rb"]],
+    "XOR" : [3, "Wd $\gets$ Ra ^ Rb  // bitwise XOR", ["wd", "ra", "rb"]],
+    "NOT" : [4, "Wd $\gets$ ~Ra   // binary invert", ["wd", "ra"]],
+    "ADD" : [5, "Wd $\gets$ Ra + Rb  // 256-bit binary add, must be followed by TRD,SUB", ["wd", "ra", "rb"]],
+    "SUB" : [6, "Wd $\gets$ Ra - Rb  // 256-bit binary subtraction, this is not the same as a subtraction in the finite field", ["wd", "ra", "rb"]],
+    "MUL" : [7, f"Wd $\gets$ Ra * Rb  // multiplication in {field_latex} - result is reduced", ["wd", "ra", "rb"]],
+    "TRD" : [8, "If Ra $\geqq 2^{{255}}-19$ then Wd $\gets$ $2^{{255}}-19$, else Wd $\gets$ 0  // Test reduce", ["wd", "ra"]],
+    "BRZ" : [9, "If Ra == 0 then mpc[9:0] $\gets$ mpc[9:0] + immediate[9:0] + 1, else mpc $\gets$ mpc + 1  // Branch if zero", ["immediate", "ra"]],
+    "FIN" : [10, "halt execution and assert interrupt to host CPU that microcode execution is done", []],
+    "SHL" : [11, "Wd $\gets$ Ra << 1  // shift Ra left by one and store in Wd", ["wd", "ra"]],
+    "XBT" : [12, "Wd[0] $\gets$ Ra[254]  // extract the 255th bit of Ra and put it into the 0th bit of Wd", ["wd", "ra"]],
+    "MLZ" : [13, f"Wd $\gets$ Ra * Rb  // lazy MUL: congruent to the product in {field_latex}, but without the final carry propagate, so up to 256 bits; reduce with TRD, SUB", ["wd", "ra", "rb"]],
+    "MAX" : [14, "Maximum opcode number (for bounds checking)", []],
 }
 
 num_registers = 32
+rf_depth = 512  # 256-bit registers in the register file, i.e. 16 windows of num_registers
+microcode_width = 32
+microcode_depth = 1024
 instruction_layout = [
     ("opcode", opcode_bits, "opcode to be executed"),
     ("ra", log2_int(num_registers), "operand A read register"),
@@ -214,21 +218,21 @@ an address width of 9 bits.
             )
         ]
 
+constant_defs = {  # constant ROM address : [value, name, docstring]
+    0: [0, "zero", "The number zero"],
+    1: [1, "one", "The number one"],
+    2: [121665, "am24", "The value $\\frac{{A-2}}{{4}}$"],
+    3: [0x7FFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFED, "field", f"Binary coding of {prime_string}"],
+    4: [121666, "ap24", "The value $\\frac{{A+2}}{{4}}$"],
+    5: [5, "five", "The number 5 (for pow22501)"],
+    6: [10, "ten", "The number 10 (for pow22501)"],
+    7: [20, "twenty", "The number 20 (for pow22501)"],
+    8: [50, "fifty", "The number 50 (for pow22501)"],
+    9: [100, "one hundred", "The number 100 (for pow22501)"],
+}
+
 class Curve25519Const(Module, AutoDoc):
     def __init__(self, insert_docs=False):
-        global did_const_doc
-        constant_defs = {
-            0: [0, "zero", "The number zero"],
-            1: [1, "one", "The number one"],
-            2: [121665, "am24", "The value $\\frac{{A-2}}{{4}}$"],
-            3: [0x7FFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFFF_FFED, "field", f"Binary coding of {prime_string}"],
-            4: [121666, "ap24", "The value $\\frac{{A+2}}{{4}}$"],
-            5: [5, "five", "The number 5 (for pow22501)"],
-            6: [10, "ten", "The number 10 (for pow22501)"],
-            7: [20, "twenty", "The number 20 (for pow22501)"],
-            8: [50, "fifty", "The number 50 (for pow22501)"],
-            9: [100, "one hundred", "The number 100 (for pow22501)"],
-        }
         self.adr = Signal(5)
         self.const = Signal(256)
         constant_str = "This module encodes the constants that can be substituted for any register value. Therefore, up to 32 constants can be encoded.\n\n"
@@ -442,7 +446,7 @@ Thus the reduction algorithm is as follows:
 
 class ExecMul(ExecUnit, AutoDoc):
     def __init__(self, width=256, sim=False):
-        ExecUnit.__init__(self, width, ["MUL"])
+        ExecUnit.__init__(self, width, ["MUL", "MLZ"])
 
         self.sync.eng_clk += [ # pipeline the instruction
             self.instruction_out.eq(self.instruction_in),
@@ -484,9 +488,22 @@ compute the TRD/SUB combination, whereas iterating through the carry propagates
 would take 140ns total (as the mul core runs 2x clock speed of the rest of the engine).
 This is basically a wash.
 
-However, if pipelining (and bypassing) were implemented, this might become a viable
-optimization, but bypassing such a wide core would also have resource and speed
-implications of its own.
+However, with the pipelined sequencer it becomes a viable optimization, so the `MLZ` ("lazy"
+multiply) opcode stops after the first carry propagate: it skips steps 4-6, finishing in 38
+`mul_clk` cycles instead of 52, and returns the 256-bit result of step 3. This is congruent
+to the product but not a member of {field_latex}: bit 255 is frequently set. Reducing it
+with the usual pair::
+
+  MLZ  Rc, Ra, Rb   // Rc <- Ra * Rb, unreduced
+  TRD  Rd, Rc       // Rd <- ReductionValue(Rc)
+  SUB  Rc, Rc, Rd   // Rc <- Rc - Rd
+
+gives exactly the result of `MUL`, as subtracting {prime_string} from a 256-bit number is
+the same as adding 19 and dropping bit 255. The two extra instructions cost a cycle each,
+and can be issued while another multiply is in flight. The multiplier ignores bit 255 of its
+operands, so an unreduced result must not be used in any other way (except for being moved
+with PSA/PSB) until it is reduced: `asm.py` rejects microcode that does, and `iss.py` reports it.
+The time taken does not depend on the data, as for `MUL`.
 
 The above steps are coordinated by the `mseq` state machine. Control lines for
 the DSP48E blocks are grouped into two sets, one controls the global state of
@@ -1008,12 +1025,14 @@ carries that have already been propagated. If we fail to do this, then we re-pro
 
         start_pipe = Signal()
         self.sync.mul_clk += start_pipe.eq(self.start) # break critical path of instruction decode -> SETUP_A state muxes
+        lazy = Signal() # MLZ: skip the normalization
         self.submodules.mseq = mseq = ClockDomainsRenamer("mul_clk")(FSM(reset_state="IDLE"))
         mseq.act("IDLE",
             NextValue(step, 0),
             NextValue(prop, 0),
             If(start_pipe,
-                NextState("SETUP_A")
+                NextState("SETUP_A"),
+                NextValue(lazy, self.instruction.opcode == opcodes["MLZ"][0]),
             )
         )
         mseq.act("SETUP_A", # SETA, load the a, a19 values values
@@ -1040,8 +1059,12 @@ carries that have already been propagated. If we fail to do this, then we re-pro
         mseq.act("CARRYPROP", # PROP
             If( step == 13,
                If( prop == 0,
-                   NextState("NORMALIZE"),
-                   NextValue(step, 0),
+                   If(lazy,
+                       NextState("LAZY_DONE"),
+                   ).Else(
+                       NextState("NORMALIZE"),
+                       NextValue(step, 0),
+                   )
                ).Else(
                    NextState("DONE"),  # if modifying to the "DONE" state, change q-latch statement at the end
                )
@@ -1054,6 +1077,9 @@ carries that have already been propagated. If we fail to do this, then we re-pro
             NextValue(prop, 1),
             NextValue(step, 0),
         )
+        mseq.act("LAZY_DONE", # LZY - skipping NORMALIZE and the second CARRYPROP is 15 states, so burn one to stay in phase with eng_clk
+            NextState("DONE"),
+        )
         ### note that the post-amble "manually" aligns the mul_clk to eng_clk phases
         ### this can have one of two outcomes if the previous number of states is even or odd
         ### in this case, we end up phase mis-aligned, so we have to burn a dummy cycle to sync clocks
@@ -1388,6 +1414,12 @@ carries that have already been propagated. If we fail to do this, then we re-pro
                     self.q[i * 17:i * 17 + 17].eq(self.q[i * 17:i * 17 + 17]),
                 ),
             ]
+        # the carry out of the top limb is bit 255 of an MLZ result; a normalized MUL result never has it
+        self.sync.mul_clk += [
+            If(mseq.ongoing("DONE"),
+                self.q[255].eq(lazy & self.dsp_p14[17]),
+            )
+        ]
         # whether we are asserting on DONE/DONE2 or DONE2/DONE3 depends on even/odd # of states previously spent to compute the mul
         self.sync.mul_clk += [
             If(mseq.ongoing("DONE2") | mseq.ongoing("DONE3"),
@@ -1419,10 +1451,11 @@ carries that have already been propagated. If we fail to do this, then we re-pro
 
 
 class Engine(Module, AutoCSR, AutoDoc):
-    def __init__(self, platform, prefix, sim=False, build_prefix=""):
+    def __init__(self, platform, prefix, sim=False, build_prefix="", pipelined=False):
         opdoc = "\n"
         for mnemonic, description in opcodes.items():
-            opdoc += f" * **{mnemonic}** ({str(description[0])}) -- {description[1]} \n"
+            syntax = " ".join([mnemonic, ", ".join(description[2])]).strip()
+            opdoc += f" * **{mnemonic}** ({str(description[0])}) `{syntax}` -- {description[1]} \n"
 
         self.intro = ModuleDoc(title="Curve25519 Engine", body="""
 The Curve25519 engine is a microcoded hardware accelerator for Curve25519 operations.
@@ -1475,21 +1508,31 @@ to the execution units.
 
 Note that execution units can take an arbitrary amount of time to complete. Most will complete
 in one cycle, but for example, the multiplier takes 52 cycles @ 100MHz, or 26 `eng_clk` cycles.
-The current implementation does not allow pipelined operation; registered stages are provided
+By default the Engine does not pipeline; registered stages are provided
 to break combinational paths and bring up the base clock rate, but every instruction must go through
 the entire FETCH-EXEC-WAIT_DONE cycle before the next one can issue.
 
-The design is partially outfitted with registers to facilitate pipelining in the future, but
-the current simplified implementation is expected to provide adequate speedup. It's
-probably not worth the additional resources to do e.g. pipeline bypassing and hazard checking,
-as the target FPGA design is nearly at capacity.
+Built with `pipelined=True`, the sequencer instead fetches the next instruction while the current
+one issues from an instruction register, and the execution units overlap: a single-cycle unit
+(`ExecLogic`, `ExecAddSub`, `ExecMask`, `ExecTestReduce`) has its operands registered at issue, and
+computes its result from them on the next cycle, as it is written back, while a `MUL` runs in the
+background and writes back when it is done. A scoreboard of the two writes in flight holds issue on
+a read-after-write or write-after-write hazard against them, on a second `MUL`, and when a
+single-cycle result would collide with the `MUL` write-back. Thus instructions that don't depend
+on a `MUL` issue one per `eng_clk` while it runs. Stalls depend only on the register numbers in the microcode, never on the data, and `BRZ` tests
+`Ra` on the cycle after it issues and then refetches whether or not it is taken, so a program still
+runs in constant time; `iss.py` computes the cycle count for either build. There is no bypassing,
+and no other hazard checking: the cost is the instruction register, the scoreboard and the 256-bit
+operand and `Rb` holding registers. The single-cycle units then have from the start of the write-back
+cycle to the register file write in its phase 2, instead of the remainder of the cycle after `Rb`
+is read out in phase 2.
 
 A conservative implementation (no optimization of intermediate values, immediate reduction of
 every add/sub operation) of Montgomery scalar multiplication using Engine25519
 completes one scalar multiply operation in 2.270ms, compared to 103ms in software.
 This does not include the time required to do the final affine inversion (done in software,
 with significant overhead -- about 100ms), or the time to load the microcode and operands (about 5us).
-The affine inversion can also be microcoded, it just hasn't been done yet.
+The affine inversion is microcoded in `x25519.py`, by Fermat's little theorem, along with the ladder.
 
 The Engine address space is divided up as follows (expressed as offset from base)::
 
@@ -1500,15 +1543,15 @@ Here are the currently implemented opcodes for The Engine:
 {}
         """.format(opdoc))
 
-        microcode_width = 32
-        microcode_depth = 1024
         running = Signal() # asserted when microcode is running
 
         instruction = Record(instruction_layout) # current instruction to execute
+        # instruction that issues: in pipelined mode, the instruction register, while the next one is fetched
+        ir = Record(instruction_layout) if pipelined else instruction
         illegal_opcode = Signal()
 
         ### register file
-        rf_depth_raw = 512
+        rf_depth_raw = rf_depth
         rf_width_raw = 256
         self.submodules.rf = rf = RegisterFile(depth=rf_depth_raw, width=rf_width_raw)
         self.window = CSRStorage(fields=[
@@ -1714,10 +1757,10 @@ Here are the currently implemented opcodes for The Engine:
 
         ### merge execution path signals with host access paths
         self.comb += [
-            ra_const.eq(instruction.ca),
-            rb_const.eq(instruction.cb),
-            ra_adr.eq(instruction.ra),
-            rb_adr.eq(instruction.rb),
+            ra_const.eq(ir.ca),
+            rb_const.eq(ir.cb),
+            ra_adr.eq(ir.ra),
+            rb_adr.eq(ir.rb),
             self.ra_const_rom.adr.eq(ra_adr),
             self.rb_const_rom.adr.eq(rb_adr),
             rf.window.eq(self.window.fields.window),
@@ -1725,7 +1768,7 @@ Here are the currently implemented opcodes for The Engine:
             If(running & ~pause_gnt,
                 rf.ra_adr.eq(Cat(ra_adr, self.window.fields.window)),
                 rf.rb_adr.eq(Cat(rb_adr, self.window.fields.window)),
-                rf.instruction_pipe_in.eq(instruction.raw_bits()),
+                rf.instruction_pipe_in.eq(ir.raw_bits()),
                 rf.wd_adr.eq(Cat(wd_adr, self.window.fields.window)),
                 rf.wd_dat.eq(wd_dat),
                 rf.wd_bwe.eq(0xFFFF_FFFF), # enable all bytes
@@ -1767,7 +1810,7 @@ Here are the currently implemented opcodes for The Engine:
         ]
 
         sext_immediate = Signal(log2_int(microcode_depth))
-        self.comb += sext_immediate.eq(Cat(instruction.immediate, instruction.immediate[8])) # migen signed math failed us. so manually sign extend. this breaks the configurability of the code.
+        self.comb += sext_immediate.eq(Cat(ir.immediate, ir.immediate[8])) # migen signed math failed us. so manually sign extend. this breaks the configurability of the code.
 
         ### Microcode sequencer. Very simple: it can only run linear sections of microcode. Feature not bug;
         ### constant time operation is a defense against timing attacks.
@@ -1809,64 +1852,182 @@ Here are the currently implemented opcodes for The Engine:
                 NextValue(running, 0),
             )
         )
-        seq.act("FETCH",
-            If(pause_req,
-                NextState("PAUSED"),
-                NextValue(pause_gnt, 1),
-            ).Else(
-                # one cycle latency for instruction fetch
-                NextState("EXEC"),
-                NextValue(pause_gnt, 0),
-            )
-        )
-        seq.act("EXEC", # not a great name. This is actually where the register file fetches its contents.
-            If(instruction.opcode == opcodes["BRZ"][0],
-                NextState("DO_BRZ"),
-            ).Elif(instruction.opcode == opcodes["FIN"][0],
-                NextState("IDLE"),
-                NextValue(running, 0),
-            ).Elif(instruction.opcode < opcodes["MAX"][0], # check if the opcode is legal before running it
-                exec.eq(1),
-                NextState("WAIT_DONE"),
-            ).Else(
-                NextState("ILLEGAL_OPCODE"),
-            )
-        )
-        seq.act("WAIT_DONE", # this is where the actual instruction execution happens.
-            If(done, # TODO: for now, we just wait for each instruction to finish; but the foundations are around for pipelining...
+        if pipelined:
+            # `ir` holds the instruction that issues in RUN, while the microcode port fetches the next one at mpc.
+            # A single-cycle instruction has its operands registered at issue, and is computed from them and
+            # written back on the next cycle: Rb is only read out in phase 2, so there is no time to compute
+            # the result within the issue cycle. A MUL runs in the background and writes back when done; the
+            # write port gives it priority, so a single-cycle result due on the same cycle waits one more. The
+            # scoreboard holds issue until the operands and the write port are free. This only depends on
+            # register numbers, so timing is still data-independent.
+            ir_word = Signal(microcode_width)
+            ir_pc = Signal(log2_int(microcode_depth))  # address of the instruction in `ir`
+            ir_last = Signal()  # `ir` is the last instruction of the program
+            self.comb += ir.raw_bits().eq(ir_word)
+            res_valid = Signal()  # a single-cycle result is waiting for write-back
+            res_ir = Record(instruction_layout)  # its instruction and operands
+            res_ir_word = Signal(microcode_width)
+            res_a = Signal(rf_width_raw)
+            res_b = Signal(rf_width_raw)
+            res_q = Signal(rf_width_raw)  # the output of the single-cycle unit that `res_ir` selects
+            self.comb += res_ir.raw_bits().eq(res_ir_word)
+            ra_zero = Signal()  # the BRZ test, which has a multicycle path constraint
+            self.comb += ra_zero.eq(ra_dat == 0)
+            mul_busy = Signal()  # a MUL is in flight
+            mul_wd = Signal(log2_int(num_registers))
+            mul_b = Signal(rf_width_raw)  # the multiplier loads Ra as it starts, but reads Rb for a few more cycles
+            mul_done = Signal()
+            reads_a = Signal()
+            reads_b = Signal()
+            writes = Signal()
+            is_mul = Signal()
+            stall = Signal()
+            for mnemonic, (code, description, operands) in opcodes.items():
+                if 0 <= code < opcodes["MAX"][0]:
+                    self.comb += [
+                        If(ir.opcode == code,
+                            reads_a.eq(int("ra" in operands)),
+                            reads_b.eq(int("rb" in operands)),
+                            writes.eq(int("wd" in operands)),
+                        )
+                    ]
+            def in_flight(adr):
+                return (res_valid & (adr == res_ir.wd)) | (mul_busy & (adr == mul_wd))
+            self.comb += [
+                is_mul.eq((ir.opcode == opcodes["MUL"][0]) | (ir.opcode == opcodes["MLZ"][0])),
+                stall.eq(
+                    (reads_a & ~ir.ca & in_flight(ir.ra)) |  # read after write
+                    (reads_b & ~ir.cb & in_flight(ir.rb)) |
+                    (writes & mul_busy & (ir.wd == mul_wd)) |  # write after write: the MUL would land last
+                    (is_mul & mul_busy) |  # one multiplier
+                    (writes & res_valid & mul_done)  # the write port is taken by the MUL and the result it deferred
+                ),
+            ]
+            fetch = [
+                NextValue(ir_word, instruction.raw_bits()),
+                NextValue(ir_pc, mpc),
                 If(mpc < mpc_stop,
-                   NextState("FETCH"),
-                   NextValue(mpc, mpc + 1),
+                    NextValue(mpc, mpc + 1),
+                    NextValue(ir_last, 0),
                 ).Else(
-                    NextState("IDLE"),
-                    NextValue(running, 0),
+                    NextValue(ir_last, 1),
+                ),
+            ]
+            seq.act("FETCH",
+                If(pause_req,
+                    If(~res_valid & ~mul_busy, # writes in flight land before the host gets the register file
+                        NextState("PAUSED"),
+                        NextValue(pause_gnt, 1),
+                    )
+                ).Else(
+                    # one cycle latency for instruction fetch
+                    NextState("RUN"),
+                    NextValue(pause_gnt, 0),
+                    *fetch
                 )
             )
-        )
-        seq.act("ILLEGAL_OPCODE",
-            NextState("IDLE"),
-            NextValue(running, 0),
-            illegal_opcode.eq(1),
-        )
-        seq.act("DO_BRZ",
-            If(ra_dat == 0,
-                If( (sext_immediate + mpc + 1 < mpc_stop) & (sext_immediate + mpc + 1 >= self.mpstart.fields.mpstart), # validate new PC is in range
+            seq.act("RUN", # the register file fetches the operands of `ir`, which issues unless it stalls
+                If(pause_req,
+                    NextValue(mpc, ir_pc), # `ir` is fetched again on resume
                     NextState("FETCH"),
-                    NextValue(mpc, sext_immediate + mpc + 1),
+                ).Elif(~stall,
+                    If(ir.opcode == opcodes["BRZ"][0],
+                        NextState("DO_BRZ"),
+                    ).Elif(ir.opcode == opcodes["FIN"][0],
+                        NextState("DRAIN"),
+                    ).Elif(ir.opcode < opcodes["MAX"][0], # check if the opcode is legal before running it
+                        exec.eq(1),
+                        If(ir_last,
+                            NextState("DRAIN"),
+                        ).Else(
+                            *fetch
+                        )
+                    ).Else(
+                        illegal_opcode.eq(1),
+                        NextState("DRAIN"),
+                    )
+                )
+            )
+            seq.act("DO_BRZ", # Ra was read out in RUN, and is read again unchanged; test it a cycle later, as the default sequencer does
+                # refetch whether or not the branch is taken, so BRZ always takes three cycles
+                If(ra_zero,
+                    If( (sext_immediate + ir_pc + 1 < mpc_stop) & (sext_immediate + ir_pc + 1 >= self.mpstart.fields.mpstart), # validate new PC is in range
+                        NextState("FETCH"),
+                        NextValue(mpc, sext_immediate + ir_pc + 1),
+                    ).Else(
+                        NextState("DRAIN"),
+                    )
+                ).Elif(~ir_last,
+                    NextState("FETCH"),  # mpc is already ir_pc + 1
                 ).Else(
+                    NextState("DRAIN"),
+                )
+            )
+            seq.act("DRAIN", # wait for the writes in flight
+                If(~res_valid & ~mul_busy,
                     NextState("IDLE"),
                     NextValue(running, 0),
                 )
-            ).Else(
-                If(mpc < mpc_stop,
-                    NextState("FETCH"),
-                    NextValue(mpc, mpc + 1),
+            )
+        else:
+            seq.act("FETCH",
+                If(pause_req,
+                    NextState("PAUSED"),
+                    NextValue(pause_gnt, 1),
                 ).Else(
+                    # one cycle latency for instruction fetch
+                    NextState("EXEC"),
+                    NextValue(pause_gnt, 0),
+                )
+            )
+            seq.act("EXEC", # not a great name. This is actually where the register file fetches its contents.
+                If(instruction.opcode == opcodes["BRZ"][0],
+                    NextState("DO_BRZ"),
+                ).Elif(instruction.opcode == opcodes["FIN"][0],
                     NextState("IDLE"),
                     NextValue(running, 0),
+                ).Elif(instruction.opcode < opcodes["MAX"][0], # check if the opcode is legal before running it
+                    exec.eq(1),
+                    NextState("WAIT_DONE"),
+                ).Else(
+                    NextState("ILLEGAL_OPCODE"),
                 )
-            ),
-        )
+            )
+            seq.act("WAIT_DONE", # this is where the actual instruction execution happens.
+                If(done, # each instruction finishes before the next is fetched; see `pipelined` for overlapping them
+                    If(mpc < mpc_stop,
+                       NextState("FETCH"),
+                       NextValue(mpc, mpc + 1),
+                    ).Else(
+                        NextState("IDLE"),
+                        NextValue(running, 0),
+                    )
+                )
+            )
+            seq.act("ILLEGAL_OPCODE",
+                NextState("IDLE"),
+                NextValue(running, 0),
+                illegal_opcode.eq(1),
+            )
+            seq.act("DO_BRZ",
+                If(ra_dat == 0,
+                    If( (sext_immediate + mpc + 1 < mpc_stop) & (sext_immediate + mpc + 1 >= self.mpstart.fields.mpstart), # validate new PC is in range
+                        NextState("FETCH"),
+                        NextValue(mpc, sext_immediate + mpc + 1),
+                    ).Else(
+                        NextState("IDLE"),
+                        NextValue(running, 0),
+                    )
+                ).Else(
+                    If(mpc < mpc_stop,
+                        NextState("FETCH"),
+                        NextValue(mpc, mpc + 1),
+                    ).Else(
+                        NextState("IDLE"),
+                        NextValue(running, 0),
+                    )
+                ),
+            )
         seq.act("PAUSED",
             If(~pause_req,
                 NextValue(pause_gnt, 0),
@@ -1889,51 +2050,97 @@ Here are the currently implemented opcodes for The Engine:
             setattr(self, "unit_sel" + str(index), Signal(name="unit_sel"+str(index)))
             setattr(self, "unit_wd" + str(index), Signal(log2_int(num_registers), name="unit_wd"+str(index)))
             subdecode = Signal()
+            res_subdecode = Signal()  # pipelined: the unit computes the result being written back
             for op in unit.opcode_list:
                 self.comb += [
-                    If(instruction.opcode == opcodes[op][0],
+                    If(ir.opcode == opcodes[op][0],
                         subdecode.eq(1)
                     )
                 ]
+                if pipelined:
+                    self.comb += If(res_ir.opcode == opcodes[op][0], res_subdecode.eq(1))
             instruction_out = Record(instruction_layout)
             self.comb += [
                 instruction_out.raw_bits().eq(unit.instruction_out)
             ]
+            unit_a, unit_b, unit_ir = ra_dat, rb_dat, ir.raw_bits()
+            if pipelined and name == "exec_mul":
+                unit_b = mul_b
+            elif pipelined:
+                unit_a, unit_b, unit_ir = res_a, res_b, res_ir_word
+                self.comb += If(res_subdecode, res_q.eq(unit.q))
             self.comb += [
                 unit.start.eq(exec & subdecode),
                 getattr(self, "done" + str(index)).eq(unit.q_valid),
-                unit.a.eq(ra_dat),
-                unit.b.eq(rb_dat),
-                unit.instruction_in.eq(instruction.raw_bits()),
+                unit.a.eq(unit_a),
+                unit.b.eq(unit_b),
+                unit.instruction_in.eq(unit_ir),
                 getattr(self, "unit_q" + str(index)).eq(unit.q),
                 getattr(self, "unit_sel" + str(index)).eq(subdecode),
                 getattr(self, "unit_wd" + str(index)).eq(instruction_out.wd),
             ]
             index += 1
 
-        for i in range(index):
+        if pipelined:
             self.comb += [
-                If(getattr(self, "done" + str(i)),
-                   done.eq(1),  # TODO: for proper pipelining, handle case of two units done simultaneously!
-                   wd_dat.eq(getattr(self, "unit_q" + str(i))),
-                   wd_adr.eq(getattr(self, "unit_wd" + str(i))),
-                ).Elif(seq.ongoing("IDLE"),
-                    done.eq(0),
+                mul_done.eq(mul_busy & self.exec_mul.q_valid),
+                If(mul_done,
+                    wd_dat.eq(self.exec_mul.q),
+                    wd_adr.eq(mul_wd),
+                    rf_write.eq(1),
+                ).Elif(res_valid,
+                    wd_dat.eq(res_q),
+                    wd_adr.eq(res_ir.wd),
+                    rf_write.eq(1),
                 )
             ]
+            self.sync.eng_clk += [
+                If(exec & is_mul,
+                    mul_busy.eq(1),
+                    mul_wd.eq(ir.wd),
+                    mul_b.eq(rb_dat),
+                ).Elif(mul_done,
+                    mul_busy.eq(0),
+                ),
+                If(exec & ~is_mul,
+                    res_valid.eq(1),
+                    res_ir_word.eq(ir.raw_bits()),
+                    res_a.eq(ra_dat),
+                    res_b.eq(rb_dat),
+                ).Elif(~mul_done,
+                    res_valid.eq(0),
+                ),
+            ]
+        else:
+            for i in range(index):
+                self.comb += [
+                    If(getattr(self, "done" + str(i)),
+                       done.eq(1),  # only one unit is ever running
+                       wd_dat.eq(getattr(self, "unit_q" + str(i))),
+                       wd_adr.eq(getattr(self, "unit_wd" + str(i))),
+                    ).Elif(seq.ongoing("IDLE"),
+                        done.eq(0),
+                    )
+                ]
 
-        self.comb += [
-            rf_write.eq(done),
-        ]
+            self.comb += [
+                rf_write.eq(done),
+            ]
 
         ##### TIMING CONSTRAINTS -- you want these. Trust me.
         # registered exec units need this set of rules
         ### clk200->clk50 multi-cycle paths:
         # we architecturally guarantee extra setup time from the register file to the point of consumption:
         # read data is stable by the 3rd phase of the RF fetch cycle, and so it is in fact ready even before
-        # the other signals that trigger the execute mode, hence 4+1 cycles total setup time
-        platform.add_platform_command("set_multicycle_path 5 -setup -start -from [get_clocks clk200] -to [get_clocks clk50] -through [get_cells *rf_r*_dat_reg*]")
-        platform.add_platform_command("set_multicycle_path 4 -hold -end -from [get_clocks clk200] -to [get_clocks clk50] -through [get_cells *rf_r*_dat_reg*]")
+        # the other signals that trigger the execute mode, hence 4+1 cycles total setup time.
+        # Not so when pipelined: the operands are registered at the end of the cycle that reads them out, with
+        # one clk200 cycle to go from Rb, so only the BRZ test, which is used on the following cycle, is relaxed.
+        if pipelined:
+            platform.add_platform_command("set_multicycle_path 5 -setup -start -from [get_clocks clk200] -to [get_clocks clk50] -through [get_nets {net}]", net=ra_zero)
+            platform.add_platform_command("set_multicycle_path 4 -hold -end -from [get_clocks clk200] -to [get_clocks clk50] -through [get_nets {net}]", net=ra_zero)
+        else:
+            platform.add_platform_command("set_multicycle_path 5 -setup -start -from [get_clocks clk200] -to [get_clocks clk50] -through [get_cells *rf_r*_dat_reg*]")
+            platform.add_platform_command("set_multicycle_path 4 -hold -end -from [get_clocks clk200] -to [get_clocks clk50] -through [get_cells *rf_r*_dat_reg*]")
         ### clk200->clk100 multi-cycle paths:
         # same as above, but for the multiplier path.
         platform.add_platform_command("set_multicycle_path 3 -setup -start -from [get_clocks clk200] -to [get_clocks sys_clk] -through [get_cells *rf_r*_dat_reg*]")
@@ -1962,9 +2169,11 @@ Here are the currently implemented opcodes for The Engine:
         # ignore the clk50 reset path for timing purposes -- there is > 1 cycle guaranteed after reset for everything to settle before anything moves on these paths (applies for other crypto engines, (SHA/AES) as well)
         platform.add_platform_command("set_false_path -through [get_nets clk50_rst]")
         ### sys->clk50 multi-cycle paths:
-        # microcode fetch is guaranteed not to transition in the middle of an exec computation
-        platform.add_platform_command("set_multicycle_path 2 -setup -start -from [get_clocks sys_clk] -to [get_clocks clk50] -through [get_cells microcode_reg*]")
-        platform.add_platform_command("set_multicycle_path 1 -hold -end -from [get_clocks sys_clk] -to [get_clocks clk50] -through [get_cells microcode_reg*]")
+        # microcode fetch is guaranteed not to transition in the middle of an exec computation. Not so when
+        # pipelined: the instruction register loads the fetch one sys_clk cycle after mpc moves.
+        if not pipelined:
+            platform.add_platform_command("set_multicycle_path 2 -setup -start -from [get_clocks sys_clk] -to [get_clocks clk50] -through [get_cells microcode_reg*]")
+            platform.add_platform_command("set_multicycle_path 1 -hold -end -from [get_clocks sys_clk] -to [get_clocks clk50] -through [get_cells microcode_reg*]")
         ### clk50->clk200 multi-cycle paths:
         # engine running will set up a full eng_clk cycle before any RF accesses need to be valid
         platform.add_platform_command("set_multicycle_path 4 -setup -from [get_clocks clk50] -to [get_clocks clk200] -through [get_nets {{ {net1} {net2} {net3} }}]", net1=running, net2=running_r, net3=rf.running)
@@ -1975,8 +2184,10 @@ Here are the currently implemented opcodes for The Engine:
         # data writeback happens on phase==2, and thus is stable for at least two clk200 clocks extra
         platform.add_platform_command("set_multicycle_path 2 -setup -from [get_clocks clk50] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/DI*DI*]")
         platform.add_platform_command("set_multicycle_path 1 -hold -end -from [get_clocks clk50] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/DI*DI*]")
-        platform.add_platform_command("set_multicycle_path 2 -setup -from [get_clocks clk50] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/ADDR*ADDR*]")
-        platform.add_platform_command("set_multicycle_path 1 -hold -end -from [get_clocks clk50] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/ADDR*ADDR*]")
+        # when pipelined, the instruction register also drives the read addresses, which are used from phase==0
+        if not pipelined:
+            platform.add_platform_command("set_multicycle_path 2 -setup -from [get_clocks clk50] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/ADDR*ADDR*]")
+            platform.add_platform_command("set_multicycle_path 1 -hold -end -from [get_clocks clk50] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/ADDR*ADDR*]")
         ### sys->clk200 multi-cycle paths:
         # data writeback happens on phase==2, and thus is stable for at least two clk200 clocks extra + one full eng_clk (total 25ns)
         platform.add_platform_command("set_multicycle_path 4 -setup -from [get_clocks sys_clk] -to [get_clocks clk200] -through [get_pins RF_RAMB*/*/DI*DI*]")
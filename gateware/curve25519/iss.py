@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+
+"""
+Instruction set simulator for the Curve25519 Engine.
+
+Runs Engine microcode in Python, on a model of the windowed register file, without
+Vivado or a SoC build. The ISA (`opcodes`, `instruction_layout`, the constant ROM)
+is taken from engine.py, so the simulator tracks the hardware definitions.
+
+Cycle counts follow the `seq` state machine, in `eng_clk` cycles: one cycle in IDLE
+to take the `go`, then FETCH and EXEC for every instruction, followed by DO_BRZ for
+BRZ, ILLEGAL_OPCODE for an illegal opcode, or WAIT_DONE until the execution unit
+returns its result (one cycle, or `exec_cycles` for the multi-cycle units). FIN
+returns to IDLE straight from EXEC. Pausing is not modelled.
+
+`run(..., pipelined=True)` counts cycles for an Engine built with `pipelined=True`
+instead: after one FETCH, an instruction issues every cycle unless the scoreboard
+holds it, a MUL writes back `exec_cycles` after it issues while later instructions
+go ahead, and BRZ tests Ra in DO_BRZ and then refetches. The results are the same
+either way.
+
+Registers holding unreduced MLZ results are tracked (see `track_lazy`); reads of one
+as a field element, before the TRD/SUB pair reduces it, are listed in the report, as
+are registers that still hold one when the run stops.
+
+    iss = EngineISS()
+    iss.load_microcode(words)
+    iss.write_reg(window, 0, x)
+    run = iss.run(mpstart=0, mplen=len(words), window=window)
+    print(run.report())
+    result = iss.read_reg(window, 31)
+
+Run as a script, it checks the test vectors that the `curve_engine` bench runs
+(`test_vectors.bin`, as made by the curve25519-dalek testbench), or runs a raw
+microcode image:
+
+    python3 -m gateware.curve25519.iss vectors test_vectors.bin
+    python3 -m gateware.curve25519.iss run image.bin -r 0=9 -r 1=0x1234 --profile --pipelined
+"""
+
+import argparse
+import struct
+import sys
+
+from gateware.curve25519.engine import opcodes, instruction_layout, num_registers, rf_depth, microcode_depth, constant_defs
+
+width = 256
+mask = (1 << width) - 1
+field_prime = constant_defs[3][0]  # 2^255-19
+eng_clk_hz = 50_000_000
+
+# eng_clk cycles that a unit keeps the sequencer in WAIT_DONE; units not listed
+# return their result on the cycle after EXEC. In the pipelined sequencer, the
+# cycles from issue to write-back.
+exec_cycles = {
+    "MUL": 26,  # 52 mul_clk cycles, including the mseq handshake
+    "MLZ": 19,  # MUL without NORMALIZE and the second CARRYPROP
+}
+
+# bit offset and width of each instruction field, per instruction_layout
+fields = {}
+_offset = 0
+for _name, _bits, _description in instruction_layout:
+    fields[_name] = (_offset, _bits)
+    _offset += _bits
+assert _offset == 32, "instruction_layout must fill a microcode word"
+
+mnemonics = {value[0]: mnemonic for mnemonic, value in opcodes.items() if 0 <= value[0] < opcodes["MAX"][0]}
+constant_names = {code: const[1] for code, const in constant_defs.items()}
+
+
+def field_mul(a, b):
+    # the multiplier works on fifteen 17-bit limbs, so it does not see bit 255 of its
+    # operands; the result is fully reduced
+    low = (1 << 255) - 1
+    return ((a & low) * (b & low)) % field_prime
+
+
+def lazy_mul(a, b):
+    # MLZ: the multiplier's sum after its first carry propagate, per the C model in the
+    # ExecMul documentation; congruent to a * b, and kept to the 256 bits of the result
+    limb = 0x1_ffff
+    a_17 = [(a >> (17 * i)) & limb for i in range(15)]
+    b_17 = [(b >> (17 * i)) & limb for i in range(15)]
+    p = [0] * 15
+    for col in range(15):
+        for row in range(15):
+            if row >= col:
+                p[row] += a_17[row - col] * b_17[col]
+            else:
+                p[row] += a_17[15 + row - col] * 19 * b_17[col]
+    prop = [0] * 15
+    prop[0] = (p[0] & limb) + ((p[14] >> 17) & limb) * 19 + ((p[13] >> 34) & limb) * 19
+    prop[1] = (p[1] & limb) + ((p[0] >> 17) & limb) + ((p[14] >> 34) & limb) * 19
+    for i in range(2, 15):
+        prop[i] = (p[i] & limb) + ((p[i - 1] >> 17) & limb) + (p[i - 2] >> 34)
+    for i in range(14):
+        prop[i + 1] += prop[i] >> 17
+        prop[i] &= limb
+    return sum(limb_value << (17 * i) for i, limb_value in enumerate(prop)) & mask
+
+# value written to Wd by each opcode that writes one, from the A and B operands
+semantics = {
+    "PSA": lambda a, b: a,
+    "PSB": lambda a, b: b,
+    "MSK": lambda a, b: b if a & 1 else 0,
+    "XOR": lambda a, b: a ^ b,
+    "NOT": lambda a, b: ~a & mask,
+    "ADD": lambda a, b: (a + b) & mask,
+    "SUB": lambda a, b: (a - b) & mask,
+    "MUL": field_mul,
+    "MLZ": lazy_mul,
+    "TRD": lambda a, b: field_prime if a >= field_prime else 0,
+    "SHL": lambda a, b: (a << 1) & mask,
+    "XBT": lambda a, b: (a >> 254) & 1,
+}
+missing = set(mnemonics.values()) - set(semantics) - {"BRZ", "FIN"}
+assert not missing, "no ISS semantics for opcode(s) {}".format(", ".join(sorted(missing)))
+
+
+def track_lazy(instruction, lazy):
+    """Follow unreduced MLZ results through one instruction. `lazy` maps registers to
+    "lazy" (holds an MLZ result) or ("trd", r) (holds the TRD of lazy register r), and
+    is updated; returns the lazy registers that the instruction reads as field elements.
+    Lazy values may be moved by PSA/PSB, tested by TRD, and reduced by the SUB of the
+    TRD/SUB pair, which makes the result an ordinary one."""
+    mnemonic = instruction.mnemonic
+    operands = opcodes[mnemonic][2] if mnemonic is not None else []
+    reads = {name: reg for name, reg, const in (("ra", instruction.ra, instruction.ca), ("rb", instruction.rb, instruction.cb))
+             if name in operands and not const}
+    tags = {name: lazy.get(reg) for name, reg in reads.items()}
+    if mnemonic in ("PSA", "PSB", "TRD"):
+        misused = []
+    elif mnemonic == "SUB" and tags.get("ra") == "lazy" and tags.get("rb") == ("trd", reads["ra"]):
+        misused = []
+    else:
+        misused = sorted({reg for name, reg in reads.items() if tags[name] == "lazy"})
+    if "wd" in operands:
+        wd = instruction.wd
+        tag = None
+        if mnemonic == "MLZ":
+            tag = "lazy"
+        elif mnemonic in ("PSA", "PSB"):
+            tag = tags.get(operands[1])
+        elif mnemonic == "TRD" and "ra" in reads and reads["ra"] != wd:
+            tag = ("trd", reads["ra"])  # whether or not ra is lazy, so that a loop can reduce on entry
+        for reg, value in list(lazy.items()):
+            if reg == wd or value == ("trd", wd):
+                del lazy[reg]
+        if tag is not None:
+            lazy[wd] = tag
+    return misused
+
+
+class Instruction():
+    """A decoded microcode word; the attributes are the instruction_layout fields"""
+    def __init__(self, word):
+        self.word = word
+        for name, (offset, bits) in fields.items():
+            setattr(self, name, (word >> offset) & ((1 << bits) - 1))
+
+    @property
+    def mnemonic(self):
+        return mnemonics.get(self.opcode)
+
+    @property
+    def offset(self):
+        """The BRZ immediate, sign extended"""
+        bits = fields["immediate"][1]
+        return self.immediate - (1 << bits) if self.immediate >> (bits - 1) else self.immediate
+
+    def operand(self, reg, const):
+        if const:
+            return "#" + constant_names.get(reg, str(reg)).replace(" ", "_")
+        return "r{}".format(reg)
+
+    def __str__(self):
+        """Disassembly, in the assembler's syntax; BRZ shows its raw offset"""
+        if self.mnemonic is None:
+            return ".word 0x{:08x}".format(self.word)
+        operands = {
+            "wd": "r{}".format(self.wd),
+            "ra": self.operand(self.ra, self.ca),
+            "rb": self.operand(self.rb, self.cb),
+            "immediate": "{:+d}".format(self.offset),
+        }
+        return " ".join([self.mnemonic, ", ".join(operands[name] for name in opcodes[self.mnemonic][2])]).strip()
+
+
+class Run():
+    """The outcome and profile of one run of the microcode. `stop` is why it ended:
+    `fin`, `end` (the mpc reached the end of the program), `branch` (a BRZ target was
+    out of range), `illegal` or `timeout`."""
+    def __init__(self, mpstart, mplen, window, pipelined=False):
+        self.mpstart = mpstart
+        self.pipelined = pipelined
+        self.mplen = mplen
+        self.window = window
+        self.cycles = 0
+        self.instructions = 0
+        self.stop = None
+        self.mpc = mpstart
+        # {mpc: [times executed, cycles]}
+        self.profile = {}
+        # {mnemonic: [times executed, cycles]}
+        self.by_opcode = {}
+        # (mpc, register) for each read of an unreduced MLZ result as a field element
+        self.lazy_reads = []
+        # registers holding an unreduced MLZ result when the run stopped
+        self.lazy_left = []
+
+    def count(self, mpc, mnemonic, cycles):
+        self.cycles += cycles
+        self.instructions += 1
+        for table, key in ((self.profile, mpc), (self.by_opcode, mnemonic or "illegal")):
+            entry = table.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += cycles
+
+    @property
+    def seconds(self):
+        return self.cycles / eng_clk_hz
+
+    def report(self, microcode=None, top=10):
+        lines = ["{} instructions in {} {}eng_clk cycles ({:.3f} us), stopped by {} at mpc 0x{:03x}".format(
+            self.instructions, self.cycles, "pipelined " if self.pipelined else "", self.seconds * 1e6, self.stop, self.mpc)]
+        for mnemonic, (count, cycles) in sorted(self.by_opcode.items(), key=lambda item: -item[1][1]):
+            lines.append("  {:8} {:8} x {:10} cycles {:6.1%}".format(mnemonic, count, cycles, cycles / max(1, self.cycles)))
+        if microcode is not None:
+            lines.append("  busiest instructions:")
+            for mpc, (count, cycles) in sorted(self.profile.items(), key=lambda item: -item[1][1])[:top]:
+                lines.append("  0x{:03x} {:24} {:8} x {:10} cycles".format(mpc, str(Instruction(microcode[mpc])), count, cycles))
+        for mpc, reg in sorted(set(self.lazy_reads)):
+            lines.append("  0x{:03x} reads r{}, an MLZ result that was not reduced with TRD, SUB".format(mpc, reg))
+        for reg in self.lazy_left:
+            lines.append("  r{} holds an MLZ result that was not reduced with TRD, SUB when the run stopped".format(reg))
+        return "\n".join(lines)
+
+
+class EngineISS():
+    """The Engine's architectural state: the 1k-word microcode store and the
+    512-entry register file, split into windows of `num_registers`"""
+    def __init__(self):
+        self.microcode = [0] * microcode_depth
+        self.rf = [0] * rf_depth
+        # {window: registers holding unreduced MLZ results}, see track_lazy
+        self.lazy = {}
+
+    def load_microcode(self, words, offset=0):
+        if offset + len(words) > microcode_depth:
+            raise ValueError("{} words at 0x{:x} overflow the microcode store".format(len(words), offset))
+        self.microcode[offset:offset + len(words)] = [word & 0xFFFF_FFFF for word in words]
+
+    def read_reg(self, window, reg):
+        return self.rf[window * num_registers + reg]
+
+    def write_reg(self, window, reg, value):
+        self.rf[window * num_registers + reg] = value & mask
+        self.lazy.get(window, {}).pop(reg, None)
+
+    def lazy_regs(self, window):
+        """Registers of the window holding unreduced MLZ results"""
+        return sorted(reg for reg, tag in self.lazy.get(window, {}).items() if tag == "lazy")
+
+    def operand(self, window, reg, const):
+        if const:
+            return constant_defs[reg][0] if reg in constant_defs else 0
+        return self.read_reg(window, reg)
+
+    def step(self, instruction, window):
+        """Execute one instruction; returns the cycles after FETCH and EXEC, and
+        the result of BRZ's test (None for other instructions)"""
+        a = self.operand(window, instruction.ra, instruction.ca)
+        mnemonic = instruction.mnemonic
+        if mnemonic == "BRZ":
+            return 1, a == 0  # DO_BRZ
+        b = self.operand(window, instruction.rb, instruction.cb)
+        cycles = exec_cycles.get(mnemonic, 1)  # WAIT_DONE
+        self.write_reg(window, instruction.wd, semantics[mnemonic](a, b))
+        return cycles, None
+
+    def run(self, mpstart=0, mplen=microcode_depth, window=0, max_cycles=10_000_000, trace=None, pipelined=False):
+        """Run from `mpstart` as the sequencer does after `go`, until FIN or the end of
+        the `mplen` instruction program. As in the sequencer, a taken BRZ must land in
+        [mpstart, mpstart + mplen - 1), i.e. not on the last instruction, or execution
+        stops. `trace` is called with (mpc, instruction) before each instruction executes."""
+        if pipelined:
+            return self.run_pipelined(mpstart, mplen, window, max_cycles, trace)
+        run = Run(mpstart, mplen, window)
+        addr_mask = microcode_depth - 1
+        # the sequencer's registers are log2(microcode_depth) bits wide, and so is its arithmetic
+        mpc_stop = (mpstart + mplen - 1) & addr_mask
+        mpc = mpstart
+        run.cycles = 1  # IDLE, sampling `go`
+        while True:
+            if run.cycles >= max_cycles:
+                run.stop = "timeout"
+                break
+            instruction = Instruction(self.microcode[mpc])
+            if trace is not None:
+                trace(mpc, instruction)
+            cycles = 2  # FETCH, EXEC
+            mnemonic = instruction.mnemonic
+            if mnemonic == "FIN":
+                run.count(mpc, mnemonic, cycles)
+                run.stop = "fin"
+                break
+            if mnemonic is None:
+                run.count(mpc, mnemonic, cycles + 1)  # ILLEGAL_OPCODE
+                run.stop = "illegal"
+                break
+            extra, taken = self.step(instruction, window)
+            run.lazy_reads += [(mpc, reg) for reg in track_lazy(instruction, self.lazy.setdefault(window, {}))]
+            run.count(mpc, mnemonic, cycles + extra)
+            if taken:
+                target = (mpc + 1 + instruction.offset) & addr_mask
+                if not (mpstart <= target < mpc_stop):
+                    run.stop = "branch"
+                    break
+                mpc = target
+            elif mpc < mpc_stop:
+                mpc += 1
+            else:
+                run.stop = "end"
+                break
+        run.mpc = mpc
+        run.lazy_left = self.lazy_regs(window)
+        return run
+
+    @staticmethod
+    def stalled(instruction, cycle, writes):
+        """Whether the pipelined sequencer's scoreboard holds `instruction` at `cycle`;
+        `writes` are the write-backs in flight, {"res" or "mul": (issue cycle, write
+        cycle, Wd)}, each pending from the cycle after issue to its write"""
+        operands = opcodes[instruction.mnemonic][2] if instruction.mnemonic is not None else []
+        pending = {unit: wd for unit, (issued, written, wd) in writes.items() if issued < cycle <= written}
+        sources = [reg for name, reg, const in (("ra", instruction.ra, instruction.ca), ("rb", instruction.rb, instruction.cb))
+                   if name in operands and not const]
+        if any(reg in pending.values() for reg in sources):
+            return True  # read after write
+        if "mul" in pending and "wd" in operands:
+            if instruction.mnemonic in exec_cycles or instruction.wd == pending["mul"]:
+                return True  # one multiplier; write after write
+            if "res" in pending and writes["mul"][1] == cycle:
+                return True  # the write port is taken by the MUL, then by the result it deferred
+        return False
+
+    def run_pipelined(self, mpstart=0, mplen=microcode_depth, window=0, max_cycles=10_000_000, trace=None):
+        """`run`, with the timing of the pipelined sequencer. Each instruction is charged
+        the cycles from the one after the previous issue (including any refetch) to its
+        own issue; the last one is also charged the drain of the writes in flight."""
+        run = Run(mpstart, mplen, window, pipelined=True)
+        addr_mask = microcode_depth - 1
+        mpc_stop = (mpstart + mplen - 1) & addr_mask
+        mpc = mpstart
+        writes = {}
+        run.cycles = 1  # IDLE, sampling `go`
+        start = 1  # FETCH
+        cycle = 2  # the first cycle in RUN
+        while True:
+            if cycle >= max_cycles:
+                run.stop = "timeout"
+                break
+            pc = mpc
+            instruction = Instruction(self.microcode[pc])
+            if trace is not None:
+                trace(pc, instruction)
+            while self.stalled(instruction, cycle, writes):
+                cycle += 1
+            mnemonic = instruction.mnemonic
+            following = cycle + 1  # when the next instruction can issue
+            if mnemonic == "FIN":
+                run.stop = "fin"
+            elif mnemonic is None:
+                run.stop = "illegal"
+            else:
+                _, taken = self.step(instruction, window)
+                run.lazy_reads += [(pc, reg) for reg in track_lazy(instruction, self.lazy.setdefault(window, {}))]
+                if mnemonic in exec_cycles:
+                    writes["mul"] = (cycle, cycle + exec_cycles[mnemonic], instruction.wd)
+                elif mnemonic != "BRZ":
+                    deferred = "mul" in writes and writes["mul"][1] == cycle + 1
+                    writes["res"] = (cycle, cycle + (2 if deferred else 1), instruction.wd)
+                if mnemonic == "BRZ":
+                    following += 2  # DO_BRZ, FETCH
+                if taken:
+                    target = (mpc + 1 + instruction.offset) & addr_mask
+                    if not (mpstart <= target < mpc_stop):
+                        run.stop = "branch"
+                    else:
+                        mpc = target
+                elif mpc < mpc_stop:
+                    mpc += 1
+                else:
+                    run.stop = "end"
+            if run.stop is not None:
+                # DRAIN until no write is in flight
+                drain = cycle + (2 if mnemonic == "BRZ" else 1)
+                end = max([drain] + [written + 1 for issued, written, wd in writes.values()])
+                run.count(pc, mnemonic, end - start + 1)
+                break
+            run.count(pc, mnemonic, cycle - start + 1)
+            start, cycle = cycle + 1, following
+        run.mpc = mpc
+        run.lazy_left = self.lazy_regs(window)
+        return run
+
+
+def words_to_int(words):
+    value = 0
+    for i, word in enumerate(words):
+        value |= word << (32 * i)
+    return value
+
+
+def int_to_words(value, count=width // 32):
+    return [(value >> (32 * i)) & 0xFFFF_FFFF for i in range(count)]
+
+
+def read_words(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    data += bytes(-len(data) % 4)
+    return list(struct.unpack("<{}I".format(len(data) // 4), data))
+
+
+def load_vectors(path):
+    """Parse a test vector file as the curve_engine testbench does: for each program,
+    its load address, microcode, window, and for each vector its arguments (loaded
+    into r0 onwards) and the expected value of r31. Yields dicts."""
+    words = read_words(path)
+    offset = 0
+    while offset < len(words) and words[offset] == 0x5645_4354:  # "VECT"
+        load_addr = (words[offset + 1] >> 16) & 0xFFFF
+        code_len = words[offset + 1] & 0xFFFF
+        num_args = (words[offset + 2] >> 27) & 0x1F
+        window = (words[offset + 2] >> 23) & 0xF
+        num_vectors = words[offset + 2] & 0x3F_FFFF
+        offset += 3
+        code = words[offset:offset + code_len]
+        offset += code_len
+        offset += 8 - (offset % 8)  # padding; the testbench always skips at least one word
+        vectors = []
+        for _ in range(num_vectors):
+            args = [words_to_int(words[offset + 8 * i:offset + 8 * i + 8]) for i in range(num_args)]
+            offset += 8 * num_args
+            vectors.append((args, words_to_int(words[offset:offset + 8])))
+            offset += 8
+        yield {"load_addr": load_addr, "code": code, "window": window, "vectors": vectors}
+
+
+def run_vectors(path, verbose=False, pipelined=False):
+    """Run every test vector; returns the number that failed"""
+    failures = 0
+    for index, program in enumerate(load_vectors(path)):
+        iss = EngineISS()
+        # the testbench always writes the microcode from address 0
+        iss.load_microcode(program["code"])
+        cycles = set()
+        for number, (args, expected) in enumerate(program["vectors"]):
+            for reg, value in enumerate(args):
+                iss.write_reg(program["window"], reg, value)
+            run = iss.run(program["load_addr"], len(program["code"]), program["window"], pipelined=pipelined)
+            actual = iss.read_reg(program["window"], 31)
+            cycles.add(run.cycles)
+            if actual != expected:
+                failures += 1
+                print("program {} vector {}: expected 0x{:064x}, got 0x{:064x}".format(index, number, expected, actual))
+            if verbose:
+                print(run.report(iss.microcode))
+        print("program {}: {} words, {} vectors, {} cycles".format(
+            index, len(program["code"]), len(program["vectors"]), "/".join(str(c) for c in sorted(cycles)) or "-"))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Curve25519 Engine instruction set simulator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    vectors = commands.add_parser("vectors", help="Check a curve_engine test vector file")
+    vectors.add_argument("path")
+    vectors.add_argument("-v", "--verbose", action="store_true", help="Print the profile of every run")
+    vectors.add_argument("--pipelined", action="store_true", help="Count cycles for the pipelined sequencer")
+    run = commands.add_parser("run", help="Run a raw microcode image (little-endian 32-bit words)")
+    run.add_argument("path")
+    run.add_argument("--mpstart", type=lambda x: int(x, 0), default=0)
+    run.add_argument("--mplen", type=lambda x: int(x, 0), default=None, help="Default: the length of the image")
+    run.add_argument("--window", type=int, default=0)
+    run.add_argument("-r", "--reg", action="append", default=[], help="Initial register value, as N=VALUE")
+    run.add_argument("--trace", action="store_true", help="Print every instruction as it executes")
+    run.add_argument("--profile", action="store_true", help="Print the cycles spent by each instruction")
+    run.add_argument("--pipelined", action="store_true", help="Count cycles for the pipelined sequencer")
+    args = parser.parse_args()
+
+    if args.command == "vectors":
+        return 1 if run_vectors(args.path, args.verbose, args.pipelined) else 0
+
+    iss = EngineISS()
+    code = read_words(args.path)
+    iss.load_microcode(code)
+    for assignment in args.reg:
+        reg, value = assignment.split("=")
+        iss.write_reg(args.window, int(reg, 0), int(value, 0))
+    trace = (lambda mpc, instruction: print("0x{:03x}: {}".format(mpc, instruction))) if args.trace else None
+    result = iss.run(args.mpstart, args.mplen if args.mplen is not None else len(code), args.window, trace=trace, pipelined=args.pipelined)
+    print(result.report(iss.microcode if args.profile else None))
+    for reg in range(num_registers):
+        value = iss.read_reg(args.window, reg)
+        if value:
+            print("r{:<2} 0x{:064x}".format(reg, value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
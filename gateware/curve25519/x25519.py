@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+
+"""
+X25519 on the Curve25519 Engine: a microcode library, a Python reference model, and
+test vectors.
+
+The library has two routines. Each runs in the register window that the host
+selects, with its arguments loaded into r0 onwards and its result left in r31:
+
+ * `invert`: r31 <- 1/r0, as r0^(p-2) by Fermat's little theorem. The exponent is
+   built by the pow22501 addition chain: 254 squarings and 11 multiplies. The runs
+   of squarings are loops, counted down from the `five` ... `one hundred` constants.
+ * `x25519`: r31 <- X25519(r1, r0), for a clamped scalar in r1 and a u-coordinate
+   in r0. This is the Montgomery ladder of RFC 7748 over bits 254 to 0 of the scalar,
+   followed by the inversion of z and the affine u-coordinate. r1 is clobbered.
+
+Both are constant-time: the branches only count loops, and the ladder's conditional
+swaps are done with MSK. Their multiplies are MLZ, each reduced by a TRD/SUB pair
+that is put off until after the next multiply where it can be (`lazy_multiplies`),
+so that the pipelined sequencer runs it in the shadow of that multiply. The host does the byte-level encoding, as in `x25519`
+below: it clamps the scalar with `decode_scalar` and clears bit 255 of u with
+`decode_u`, and r31 is fully reduced, so it is the little-endian encoding of the
+result.
+
+The microcode is generated with the helpers below (field add and subtract,
+conditional swap, squaring loops), and assembled by `asm.py`. Run as a script, it
+writes the library, and test vectors in the format of the `curve_engine` bench
+(as read by `iss.load_vectors`), and checks the vectors on the ISS:
+
+    python3 -m gateware.curve25519.x25519 --source x25519.s -o x25519.bin --table x25519.json
+    python3 -m gateware.curve25519.x25519 --vectors x25519_vectors.bin --count 32 --check
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+
+from gateware.curve25519 import asm
+from gateware.curve25519.iss import field_prime, int_to_words, run_vectors
+
+# RFC 7748, section 5.2: (scalar, u-coordinate, result)
+rfc7748_vectors = [
+    ("a546e36bf0527c9d3b16154b82465edd62144c0ac1fc5a18506a2244ba449ac4",
+     "e6db6867583030db3594c1a424b15f7c726624ec26b3353b10a903a6d0ab1c4c",
+     "c3da55379de9c6908e94ea4df28d084f32eccf03491c71f754b4075577a28552"),
+    # section 5.2, after one iteration
+    ("0900000000000000000000000000000000000000000000000000000000000000",
+     "0900000000000000000000000000000000000000000000000000000000000000",
+     "422c8e7a6227d7bca1350b3e2bb7279f7897b87bb6854b783c60e80311ae3079"),
+]
+
+
+### reference model
+
+def decode_scalar(k):
+    """The clamped scalar, from its 32-byte encoding"""
+    value = int.from_bytes(k, "little")
+    value &= ~7
+    value &= (1 << 255) - 1
+    value |= 1 << 254
+    return value
+
+
+def decode_u(u):
+    return int.from_bytes(u, "little") & ((1 << 255) - 1)
+
+
+def encode_u(u):
+    return (u % field_prime).to_bytes(32, "little")
+
+
+def invert(z):
+    return pow(z, field_prime - 2, field_prime)
+
+
+def ladder(k, u):
+    """The Montgomery ladder of RFC 7748, step for step as the microcode runs it;
+    returns the projective (x, z) of k * u"""
+    p = field_prime
+    x1, x2, z2, x3, z3 = u % p, 1, 0, u % p, 1
+    swap = 0
+    for t in range(254, -1, -1):
+        bit = (k >> t) & 1
+        swap ^= bit
+        if swap:
+            x2, x3, z2, z3 = x3, x2, z3, z2
+        swap = bit
+        a = (x2 + z2) % p
+        aa = a * a % p
+        b = (x2 - z2) % p
+        bb = b * b % p
+        e = (aa - bb) % p
+        c = (x3 + z3) % p
+        d = (x3 - z3) % p
+        da = d * a % p
+        cb = c * b % p
+        x3 = (da + cb) ** 2 % p
+        z3 = x1 * (da - cb) ** 2 % p
+        x2 = aa * bb % p
+        z2 = e * (aa + 121665 * e) % p
+    if swap:
+        x2, x3, z2, z3 = x3, x2, z3, z2
+    return x2, z2
+
+
+def x25519(k, u):
+    """X25519 on 32-byte strings"""
+    x, z = ladder(decode_scalar(k), decode_u(u))
+    return encode_u(x * invert(z))
+
+
+### microcode
+
+def field_add(d, a, b, t):
+    """d <- a + b mod p, for a, b < p; t is scratch"""
+    return [
+        "ADD {}, {}, {}".format(d, a, b),
+        "TRD {}, {}".format(t, d),
+        "SUB {}, {}, {}".format(d, d, t),
+    ]
+
+
+def field_sub(d, a, b, t):
+    """d <- a - b mod p, as a + (p - b), for a, b < p; t is scratch"""
+    return [
+        "SUB {}, #field, {}".format(t, b),
+        "ADD {}, {}, {}".format(d, a, t),
+        "TRD {}, {}".format(t, d),
+        "SUB {}, {}, {}".format(d, d, t),
+    ]
+
+
+def cswap(swap, a, b, t):
+    """Swap a and b if bit 0 of swap is set, in constant time; t is scratch"""
+    return [
+        "XOR {}, {}, {}".format(t, a, b),
+        "MSK {}, {}, {}".format(t, swap, t),
+        "XOR {}, {}, {}".format(a, t, a),
+        "XOR {}, {}, {}".format(b, t, b),
+    ]
+
+
+# squaring runs that are loops, by the constant that counts them
+loop_counts = {5: "#five", 10: "#ten", 20: "#twenty", 50: "#fifty", 100: "#one_hundred"}
+
+
+def square(x, count, n, label):
+    """x <- x^(2^count); loops count down n"""
+    if count not in loop_counts:
+        return ["MUL {}, {}, {}".format(x, x, x)] * count
+    return [
+        "PSA {}, {}".format(n, loop_counts[count]),
+        "{}:".format(label),
+        "MUL {}, {}, {}".format(x, x, x),
+        "SUB {}, {}, #one".format(n, n),
+        "BRZ {}_done, {}".format(label, n),
+        "BRZ {}, #zero".format(label),
+        "{}_done:".format(label),
+    ]
+
+
+def inversion(out, z, t0, t1, t2, t3, n, prefix="inv"):
+    """out <- z^(p-2) = z^(2^255-21); registers t0-t3 and n are scratch, and must differ from z"""
+    steps = [
+        ("MUL", t0, z, z),            # z^2
+        ("SQR", t1, t0, 2),           # z^8
+        ("MUL", t1, z, t1),           # z^9
+        ("MUL", t0, t0, t1),          # z^11
+        ("MUL", t2, t0, t0),          # z^22
+        ("MUL", t1, t1, t2),          # z^(2^5-1)
+        ("SQR", t2, t1, 5),
+        ("MUL", t1, t2, t1),          # z^(2^10-1)
+        ("SQR", t2, t1, 10),
+        ("MUL", t2, t2, t1),          # z^(2^20-1)
+        ("SQR", t3, t2, 20),
+        ("MUL", t2, t3, t2),          # z^(2^40-1)
+        ("SQR", t2, t2, 10),
+        ("MUL", t1, t2, t1),          # z^(2^50-1)
+        ("SQR", t2, t1, 50),
+        ("MUL", t2, t2, t1),          # z^(2^100-1)
+        ("SQR", t3, t2, 100),
+        ("MUL", t2, t3, t2),          # z^(2^200-1)
+        ("SQR", t2, t2, 50),
+        ("MUL", t1, t2, t1),          # z^(2^250-1)
+        ("SQR", t1, t1, 5),           # z^(2^255-32)
+        ("MUL", out, t1, t0),         # z^(2^255-21)
+    ]
+    lines = []
+    for index, (op, d, a, b) in enumerate(steps):
+        if op == "MUL":
+            lines.append("MUL {}, {}, {}".format(d, a, b))
+        else:
+            if d != a:
+                lines.append("PSA {}, {}".format(d, a))
+            lines += square(d, b, n, "{}{}".format(prefix, index))
+    return lines
+
+
+def lazy_multiplies(lines, t):
+    """`lines` with each MUL turned into an MLZ and the TRD/SUB pair that reduces its
+    result, using t as scratch. The pair is put off past the next multiply, unless the
+    result is read first, or the routine branches or ends. A register that may still
+    be unreduced where a branch leaves is reduced again after the label it lands on,
+    which changes nothing when it already is (its TRD is 0)."""
+    def reduce(reg):
+        return ["TRD {}, {}".format(t, reg), "SUB {}, {}, {}".format(reg, reg, t)] if reg else []
+    out = []
+    unreduced = None
+    into = {}  # {label: registers that may be unreduced there}
+    heads = {}  # {label: index in out after it}
+    for line in lines:
+        words = line.replace(",", " ").split()
+        if line.endswith(":"):
+            label = line[:-1]
+            into.setdefault(label, set()).add(unreduced)
+            out.append(line)
+            heads[label] = len(out)
+            unreduced = None
+            continue
+        if unreduced in words[1:] or words[0] == "FIN":
+            out += reduce(unreduced)
+            unreduced = None
+        if words[0] == "BRZ":
+            into.setdefault(words[1], set()).add(unreduced)
+            out.append(line)
+        elif words[0] == "MUL":
+            out.append("MLZ" + line[len("MUL"):])
+            out += reduce(unreduced)
+            unreduced = words[1]
+        else:
+            out.append(line)
+    out += reduce(unreduced)
+    for label, index in sorted(heads.items(), key=lambda item: -item[1]):
+        out[index:index] = [line for reg in sorted(into[label] - {None}) for line in reduce(reg)]
+    return out
+
+
+def routine(name, registers, lines):
+    source = [".routine {}".format(name)]
+    source += [".reg {} {}".format(alias, reg) for alias, reg in registers.items()]
+    source += [line if line.endswith(":") else "    " + line for line in lines]
+    return "\n".join(source) + "\n"
+
+
+def invert_routine(lazy=True):
+    registers = {"z": "r0", "t0": "r1", "t1": "r2", "t2": "r3", "t3": "r4", "n": "r5", "lz": "r6", "out": "r31"}
+    lines = inversion("out", "z", "t0", "t1", "t2", "t3", "n") + ["FIN"]
+    return routine("invert", registers, lazy_multiplies(lines, "lz") if lazy else lines)
+
+
+def x25519_routine(lazy=True):
+    registers = {
+        "u": "r0", "k": "r1", "x2": "r2", "z2": "r3", "x3": "r4", "z3": "r5", "swap": "r6", "bit": "r7", "n": "r8",
+        "a": "r9", "aa": "r10", "b": "r11", "bb": "r12", "e": "r13", "c": "r14", "d": "r15", "da": "r16", "cb": "r17",
+        "t": "r18", "zi": "r19", "t0": "r20", "t1": "r21", "t2": "r22", "t3": "r23", "lz": "r24", "out": "r31",
+    }
+    lines = [
+        "TRD t, u",  # u < 2^255, but may not be reduced
+        "SUB u, u, t",
+        "PSA x2, #one",
+        "PSA z2, #zero",
+        "PSA x3, u",
+        "PSA z3, #one",
+        "PSA swap, #zero",
+        "ADD n, #one_hundred, #one_hundred",  # 255 iterations, for bits 254..0
+        "ADD n, n, #fifty",
+        "ADD n, n, #five",
+        "ladder:",
+        "XBT bit, k",
+        "SHL k, k",
+        "XOR swap, swap, bit",
+    ]
+    lines += cswap("swap", "x2", "x3", "t") + cswap("swap", "z2", "z3", "t")
+    lines += ["PSA swap, bit"]
+    lines += field_add("a", "x2", "z2", "t") + ["MUL aa, a, a"]
+    lines += field_sub("b", "x2", "z2", "t") + ["MUL bb, b, b"]
+    lines += field_sub("e", "aa", "bb", "t")
+    lines += field_add("c", "x3", "z3", "t")
+    lines += field_sub("d", "x3", "z3", "t")
+    lines += ["MUL da, d, a", "MUL cb, c, b"]
+    lines += field_add("x3", "da", "cb", "t") + ["MUL x3, x3, x3"]
+    lines += field_sub("z3", "da", "cb", "t") + ["MUL z3, z3, z3", "MUL z3, z3, u"]
+    lines += ["MUL x2, aa, bb", "MUL z2, e, #am24"]
+    lines += field_add("z2", "aa", "z2", "t") + ["MUL z2, e, z2"]
+    lines += [
+        "SUB n, n, #one",
+        "BRZ ladder_done, n",
+        "BRZ ladder, #zero",
+        "ladder_done:",
+    ]
+    lines += cswap("swap", "x2", "x3", "t") + cswap("swap", "z2", "z3", "t")
+    lines += inversion("zi", "z2", "t0", "t1", "t2", "t3", "n")
+    lines += ["MUL out, x2, zi", "FIN"]
+    return routine("x25519", registers, lazy_multiplies(lines, "lz") if lazy else lines)
+
+
+def library(lazy=True):
+    """Assembler source of the library; with lazy=False, it multiplies with MUL"""
+    return "; X25519 for the Curve25519 Engine, generated by gateware/curve25519/x25519.py\n\n" + \
+        invert_routine(lazy) + "\n" + x25519_routine(lazy)
+
+
+### test vectors
+
+def vector_program(routine, window, vectors):
+    """One program of a test vector file: the routine linked at 0, and for each vector
+    its arguments (r0 onwards) and the expected r31"""
+    code = asm.link([routine]).words
+    words = [0x5645_4354, len(code), (len(vectors[0][0]) << 27) | (window << 23) | len(vectors)]
+    words += code
+    words += [0] * (8 - len(words) % 8)  # the testbench always skips at least one word
+    for args, expected in vectors:
+        for value in args + [expected]:
+            words += int_to_words(value)
+    return words
+
+
+def rfc7748_cases():
+    return [(bytes.fromhex(k), bytes.fromhex(u)) for k, u, _ in rfc7748_vectors]
+
+
+def x25519_vectors(cases):
+    """Arguments (u in r0, the scalar in r1) and expected r31 of the `x25519` routine for
+    (scalar, u-coordinate) byte strings"""
+    return [([decode_u(u), decode_scalar(k)], int.from_bytes(x25519(k, u), "little")) for k, u in cases]
+
+
+def make_vectors(count, seed=0, window=0, lazy=True):
+    """Test vector file contents for both routines: `count` random cases each, plus the
+    RFC 7748 examples and a few edge cases"""
+    rng = random.Random(seed)
+    p = field_prime
+    routines = {routine.name: routine for routine in asm.parse(library(lazy), "x25519.s")}
+
+    inputs = [1, 2, p - 1, 121665] + [rng.randrange(1, p) for _ in range(count)]
+    invert_vectors = [([z], invert(z)) for z in inputs]
+
+    cases = rfc7748_cases()
+    cases += [(bytes(rng.getrandbits(8) for _ in range(32)), u.to_bytes(32, "little")) for u in (9, p + 3, 2**255 - 1)]
+    cases += [(bytes(rng.getrandbits(8) for _ in range(32)), bytes(rng.getrandbits(8) for _ in range(32))) for _ in range(count)]
+
+    return vector_program(routines["invert"], window, invert_vectors) + \
+        vector_program(routines["x25519"], window, x25519_vectors(cases))
+
+
+def rfc7748_program(window=0):
+    """Test vectors for the `x25519` routine with only the RFC 7748 examples, for the
+    gateware bench, where each run of the ladder takes milliseconds of simulated time"""
+    routines = {routine.name: routine for routine in asm.parse(library(), "x25519.s")}
+    return vector_program(routines["x25519"], window, x25519_vectors(rfc7748_cases()))
+
+
+def write_vectors(path, words):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<{}I".format(len(words)), *words))
+
+
+def check_reference():
+    """The reference model against RFC 7748"""
+    for k, u, expected in rfc7748_vectors:
+        if x25519(bytes.fromhex(k), bytes.fromhex(u)).hex() != expected:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="X25519 microcode library for the Curve25519 Engine")
+    parser.add_argument("--source", help="Write the library's assembler source here")
+    parser.add_argument("-o", "--output", help="Write the linked microcode image here (little-endian 32-bit words)")
+    parser.add_argument("--table", help="Write the {routine: mpstart, mplen} table here, as JSON")
+    parser.add_argument("--rust", help="Write the image and the table here, as a Rust module")
+    parser.add_argument("--vectors", help="Write test vectors here, in the curve_engine bench format")
+    parser.add_argument("--count", type=int, default=16, help="Random test vectors per routine (default: 16)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="Run the test vectors on the ISS, with both sequencers (written to a temporary file, without --vectors), and again with MUL in place of MLZ")
+    args = parser.parse_args()
+
+    if not check_reference():
+        print("the reference model does not match RFC 7748")
+        return 1
+    image = asm.assemble(library(), "x25519.s")
+    if args.source:
+        with open(args.source, "w") as f:
+            f.write(library())
+    if args.output:
+        image.write_bin(args.output)
+    if args.table:
+        image.write_table(args.table)
+    if args.rust:
+        image.write_rust(args.rust)
+    for name, (start, length) in image.table.items():
+        print("{:24} mpstart 0x{:03x} mplen {}".format(name, start, length))
+
+    failures = 0
+    if args.vectors or args.check:
+        with tempfile.TemporaryDirectory() as scratch:
+            path = args.vectors or os.path.join(scratch, "x25519_vectors.bin")
+            write_vectors(path, make_vectors(args.count, args.seed))
+            if args.check:
+                for pipelined in (False, True):
+                    print("{} sequencer:".format("pipelined" if pipelined else "default"))
+                    failures += run_vectors(path, pipelined=pipelined)
+                # the same vectors on the library built with MUL, to show what MLZ gains
+                path = os.path.join(scratch, "x25519_mul_vectors.bin")
+                write_vectors(path, make_vectors(args.count, args.seed, lazy=False))
+                for pipelined in (False, True):
+                    print("{} sequencer, with MUL in place of MLZ:".format("pipelined" if pipelined else "default"))
+                    failures += run_vectors(path, pipelined=pipelined)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -28,7 +28,7 @@ from litex.build.generic_platform import *
 from litex.soc.integration.builder import *
 
 # pull in the common objects from sim_bench
-from sim_support.sim_bench import Sim, Platform, BiosHelper, CheckSim, SimRunner, Preamble, DoPac
+from sim_support.sim_bench import Sim, Platform, BiosHelper, CheckSim, SimRunner, SIM_BACKENDS, Preamble, DoPac, CachedBuild
 
 # handy to keep around in case a DUT framework needs it
 from litex.soc.integration.soc_core import *
@@ -121,7 +121,7 @@ Add local verilog models by adding to the extra_cmds array,
 or tweak the simulator in unusual ways (e.g. translate a .bin to a .init file) 
 before calling SimRunner
 """
-def run_sim(ci=False):
+def run_sim(ci=False, backend=SimRunner):
     # add third-party modules via extra_cmds, eg. "cd run && xvlog ../MX66UM1G45G/MX66UM1G45G.v"
     extra_cmds =  ['cd run && xvlog -sv ../aes/prim_assert.sv']
     extra_cmds += ['cd run && xvlog -sv ../aes/aes_pkg.sv']
@@ -146,7 +146,7 @@ def run_sim(ci=False):
     extra_cmds += ['cd run && xvlog -sv ../aes/prim_cipher_pkg.sv']
     extra_cmds += ['cd run && xvlog -sv ../aes/prim_lfsr.sv']
     extra_cmds += ['cd run && xvlog -sv ../../../gateware/aes_reg_litex.sv']
-    SimRunner(ci, extra_cmds)
+    backend(ci, extra_cmds)
 
 
 def main():
@@ -154,11 +154,14 @@ def main():
     parser.add_argument(
         "-c", "--ci", default=False, action="store_true", help="Run with settings for automated CI"
     )
+    parser.add_argument(
+        "-s", "--sim", default="xsim", choices=SIM_BACKENDS, help="Simulator to run the bench with (default: xsim)"
+    )
 
     args = parser.parse_args()
 
-    generate_top()
-    run_sim(ci=args.ci)
+    CachedBuild(generate_top)
+    run_sim(ci=args.ci, backend=SIM_BACKENDS[args.sim])
     if args.ci:
         if CheckSim() != 0:
             sys.exit(1)
@@ -28,7 +28,7 @@ from litex.build.generic_platform import *
 from litex.soc.integration.builder import *
 
 # pull in the common objects from sim_bench
-from sim_support.sim_bench import Sim, Platform, BiosHelper, CheckSim, SimRunner, Preamble
+from sim_support.sim_bench import Sim, Platform, BiosHelper, CheckSim, SimRunner, SIM_BACKENDS, Preamble, CachedBuild
 
 # handy to keep around in case a DUT framework needs it
 from litex.soc.integration.soc_core import *
@@ -38,7 +38,11 @@ from litex.soc.interconnect.csr import *
 
 # specific to a given DUT
 from gateware.curve25519.engine import Engine
+from gateware.curve25519 import asm
+from gateware.curve25519.iss import EngineISS, field_prime
+from gateware.curve25519.x25519 import vector_program, rfc7748_program
 from litex.soc.integration.soc import SoCRegion
+import random
 
 """
 set boot_from_spi to change the reset vector and linking location of BIOS
@@ -69,6 +73,98 @@ local_clocks = {
     # add more clocks here, formatted as {"name" : [freq, phase]}
 }
 
+"""
+test vectors computed with the ISS, and the X25519 library's, run ahead of the curve25519-dalek ones. The firmware
+runs every vector on both the default and the pipelined engine, checks r31 of each
+against the vector, and checks that the two register file windows agree.
+"""
+# exercises each hazard of the pipelined sequencer: single-cycle results issuing while a
+# MUL is in flight, back-to-back read after write, a result deferred by the MUL write-back,
+# a second MUL, write after write on a MUL, and BRZ both taken and not; r31 is a digest
+# of every result
+pipeline_source = """
+.routine pipeline
+.reg a r0
+.reg b r1
+.reg n r20
+    MUL r2, a, b
+    PSA n, #ten
+    ADD r3, a, b
+    XOR r4, a, b
+    NOT r11, a
+    SHL r12, b
+    XBT r13, a
+    MSK r14, a, b
+    TRD r15, r3
+loop:
+    XOR r3, r3, r4
+    ADD r4, r4, #one
+    SUB r5, r3, r4
+    SUB n, n, #one
+    BRZ loop_done, n
+    BRZ loop, #zero
+loop_done:
+    ADD r6, r2, r2
+    MUL r7, r2, a
+    MUL r8, r7, b
+    XOR r9, r7, r8
+    MUL r10, a, a
+    PSA r10, b
+    XOR r31, r2, r3
+    XOR r31, r31, r4
+    XOR r31, r31, r5
+    XOR r31, r31, r6
+    XOR r31, r31, r7
+    XOR r31, r31, r8
+    XOR r31, r31, r9
+    XOR r31, r31, r10
+    XOR r31, r31, r11
+    XOR r31, r31, r12
+    XOR r31, r31, r13
+    XOR r31, r31, r14
+    XOR r31, r31, r15
+    XOR r31, r31, n
+    FIN
+"""
+
+# MLZ reduced by TRD/SUB against MUL: r31 is the reduced MLZ result, plus its difference
+# from the MUL result, which should be zero
+lazy_source = """
+.routine lazy
+.reg a r0
+.reg b r1
+    MUL r2, a, b
+    MLZ r3, a, b
+    TRD r4, r3
+    SUB r3, r3, r4
+    XOR r5, r2, r3
+    ADD r31, r3, r5
+    FIN
+"""
+
+def iss_program(source, window, inputs):
+    """A test vector program for the routine in `source`, with the r31 of an ISS run for each of `inputs`"""
+    routine = asm.parse(source)[0]
+    code = asm.link([routine]).words
+    vectors = []
+    for args in inputs:
+        iss = EngineISS()
+        iss.load_microcode(code)
+        for reg, value in enumerate(args):
+            iss.write_reg(window, reg, value)
+        iss.run(0, len(code), window)
+        vectors.append((args, iss.read_reg(window, 31)))
+    return vector_program(routine, window, vectors)
+
+def engine_vectors():
+    rng = random.Random(0)
+    p = field_prime
+    inputs = [[0, 0], [p - 1, p - 1], [1, p - 1]] + [[rng.randrange(p), rng.randrange(p)] for _ in range(2)]
+    edges = [0, 1, p - 1, 2**255 - 1]
+    return iss_program(pipeline_source, 0, inputs) + \
+        iss_program(lazy_source, 0, [[a, b] for a in edges for b in edges]) + \
+        rfc7748_program(window=1)  # X25519 of the RFC 7748 examples, through the microcode library
+
 """
 add the submodules we're testing to the SoC, which is encapsulated in the Sim class
 """
@@ -76,14 +172,19 @@ class Dut(Sim):
     def __init__(self, platform, spiboot=False, **kwargs):
         Sim.__init__(self, platform, custom_clocks=local_clocks, spiboot=spiboot, **kwargs) # SoC magic is in here
         SoCCore.mem_map["vectors"] = 0x30000000 # add test vector ROM area, cached OK
+        SoCCore.mem_map["engine_pipelined"] = 0xe0040000
 
         # sim=True parameter uses explicit copy of DSP48E1 primitive to aid with internal debug
         self.submodules.engine = ClockDomainsRenamer({"eng_clk":"clk50", "rf_clk":"clk200", "mul_clk":"sys"})(Engine(platform, self.mem_map["engine"], sim=True))
         self.add_csr("engine")
         self.add_interrupt("engine")
         self.bus.add_slave("engine", self.engine.bus, SoCRegion(origin=self.mem_map["engine"], size=0x2_0000, cached=False))
+        # the same engine with the pipelined sequencer, run on the same vectors
+        self.submodules.engine_pipelined = ClockDomainsRenamer({"eng_clk":"clk50", "rf_clk":"clk200", "mul_clk":"sys"})(Engine(platform, self.mem_map["engine_pipelined"], sim=True, pipelined=True))
+        self.add_csr("engine_pipelined")
+        self.bus.add_slave("engine_pipelined", self.engine_pipelined.bus, SoCRegion(origin=self.mem_map["engine_pipelined"], size=0x2_0000, cached=False))
 
-        vector_data = get_mem_data("testbench/curve25519-dalek/test_vectors.bin", endianness="little")
+        vector_data = engine_vectors() + get_mem_data("testbench/curve25519-dalek/test_vectors.bin", endianness="little")
         self.add_rom("vectors", self.mem_map["vectors"], len(vector_data)*4, vector_data)
 
 
@@ -157,10 +258,10 @@ Add local verilog models by adding to the extra_cmds array,
 or tweak the simulator in unusual ways (e.g. translate a .bin to a .init file) 
 before calling SimRunner
 """
-def run_sim(ci=False):
+def run_sim(ci=False, backend=SimRunner):
     # add third-party modules via extra_cmds, eg. "cd run && xvlog ../MX66UM1G45G/MX66UM1G45G.v"
     extra_cmds = ['cd run && xvlog ../DSP48E1_sim.v']
-    SimRunner(ci, extra_cmds)
+    backend(ci, extra_cmds)
 
 
 def main():
@@ -168,11 +269,14 @@ def main():
     parser.add_argument(
         "-c", "--ci", default=False, action="store_true", help="Run with settings for automated CI"
     )
+    parser.add_argument(
+        "-s", "--sim", default="xsim", choices=SIM_BACKENDS, help="Simulator to run the bench with (default: xsim)"
+    )
 
     args = parser.parse_args()
 
-    generate_top()
-    run_sim(ci=args.ci)
+    CachedBuild(generate_top)
+    run_sim(ci=args.ci, backend=SIM_BACKENDS[args.sim])
     if args.ci:
         if CheckSim() != 0:
             sys.exit(1)
@@ -31,6 +31,46 @@ fn run_x25519() -> (bool, [u8; 32]) {
     }
 }
 
+// start a program on an engine and wait for it to finish. On the 50th status poll, pause it,
+// read out some of its register file and microcode, and resume it.
+macro_rules! run_engine {
+    ($p:expr, $engine:ident, $rf:expr, $microcode:expr, $window:expr, $mpstart:expr, $mplen:expr) => {
+        // setup the engine to run
+        $p.$engine.window.write(|w| w.bits($window));
+        $p.$engine.mpstart.write(|w| w.bits($mpstart));
+        $p.$engine.mplen.write(|w| w.bits($mplen));
+        // start the run
+        $p.$engine.control.write(|w| w.go().set_bit());
+
+        // test pause for suspend/resume
+        let mut pause_cnt = 0;
+        loop {
+            if pause_cnt != 50 {
+                let status = $p.$engine.status.read().bits();
+                report(&$p, status);
+                if (status & 1) == 0 {
+                    break;
+                }
+            } else {
+                // on the 50th cycle, do a quick pause/resume test
+                $p.$engine.power.write(|w| w.pause_req().set_bit());
+                while $p.$engine.status.read().pause_gnt().bit_is_clear() {
+                }
+                // read from microcode & rf
+                report(&$p, (*($rf.add(0x4))).read());
+                report(&$p, (*($rf.add(0x0))).read());
+                report(&$p, (*($rf.add(0x8))).read());
+                report(&$p, (*($microcode.add(0x4))).read());
+                report(&$p, (*($microcode.add(0x0))).read());
+                report(&$p, (*($microcode.add(0x8))).read());
+                // now resume
+                $p.$engine.power.write(|w| w.pause_req().clear_bit());
+            }
+            pause_cnt += 1;
+        }
+    };
+}
+
 #[cfg(not(test))]
 use sim_bios::*;
 #[no_mangle]
@@ -41,6 +81,13 @@ pub extern "Rust" fn run(p: &pac::Peripherals) {
     let rf_ptr: *mut u32 = 0xe003_0000 as *mut u32;
     let rf = rf_ptr as *mut Volatile<u32>;
 
+    // the same engine, built with the pipelined sequencer; every vector runs on both
+    let microcode_p_ptr: *mut u32 = 0xe004_0000 as *mut u32;
+    let microcode_p = microcode_p_ptr as *mut Volatile<u32>;
+
+    let rf_p_ptr: *mut u32 = 0xe005_0000 as *mut u32;
+    let rf_p = rf_p_ptr as *mut Volatile<u32>;
+
     let vectors_ptr: *mut u32 = 0x3000_0000 as *mut u32;
     let vectors = vectors_ptr as *mut Volatile<u32>;
 
@@ -83,7 +130,9 @@ pub extern "Rust" fn run(p: &pac::Peripherals) {
             let num_vectors = ((*(vectors.add(test_offset))).read() >> 0) & 0x3F_FFFF;
             test_offset += 1;
             for i in 0..code_len as usize {
-                (*(microcode.add(i))).write( (*(vectors.add(test_offset))).read() );
+                let code = (*(vectors.add(test_offset))).read();
+                (*(microcode.add(i))).write(code);
+                (*(microcode_p.add(i))).write(code);
                 test_offset += 1;
             }
 
@@ -95,52 +144,29 @@ pub extern "Rust" fn run(p: &pac::Peripherals) {
             for _vector in 0..num_vectors {
                 for argcnt in 0..num_args {
                     for word in 0..8 {
-                       (*( rf.add( (window * 32 * 8 + argcnt * 8 + word) as usize )) ).write( (*(vectors.add(test_offset))).read() );
+                       let arg = (*(vectors.add(test_offset))).read();
+                       (*( rf.add( (window * 32 * 8 + argcnt * 8 + word) as usize )) ).write(arg);
+                       (*( rf_p.add( (window * 32 * 8 + argcnt * 8 + word) as usize )) ).write(arg);
                        test_offset += 1;
                     }
                 }
 
-                // setup the engine to run
-                p.ENGINE.window.write(|w| w.bits(window));
-                p.ENGINE.mpstart.write(|w| w.bits(load_addr));
-                p.ENGINE.mplen.write(|w| w.bits(code_len));
-                // start the run
-                p.ENGINE.control.write(|w| w.go().set_bit());
-
-                // test pause for suspend/resume
-                let mut pause_cnt = 0;
-                loop {
-                    if pause_cnt != 50 {
-                        let status = p.ENGINE.status.read().bits();
-                        report(&p, status);
-                        if (status & 1) == 0 {
-                            break;
-                        }
-                    } else {
-                        // on the 50th cycle, do a quick pause/resume test
-                        p.ENGINE.power.write(|w| w.pause_req().set_bit());
-                        while p.ENGINE.status.read().pause_gnt().bit_is_clear() {
-                        }
-                        // read from microcode & rf
-                        report(&p, (*(rf.add(0x4))).read());
-                        report(&p, (*(rf.add(0x0))).read());
-                        report(&p, (*(rf.add(0x8))).read());
-                        report(&p, (*(microcode.add(0x4))).read());
-                        report(&p, (*(microcode.add(0x0))).read());
-                        report(&p, (*(microcode.add(0x8))).read());
-                        // now resume
-                        p.ENGINE.power.write(|w| w.pause_req().clear_bit());
-                    }
-                    pause_cnt += 1;
-                }
+                run_engine!(p, ENGINE, rf, microcode, window, load_addr, code_len);
+                run_engine!(p, ENGINE_PIPELINED, rf_p, microcode_p, window, load_addr, code_len);
 
-                // check result
+                // check result: r31 of both engines against the vector, and the whole window of one against the other
                 let mut vect_pass = true;
                 for word in 0..8 {
                     let expect = (*(vectors.add(test_offset))).read();
                     test_offset += 1;
-                    let actual = (*( rf.add( (window * 32 * 8 + 31 * 8 + word) as usize ))).read();
-                    if expect != actual {
+                    let offset = (window * 32 * 8 + 31 * 8 + word) as usize;
+                    if expect != (*(rf.add(offset))).read() || expect != (*(rf_p.add(offset))).read() {
+                        vect_pass = false;
+                    }
+                }
+                for word in 0..32 * 8 {
+                    let offset = (window * 32 * 8 + word) as usize;
+                    if (*(rf.add(offset))).read() != (*(rf_p.add(offset))).read() {
                         vect_pass = false;
                     }
                 }
@@ -54,13 +54,16 @@ sim_bench dut (
     .sim_report(report)
 );
 
-// add extra variables for CI watching here   
+// extra variables for the full (non-CI) dump; signals for CI watching are declared in
+// dut.py, by appending to sim_bench.ci_watchers, and CiWatchers has them dumped
+`ifndef TCL_DUMP
 initial begin
    $dumpvars(0, mclk);
    $dumpvars(0, sync_d);
    $dumpvars(0, tx0);
    $dumpvars(0, tx1);
 end
+`endif
 
 // DUT-specific end condition to make sure it eventually stops running for CI mode
 initial #1_000_000 $finish;
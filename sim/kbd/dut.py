@@ -28,7 +28,7 @@ from litex.build.generic_platform import *
 from litex.soc.integration.builder import *
 
 # pull in the common objects from sim_bench
-from sim_support.sim_bench import Sim, Platform, VEX_CPU_PATH, BiosHelper, CheckSim, SimRunner, Preamble
+from sim_support.sim_bench import Sim, Platform, VEX_CPU_PATH, BiosHelper, CheckSim, SimRunner, SIM_BACKENDS, Preamble, CachedBuild
 
 # handy to keep around in case a DUT framework needs it
 from litex.soc.integration.soc_core import *
@@ -124,9 +124,9 @@ script to drive xsim
 This is dut.py local because we may want to add local verilog models or tweak the
 simulator in unusual ways
 """
-def run_sim(ci=False):
+def run_sim(ci=False, backend=SimRunner):
     os_cmds = []
-    SimRunner(ci, os_cmds)
+    backend(ci, os_cmds)
 
 
 def main():
@@ -134,11 +134,14 @@ def main():
     parser.add_argument(
         "-c", "--ci", default=False, action="store_true", help="Run with settings for automated CI"
     )
+    parser.add_argument(
+        "-s", "--sim", default="xsim", choices=SIM_BACKENDS, help="Simulator to run the bench with (default: xsim)"
+    )
 
     args = parser.parse_args()
 
-    generate_top()
-    run_sim(ci=args.ci)
+    CachedBuild(generate_top)
+    run_sim(ci=args.ci, backend=SIM_BACKENDS[args.sim])
     if args.ci:
         if CheckSim() != 0:
             sys.exit(1)
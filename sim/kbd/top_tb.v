@@ -61,11 +61,14 @@ always @(*) begin
 end
 
 
-// add extra variables for CI watching here
+// extra variables for the full (non-CI) dump; signals for CI watching are declared in
+// dut.py, by appending to sim_bench.ci_watchers, and CiWatchers has them dumped
+`ifndef TCL_DUMP
 initial begin
    $dumpvars(0, row);
    $dumpvars(0, col);
 end
+`endif
 
 // DUT-specific end condition to make sure it eventually stops running for CI mode
 initial #8_000_000 $finish;
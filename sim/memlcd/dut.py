@@ -28,7 +28,7 @@ from litex.build.generic_platform import *
 from litex.soc.integration.builder import *
 
 # pull in the common objects from sim_bench
-from sim_support.sim_bench import Sim, Platform, SimRunner, BiosHelper, CheckSim, Preamble
+from sim_support.sim_bench import Sim, Platform, SimRunner, SIM_BACKENDS, BiosHelper, CheckSim, Preamble, CachedBuild
 
 # handy to keep around in case a DUT framework needs it
 from litex.soc.integration.soc_core import *
@@ -128,8 +128,8 @@ def generate_top():
 
 
 # script to drive xsim
-def run_sim(ci=False):
-    SimRunner(ci, [])
+def run_sim(ci=False, backend=SimRunner):
+    backend(ci, [])
 
 
 
@@ -138,11 +138,14 @@ def main():
     parser.add_argument(
         "-c", "--ci", default=False, action="store_true", help="Run with settings for automated CI"
     )
+    parser.add_argument(
+        "-s", "--sim", default="xsim", choices=SIM_BACKENDS, help="Simulator to run the bench with (default: xsim)"
+    )
 
     args = parser.parse_args()
 
-    generate_top()
-    run_sim(ci=args.ci)
+    CachedBuild(generate_top)
+    run_sim(ci=args.ci, backend=SIM_BACKENDS[args.sim])
     if args.ci:
         if CheckSim() != 0:
             sys.exit(1)
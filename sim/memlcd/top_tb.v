@@ -24,11 +24,13 @@ sim_bench dut (
 );
 
 // extra reporting for CI
+`ifndef TCL_DUMP
 initial begin
         $dumpvars(0, sclk);
         $dumpvars(0, si);
         $dumpvars(0, scs);
 end
+`endif
 
 // DUT-specific end condition to make sure it eventually stops running for CI mode
 initial #600_000 $finish;
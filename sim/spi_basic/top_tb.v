@@ -43,13 +43,16 @@ sim_bench dut (
 //    value <= {value[14:0],value[15]};
 // end
 
-// add extra variables for CI watching here   
+// extra variables for the full (non-CI) dump; signals for CI watching are declared in
+// dut.py, by appending to sim_bench.ci_watchers, and CiWatchers has them dumped
+`ifndef TCL_DUMP
 initial begin
    $dumpvars(0, sclk);
    $dumpvars(0, cipo);
    $dumpvars(0, copi);
    $dumpvars(0, csn);
 end
+`endif
 
 // DUT-specific end condition to make sure it eventually stops running for CI mode
 initial #800_000 $finish;
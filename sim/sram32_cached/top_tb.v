@@ -32,12 +32,15 @@ sim_bench dut (
 
 assign sram_d = sram_oe_n ? 32'hzzzz_zzzzz : (sram_adr + 32'hACE0_0000);
 
-// add extra variables for CI watching here
+// extra variables for the full (non-CI) dump; signals for CI watching are declared in
+// dut.py, by appending to sim_bench.ci_watchers, and CiWatchers has them dumped
+`ifndef TCL_DUMP
 initial begin
    $dumpvars(0, sram_d);
    $dumpvars(0, sram_adr);
    $dumpvars(0, sram_oe_n);
 end
+`endif
 
 // DUT-specific end condition to make sure it eventually stops running for CI mode
 initial #4_000_000 $finish;
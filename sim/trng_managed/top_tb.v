@@ -38,11 +38,14 @@ sim_bench dut (
     .sim_report(report)
 );
 
-// add extra variables for CI watching here   
+// extra variables for the full (non-CI) dump; signals for CI watching are declared in
+// dut.py, by appending to sim_bench.ci_watchers, and CiWatchers has them dumped
+`ifndef TCL_DUMP
 initial begin
    $dumpvars(0, noisebias_on);
    $dumpvars(0, noise_on);
 end
+`endif
 
 // DUT-specific end condition to make sure it eventually stops running for CI mode
 initial #80_000_000 $finish;
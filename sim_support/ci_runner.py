@@ -0,0 +1,224 @@
+#! /usr/bin/env python3
+
+"""
+Run the CI simulations of every bench under sim/ and sim_noci/ concurrently.
+
+Each bench runs `dut.py -c` in its own copy of this repository, so that the jobs
+don't clobber each other's shared state: the Cargo workspace's `target/` directory
+(with `memory.x`, `soc.svd` and the build products), and the sources that the Rust
+build scripts regenerate. The copies are placed next to the repository, so that
+the relative paths to lxbuildenv and VexRiscv still resolve, and are kept between
+runs so that Cargo can build incrementally; only the sources are refreshed, and
+those deleted from the repository since the last run are deleted from the copies.
+
+The outcome of each bench (its `run/ci.log`, or the tail of its output if it
+didn't get that far) is collected into a JUnit XML summary, with the time each
+phase of the run took as properties of the test case.
+"""
+
+import argparse
+import concurrent.futures
+import fnmatch
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from xml.etree import ElementTree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# make the sim_support package importable when this file is run as a script
+sys.path.insert(0, ROOT)
+
+from sim_support import timing
+
+SUITES = ["sim", "sim_noci"]
+# never copied into the per-job trees: build products and version control
+IGNORE = shutil.ignore_patterns(".git", "target", "run", "__pycache__", "*.vcd", "*.wdb")
+# lines of output kept in the summary for a bench that failed without a ci.log
+TAIL_LINES = 50
+# the sources copied into a per-job tree by its last sync, relative to the tree
+MANIFEST = ".ci-sources.json"
+# the keys of sim_bench.SIM_BACKENDS; sim_bench needs LiteX and Migen to import
+SIM_BACKENDS = ["xsim", "verilator"]
+
+
+def discover(suites, patterns):
+    """(suite, bench) for every directory with a dut.py, optionally filtered by
+    glob patterns matched against `suite/bench` or `bench`"""
+    benches = []
+    for suite in suites:
+        suite_dir = os.path.join(ROOT, suite)
+        if not os.path.isdir(suite_dir):
+            continue
+        for bench in sorted(os.listdir(suite_dir)):
+            if not os.path.isfile(os.path.join(suite_dir, bench, "dut.py")):
+                continue
+            name = suite + "/" + bench
+            if patterns and not any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(bench, p) for p in patterns):
+                continue
+            benches.append((suite, bench))
+    return benches
+
+
+def job_root(suite, bench):
+    """Working copy of the repository for one bench"""
+    return os.path.join(os.path.dirname(ROOT), ".{}-ci-{}-{}".format(os.path.basename(ROOT), suite, bench))
+
+
+def sync_tree(root):
+    """Copy the repository's sources into `root`, and delete those that an earlier
+    sync copied there but that are gone from the repository. Whatever the benches
+    generated in the copy (build products, PACs, test vectors) is left alone."""
+    copied = []
+
+    def copy(src, dst):
+        copied.append(os.path.relpath(dst, root))
+        return shutil.copy2(src, dst)
+
+    manifest = os.path.join(root, MANIFEST)
+    try:
+        with open(manifest) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = []
+    shutil.copytree(ROOT, root, ignore=IGNORE, dirs_exist_ok=True, copy_function=copy)
+    for stale in set(previous) - set(copied):
+        path = os.path.join(root, stale)
+        if os.path.isfile(path) or os.path.islink(path):
+            os.remove(path)
+    with open(manifest, "w") as f:
+        json.dump(sorted(copied), f)
+
+
+def run_bench(suite, bench, timeout, sim):
+    """Run one bench in its own copy of the repository; returns a result dict"""
+    root = job_root(suite, bench)
+    sync_tree(root)
+    bench_dir = os.path.join(root, suite, bench)
+    log_path = os.path.join(root, "{}-{}.log".format(suite, bench))
+
+    start = time.time()
+    error = None
+    with open(log_path, "w") as log:
+        # a session of its own, so that a hung bench can be stopped along with its xsim
+        process = subprocess.Popen([sys.executable, "dut.py", "-c", "--sim", sim], cwd=bench_dir,
+                                   stdout=log, stderr=subprocess.STDOUT, start_new_session=(os.name != 'nt'))
+        try:
+            ret = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if os.name != 'nt':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.wait()
+            ret = None
+            error = "timed out after {}s".format(timeout)
+    elapsed = time.time() - start
+
+    ci_log = os.path.join(bench_dir, "run", "ci.log")
+    report = ""
+    if os.path.isfile(ci_log):
+        with open(ci_log) as f:
+            report = f.read().strip()
+    if ret != 0 and error is None:
+        error = "dut.py -c exited with {}".format(ret)
+    with open(log_path, errors="replace") as f:
+        tail = "".join(f.readlines()[-TAIL_LINES:])
+    # the latest timings, if this run of dut.py got as far as recording them
+    runs = timing.load(os.path.join(bench_dir, timing.TIMING_FILE))
+    started = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start))
+    phases = timing.phase_totals(runs[-1]) if runs and runs[-1]["time"] >= started else {}
+
+    return {
+        "suite": suite,
+        "bench": bench,
+        "time": elapsed,
+        "passed": ret == 0,
+        "error": error,
+        "report": report,
+        "output": tail,
+        "log": log_path,
+        "phases": phases,
+    }
+
+
+def write_junit(results, path):
+    """Write a JUnit XML summary, one testsuite per suite directory"""
+    testsuites = ElementTree.Element("testsuites")
+    for suite in dict.fromkeys(result["suite"] for result in results):
+        cases = [result for result in results if result["suite"] == suite]
+        testsuite = ElementTree.SubElement(testsuites, "testsuite", {
+            "name": suite,
+            "tests": str(len(cases)),
+            "failures": str(sum(not case["passed"] for case in cases)),
+            "time": "{:.1f}".format(sum(case["time"] for case in cases)),
+        })
+        for case in cases:
+            testcase = ElementTree.SubElement(testsuite, "testcase", {
+                "classname": suite,
+                "name": case["bench"],
+                "time": "{:.1f}".format(case["time"]),
+            })
+            if case["phases"]:
+                properties = ElementTree.SubElement(testcase, "properties")
+                for phase, seconds in case["phases"].items():
+                    ElementTree.SubElement(properties, "property", {"name": "time." + phase, "value": "{:.1f}".format(seconds)})
+            if not case["passed"]:
+                failure = ElementTree.SubElement(testcase, "failure", {"message": case["error"]})
+                failure.text = case["report"] or case["output"]
+            ElementTree.SubElement(testcase, "system-out").text = case["report"]
+    ElementTree.ElementTree(testsuites).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all CI simulations in parallel")
+    parser.add_argument(
+        "benches", nargs="*", help="Only run these benches (glob patterns, e.g. `sha*` or `sim_noci/*`)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=max(1, (os.cpu_count() or 1) // 4), help="Number of benches to run at once"
+    )
+    parser.add_argument(
+        "--suites", nargs="+", default=SUITES, help="Directories to search for benches (default: sim sim_noci)"
+    )
+    parser.add_argument(
+        "--timeout", type=int, default=None, help="Seconds before a bench is considered hung"
+    )
+    parser.add_argument(
+        "--sim", default="xsim", choices=SIM_BACKENDS, help="Simulator backend passed on to each dut.py"
+    )
+    parser.add_argument(
+        "--junit", default="sim-results.xml", help="Where to write the JUnit XML summary"
+    )
+    args = parser.parse_args()
+
+    benches = discover(args.suites, args.benches)
+    if not benches:
+        print("No benches found")
+        return 1
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        jobs = [pool.submit(run_bench, suite, bench, args.timeout, args.sim) for (suite, bench) in benches]
+        for job in concurrent.futures.as_completed(jobs):
+            result = job.result()
+            results.append(result)
+            print("{:6} {}/{} ({:.0f}s) {}".format(
+                "PASS" if result["passed"] else "FAIL", result["suite"], result["bench"],
+                result["time"], result["report"] or result["error"]))
+
+    results.sort(key=lambda result: benches.index((result["suite"], result["bench"])))
+    write_junit(results, args.junit)
+    failed = [result for result in results if not result["passed"]]
+    print("{} of {} benches passed; summary in {}".format(len(results) - len(failed), len(results), args.junit))
+    for result in failed:
+        print("  failed: {}/{}, see {}".format(result["suite"], result["bench"], result["log"]))
+    print("Phase timings across runs: {} {}".format(sys.executable, os.path.join(ROOT, "sim_support", "timing.py")))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,6 +18,16 @@ always @(*) begin
     end
 end
 
+// in CI mode (TCL_DUMP defined), the sim flow dumps what the CI watchers need instead:
+// through a Tcl script for xsim, or by defining DUMP_INCLUDE and listing the $dumpvars
+// in ci_dump.vh for simulators without a Tcl shell (see sim_bench.py)
+`ifdef DUMP_INCLUDE
+initial begin
+    $dumpfile("ci.vcd");
+    `include "ci_dump.vh"
+end
+`endif
+`ifndef TCL_DUMP
 initial begin
     $dumpfile("ci.vcd");
     // $dumpvars(0, dut); will dump *everything*
@@ -25,3 +35,4 @@ initial begin
     $dumpvars(0, done);
     $dumpvars(0, report);
 end
+`endif
@@ -0,0 +1,70 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 7-series simple dual port block RAM macro, for simulators
+// without unimacro. READ_WIDTH must equal WRITE_WIDTH. Reads return the contents from
+// before a write to the same address on the same edge (READ_FIRST); INIT_FILE and the
+// INIT_xx/INITP_xx contents are not modelled, the memory starts out as zeroes.
+module BRAM_SDP_MACRO #(
+    parameter BRAM_SIZE = "18Kb",
+    parameter DEVICE = "7SERIES",
+    parameter integer WRITE_WIDTH = 0,
+    parameter integer READ_WIDTH = 0,
+    parameter integer DO_REG = 0,
+    parameter INIT_FILE = "NONE",
+    parameter SIM_COLLISION_CHECK = "ALL",
+    parameter [71:0] INIT = 72'h0,
+    parameter [71:0] SRVAL = 72'h0,
+    parameter WRITE_MODE = "WRITE_FIRST",
+    localparam integer WIDTH = READ_WIDTH,
+    // address bits for a full block of this size and width
+    localparam integer ADDR_WIDTH = (BRAM_SIZE == "36Kb" ? 1 : 0) +
+        (WIDTH > 36 ? 8 : WIDTH > 18 ? 9 : WIDTH > 9 ? 10 : WIDTH > 4 ? 11 : WIDTH > 2 ? 12 : WIDTH > 1 ? 13 : 14),
+    localparam integer WE_WIDTH = WIDTH > 36 ? 8 : WIDTH > 18 ? 4 : WIDTH > 9 ? 2 : 1
+) (
+    output [WIDTH - 1:0]      DO,
+    input  [WIDTH - 1:0]      DI,
+    input  [ADDR_WIDTH - 1:0] RDADDR,
+    input                     RDCLK,
+    input                     RDEN,
+    input                     REGCE,
+    input                     RST,
+    input  [WE_WIDTH - 1:0]   WE,
+    input  [ADDR_WIDTH - 1:0] WRADDR,
+    input                     WRCLK,
+    input                     WREN
+);
+
+localparam integer LANE = WIDTH / WE_WIDTH;
+
+reg [WIDTH - 1:0] mem [0:(1 << ADDR_WIDTH) - 1];
+reg [WIDTH - 1:0] latch = INIT[WIDTH - 1:0];
+reg [WIDTH - 1:0] pipe = INIT[WIDTH - 1:0];
+
+integer i;
+initial
+    for (i = 0; i < (1 << ADDR_WIDTH); i = i + 1)
+        mem[i] = {WIDTH{1'b0}};
+
+integer lane;
+always @(posedge WRCLK)
+    if (WREN)
+        for (lane = 0; lane < WE_WIDTH; lane = lane + 1)
+            if (WE[lane])
+                mem[WRADDR][lane * LANE +: LANE] <= DI[lane * LANE +: LANE];
+
+always @(posedge RDCLK) begin
+    if (RDEN)
+        latch <= (RST && DO_REG == 0) ? SRVAL[WIDTH - 1:0] : mem[RDADDR];
+    if (RST)
+        pipe <= SRVAL[WIDTH - 1:0];
+    else if (REGCE)
+        pipe <= latch;
+end
+
+assign DO = DO_REG ? pipe : latch;
+
+initial
+    if (READ_WIDTH != WRITE_WIDTH)
+        $error("BRAM_SDP_MACRO model: READ_WIDTH (%0d) must equal WRITE_WIDTH (%0d)", READ_WIDTH, WRITE_WIDTH);
+
+endmodule
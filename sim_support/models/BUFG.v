@@ -0,0 +1,11 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the Xilinx global clock buffer, for simulators without unisims
+module BUFG (
+    output O,
+    input  I
+);
+
+assign O = I;
+
+endmodule
@@ -0,0 +1,20 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the Xilinx gated global clock buffer, for simulators without unisims
+module BUFGCE #(
+    parameter CE_TYPE = "SYNC",
+    parameter [0:0] IS_CE_INVERTED = 1'b0,
+    parameter [0:0] IS_I_INVERTED = 1'b0
+) (
+    output O,
+    input  CE,
+    input  I
+);
+
+reg enable = 1'b0;
+always @(negedge I)
+    enable <= CE ^ IS_CE_INVERTED;
+
+assign O = (I ^ IS_I_INVERTED) & enable;
+
+endmodule
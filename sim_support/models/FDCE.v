@@ -0,0 +1,29 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the Xilinx D flip-flop with clock enable and asynchronous clear,
+// for simulators without unisims
+module FDCE #(
+    parameter [0:0] INIT = 1'b0,
+    parameter [0:0] IS_C_INVERTED = 1'b0,
+    parameter [0:0] IS_CLR_INVERTED = 1'b0,
+    parameter [0:0] IS_D_INVERTED = 1'b0
+) (
+    output reg Q,
+    input      C,
+    input      CE,
+    input      CLR,
+    input      D
+);
+
+initial Q = INIT;
+
+wire clk = C ^ IS_C_INVERTED;
+wire clr = CLR ^ IS_CLR_INVERTED;
+
+always @(posedge clk or posedge clr)
+    if (clr)
+        Q <= 1'b0;
+    else if (CE)
+        Q <= D ^ IS_D_INVERTED;
+
+endmodule
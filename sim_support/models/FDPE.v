@@ -0,0 +1,29 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the Xilinx D flip-flop with clock enable and asynchronous preset,
+// as used by LiteX's AsyncResetSynchronizer, for simulators without unisims
+module FDPE #(
+    parameter [0:0] INIT = 1'b1,
+    parameter [0:0] IS_C_INVERTED = 1'b0,
+    parameter [0:0] IS_D_INVERTED = 1'b0,
+    parameter [0:0] IS_PRE_INVERTED = 1'b0
+) (
+    output reg Q,
+    input      C,
+    input      CE,
+    input      D,
+    input      PRE
+);
+
+initial Q = INIT;
+
+wire clk = C ^ IS_C_INVERTED;
+wire pre = PRE ^ IS_PRE_INVERTED;
+
+always @(posedge clk or posedge pre)
+    if (pre)
+        Q <= 1'b1;
+    else if (CE)
+        Q <= D ^ IS_D_INVERTED;
+
+endmodule
@@ -0,0 +1,125 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 7-series 36Kb FIFO primitive, for simulators without unisims.
+// The flags follow the read and write pointers immediately, without the clock domain
+// crossing latency of the real FIFO, and ECC is not modelled. Words are stored as
+// {DIP, DI} and read back as {DOP, DO} whatever DATA_WIDTH is; bits beyond DATA_WIDTH
+// are not meaningful. In first word fall through mode DO always shows the oldest word
+// and DO_REG is ignored; otherwise RDEN loads it into the output register, followed by
+// the optional DO_REG stage.
+module FIFO36E1 #(
+    parameter [12:0] ALMOST_EMPTY_OFFSET = 13'h80,
+    parameter [12:0] ALMOST_FULL_OFFSET = 13'h80,
+    parameter integer DATA_WIDTH = 4,
+    parameter integer DO_REG = 1,
+    parameter EN_ECC_READ = "FALSE",
+    parameter EN_ECC_WRITE = "FALSE",
+    parameter EN_SYN = "FALSE",
+    parameter FIFO_MODE = "FIFO36",
+    parameter FIRST_WORD_FALL_THROUGH = "FALSE",
+    parameter [71:0] INIT = 72'h0,
+    parameter SIM_DEVICE = "7SERIES",
+    parameter [71:0] SRVAL = 72'h0,
+    parameter [0:0] IS_RDCLK_INVERTED = 1'b0,
+    parameter [0:0] IS_RDEN_INVERTED = 1'b0,
+    parameter [0:0] IS_RSTREG_INVERTED = 1'b0,
+    parameter [0:0] IS_RST_INVERTED = 1'b0,
+    parameter [0:0] IS_WRCLK_INVERTED = 1'b0,
+    parameter [0:0] IS_WREN_INVERTED = 1'b0
+) (
+    output            ALMOSTEMPTY,
+    output            ALMOSTFULL,
+    output            DBITERR,
+    output [63:0]     DO,
+    output [7:0]      DOP,
+    output [7:0]      ECCPARITY,
+    output            EMPTY,
+    output            FULL,
+    output [12:0]     RDCOUNT,
+    output reg        RDERR,
+    output            SBITERR,
+    output [12:0]     WRCOUNT,
+    output reg        WRERR,
+    input  [63:0]     DI,
+    input  [7:0]      DIP,
+    input             INJECTDBITERR,
+    input             INJECTSBITERR,
+    input             RDCLK,
+    input             RDEN,
+    input             REGCE,
+    input             RST,
+    input             RSTREG,
+    input             WRCLK,
+    input             WREN
+);
+
+localparam integer ADDR_WIDTH = DATA_WIDTH > 36 ? 9 : DATA_WIDTH > 18 ? 10 : DATA_WIDTH > 9 ? 11 : DATA_WIDTH > 4 ? 12 : 13;
+localparam integer DEPTH = 1 << ADDR_WIDTH;
+localparam FWFT = FIRST_WORD_FALL_THROUGH == "TRUE";
+
+wire rdclk = RDCLK ^ IS_RDCLK_INVERTED;
+wire wrclk = WRCLK ^ IS_WRCLK_INVERTED;
+wire rden = RDEN ^ IS_RDEN_INVERTED;
+wire wren = WREN ^ IS_WREN_INVERTED;
+wire rst = RST ^ IS_RST_INVERTED;
+wire rstreg = RSTREG ^ IS_RSTREG_INVERTED;
+
+reg [71:0] mem [0:DEPTH - 1];
+// one more bit than the address, to tell full from empty
+reg [ADDR_WIDTH:0] rdptr = 0;
+reg [ADDR_WIDTH:0] wrptr = 0;
+reg [71:0] latch = INIT;
+reg [71:0] pipe = INIT;
+
+wire [ADDR_WIDTH:0] level = wrptr - rdptr;
+assign EMPTY = level == 0;
+assign FULL = level == DEPTH;
+assign ALMOSTEMPTY = level <= ALMOST_EMPTY_OFFSET;
+assign ALMOSTFULL = DEPTH - level <= ALMOST_FULL_OFFSET;
+assign RDCOUNT = rdptr;
+assign WRCOUNT = wrptr;
+
+initial begin
+    RDERR = 1'b0;
+    WRERR = 1'b0;
+end
+
+always @(posedge wrclk or posedge rst)
+    if (rst) begin
+        wrptr <= 0;
+        WRERR <= 1'b0;
+    end else begin
+        WRERR <= wren && FULL;
+        if (wren && !FULL) begin
+            mem[wrptr[ADDR_WIDTH - 1:0]] <= {DIP, DI};
+            wrptr <= wrptr + 1;
+        end
+    end
+
+always @(posedge rdclk or posedge rst)
+    if (rst) begin
+        rdptr <= 0;
+        RDERR <= 1'b0;
+        latch <= SRVAL;
+    end else begin
+        RDERR <= rden && EMPTY;
+        if (rden && !EMPTY) begin
+            latch <= mem[rdptr[ADDR_WIDTH - 1:0]];
+            rdptr <= rdptr + 1;
+        end
+    end
+
+always @(posedge rdclk)
+    if (rstreg || rst)
+        pipe <= SRVAL;
+    else if (REGCE)
+        pipe <= latch;
+
+wire [71:0] out = FWFT ? mem[rdptr[ADDR_WIDTH - 1:0]] : DO_REG ? pipe : latch;
+assign DO = out[63:0];
+assign DOP = out[71:64];
+assign DBITERR = 1'b0;
+assign SBITERR = 1'b0;
+assign ECCPARITY = 8'h0;
+
+endmodule
@@ -0,0 +1,77 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 72-bit wide 36Kb FIFO, for simulators without unisims: a
+// FIFO36E1 model in 72-bit mode (see FIFO36E1.v for what is left out)
+module FIFO36_72 #(
+    parameter [8:0] ALMOST_EMPTY_OFFSET = 9'h80,
+    parameter [8:0] ALMOST_FULL_OFFSET = 9'h80,
+    parameter integer DO_REG = 1,
+    parameter EN_ECC_READ = "FALSE",
+    parameter EN_ECC_WRITE = "FALSE",
+    parameter EN_SYN = "FALSE",
+    parameter FIRST_WORD_FALL_THROUGH = "FALSE",
+    parameter SIM_MODE = "SAFE"
+) (
+    output        ALMOSTEMPTY,
+    output        ALMOSTFULL,
+    output        DBITERR,
+    output [63:0] DO,
+    output [7:0]  DOP,
+    output [7:0]  ECCPARITY,
+    output        EMPTY,
+    output        FULL,
+    output [8:0]  RDCOUNT,
+    output        RDERR,
+    output        SBITERR,
+    output [8:0]  WRCOUNT,
+    output        WRERR,
+    input  [63:0] DI,
+    input  [7:0]  DIP,
+    input         RDCLK,
+    input         RDEN,
+    input         RST,
+    input         WRCLK,
+    input         WREN
+);
+
+wire [12:0] rdcount;
+wire [12:0] wrcount;
+assign RDCOUNT = rdcount[8:0];
+assign WRCOUNT = wrcount[8:0];
+
+FIFO36E1 #(
+    .ALMOST_EMPTY_OFFSET({4'h0, ALMOST_EMPTY_OFFSET}),
+    .ALMOST_FULL_OFFSET({4'h0, ALMOST_FULL_OFFSET}),
+    .DATA_WIDTH(72),
+    .DO_REG(DO_REG),
+    .EN_SYN(EN_SYN),
+    .FIFO_MODE("FIFO36_72"),
+    .FIRST_WORD_FALL_THROUGH(FIRST_WORD_FALL_THROUGH)
+) fifo (
+    .ALMOSTEMPTY(ALMOSTEMPTY),
+    .ALMOSTFULL(ALMOSTFULL),
+    .DBITERR(DBITERR),
+    .DO(DO),
+    .DOP(DOP),
+    .ECCPARITY(ECCPARITY),
+    .EMPTY(EMPTY),
+    .FULL(FULL),
+    .RDCOUNT(rdcount),
+    .RDERR(RDERR),
+    .SBITERR(SBITERR),
+    .WRCOUNT(wrcount),
+    .WRERR(WRERR),
+    .DI(DI),
+    .DIP(DIP),
+    .INJECTDBITERR(1'b0),
+    .INJECTSBITERR(1'b0),
+    .RDCLK(RDCLK),
+    .RDEN(RDEN),
+    .REGCE(1'b1),
+    .RST(RST),
+    .RSTREG(1'b0),
+    .WRCLK(WRCLK),
+    .WREN(WREN)
+);
+
+endmodule
@@ -0,0 +1,84 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 7-series synchronous FIFO macro, for simulators without
+// unimacro. Reads are standard (not first word fall through): RDEN loads the oldest word
+// into DO on the next edge of CLK, followed by the optional DO_REG stage. The
+// flags follow the pointers on the same edge.
+module FIFO_SYNC_MACRO #(
+    parameter DEVICE = "7SERIES",
+    parameter [12:0] ALMOST_EMPTY_OFFSET = 13'h80,
+    parameter [12:0] ALMOST_FULL_OFFSET = 13'h80,
+    parameter integer DATA_WIDTH = 4,
+    parameter integer DO_REG = 0,
+    parameter FIFO_SIZE = "18Kb",
+    parameter [71:0] INIT = 72'h0,
+    parameter SIM_MODE = "SAFE",
+    parameter [71:0] SRVAL = 72'h0,
+    // address bits for a FIFO of this size and width
+    localparam integer ADDR_WIDTH = (FIFO_SIZE == "36Kb" ? 1 : 0) +
+        (DATA_WIDTH > 36 ? 8 : DATA_WIDTH > 18 ? 9 : DATA_WIDTH > 9 ? 10 : DATA_WIDTH > 4 ? 11 : 12),
+    localparam integer COUNT_WIDTH = ADDR_WIDTH
+) (
+    output                       ALMOSTEMPTY,
+    output                       ALMOSTFULL,
+    output [DATA_WIDTH - 1:0]    DO,
+    output                       EMPTY,
+    output                       FULL,
+    output [COUNT_WIDTH - 1:0]   RDCOUNT,
+    output reg                   RDERR,
+    output [COUNT_WIDTH - 1:0]   WRCOUNT,
+    output reg                   WRERR,
+    input                        CLK,
+    input  [DATA_WIDTH - 1:0]    DI,
+    input                        RDEN,
+    input                        RST,
+    input                        WREN
+);
+
+localparam integer DEPTH = 1 << ADDR_WIDTH;
+
+reg [DATA_WIDTH - 1:0] mem [0:DEPTH - 1];
+// one more bit than the address, to tell full from empty
+reg [ADDR_WIDTH:0] rdptr = 0;
+reg [ADDR_WIDTH:0] wrptr = 0;
+reg [DATA_WIDTH - 1:0] latch = INIT[DATA_WIDTH - 1:0];
+reg [DATA_WIDTH - 1:0] pipe = INIT[DATA_WIDTH - 1:0];
+
+wire [ADDR_WIDTH:0] level = wrptr - rdptr;
+assign EMPTY = level == 0;
+assign FULL = level == DEPTH;
+assign ALMOSTEMPTY = level <= ALMOST_EMPTY_OFFSET;
+assign ALMOSTFULL = DEPTH - level <= ALMOST_FULL_OFFSET;
+assign RDCOUNT = rdptr[COUNT_WIDTH - 1:0];
+assign WRCOUNT = wrptr[COUNT_WIDTH - 1:0];
+
+initial begin
+    RDERR = 1'b0;
+    WRERR = 1'b0;
+end
+
+always @(posedge CLK or posedge RST)
+    if (RST) begin
+        rdptr <= 0;
+        wrptr <= 0;
+        RDERR <= 1'b0;
+        WRERR <= 1'b0;
+        latch <= SRVAL[DATA_WIDTH - 1:0];
+        pipe <= SRVAL[DATA_WIDTH - 1:0];
+    end else begin
+        RDERR <= RDEN && EMPTY;
+        WRERR <= WREN && FULL;
+        if (WREN && !FULL) begin
+            mem[wrptr[ADDR_WIDTH - 1:0]] <= DI;
+            wrptr <= wrptr + 1;
+        end
+        if (RDEN && !EMPTY) begin
+            latch <= mem[rdptr[ADDR_WIDTH - 1:0]];
+            rdptr <= rdptr + 1;
+        end
+        pipe <= latch;
+    end
+
+assign DO = DO_REG ? pipe : latch;
+
+endmodule
@@ -0,0 +1,75 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 7-series input DDR register, for simulators without unisims.
+// Q1 carries the data sampled on the rising edge of C and Q2 that sampled on the falling
+// edge. With DDR_CLK_EDGE = "OPPOSITE_EDGE" each is updated on its own edge; "SAME_EDGE"
+// updates both on the rising edge, and "SAME_EDGE_PIPELINED" delays Q1 by a cycle so that
+// both halves of a bit period appear together. R and S are synchronous unless
+// SRTYPE = "ASYNC".
+module IDDR #(
+    parameter DDR_CLK_EDGE = "OPPOSITE_EDGE",
+    parameter [0:0] INIT_Q1 = 1'b0,
+    parameter [0:0] INIT_Q2 = 1'b0,
+    parameter SRTYPE = "SYNC",
+    parameter IDELAY_VALUE = 0,
+    parameter [0:0] IS_C_INVERTED = 1'b0,
+    parameter [0:0] IS_D_INVERTED = 1'b0
+) (
+    output Q1,
+    output Q2,
+    input  C,
+    input  CE,
+    input  D,
+    input  R,
+    input  S
+);
+
+localparam OPPOSITE_EDGE = DDR_CLK_EDGE == "OPPOSITE_EDGE";
+localparam PIPELINED = DDR_CLK_EDGE == "SAME_EDGE_PIPELINED";
+
+wire clk = C ^ IS_C_INVERTED;
+wire d = D ^ IS_D_INVERTED;
+// data sampled on each edge, and the outputs registered on the rising edge
+reg rise = INIT_Q1;
+reg fall = INIT_Q2;
+reg q1 = INIT_Q1;
+reg q2 = INIT_Q2;
+
+generate if (SRTYPE == "ASYNC") begin : async_sr
+    always @(posedge clk or posedge R or posedge S)
+        if (R)
+            {rise, q1, q2} <= 3'b000;
+        else if (S)
+            {rise, q1, q2} <= 3'b111;
+        else if (CE)
+            {rise, q1, q2} <= {d, PIPELINED ? rise : d, fall};
+
+    always @(negedge clk or posedge R or posedge S)
+        if (R)
+            fall <= 1'b0;
+        else if (S)
+            fall <= 1'b1;
+        else if (CE)
+            fall <= d;
+end else begin : sync_sr
+    always @(posedge clk)
+        if (R)
+            {rise, q1, q2} <= 3'b000;
+        else if (S)
+            {rise, q1, q2} <= 3'b111;
+        else if (CE)
+            {rise, q1, q2} <= {d, PIPELINED ? rise : d, fall};
+
+    always @(negedge clk)
+        if (R)
+            fall <= 1'b0;
+        else if (S)
+            fall <= 1'b1;
+        else if (CE)
+            fall <= d;
+end endgenerate
+
+assign Q1 = OPPOSITE_EDGE ? rise : q1;
+assign Q2 = OPPOSITE_EDGE ? fall : q2;
+
+endmodule
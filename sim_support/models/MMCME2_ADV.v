@@ -0,0 +1,160 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 7-series MMCM, for simulators without unisims. Only the
+// frequency synthesis is modelled: the outputs are free-running clocks computed from
+// CLKIN1_PERIOD and the divide/multiply/phase parameters, started once LOCKED rises
+// LOCK_CYCLES input cycles after RST is released. CLKIN1 itself only paces the lock;
+// the dynamic reconfiguration and phase shift ports are inert.
+module MMCME2_ADV #(
+    parameter BANDWIDTH = "OPTIMIZED",
+    parameter COMPENSATION = "ZHOLD",
+    parameter STARTUP_WAIT = "FALSE",
+    parameter real CLKIN1_PERIOD = 10.0,
+    parameter real CLKIN2_PERIOD = 0.0,
+    parameter real REF_JITTER1 = 0.01,
+    parameter real REF_JITTER2 = 0.01,
+    parameter integer DIVCLK_DIVIDE = 1,
+    parameter real CLKFBOUT_MULT_F = 5.0,
+    parameter real CLKFBOUT_PHASE = 0.0,
+    parameter CLKFBOUT_USE_FINE_PS = "FALSE",
+    parameter real CLKOUT0_DIVIDE_F = 1.0,
+    parameter real CLKOUT0_PHASE = 0.0,
+    parameter real CLKOUT0_DUTY_CYCLE = 0.5,
+    parameter CLKOUT0_USE_FINE_PS = "FALSE",
+    parameter integer CLKOUT1_DIVIDE = 1,
+    parameter real CLKOUT1_PHASE = 0.0,
+    parameter real CLKOUT1_DUTY_CYCLE = 0.5,
+    parameter CLKOUT1_USE_FINE_PS = "FALSE",
+    parameter integer CLKOUT2_DIVIDE = 1,
+    parameter real CLKOUT2_PHASE = 0.0,
+    parameter real CLKOUT2_DUTY_CYCLE = 0.5,
+    parameter CLKOUT2_USE_FINE_PS = "FALSE",
+    parameter integer CLKOUT3_DIVIDE = 1,
+    parameter real CLKOUT3_PHASE = 0.0,
+    parameter real CLKOUT3_DUTY_CYCLE = 0.5,
+    parameter CLKOUT3_USE_FINE_PS = "FALSE",
+    parameter CLKOUT4_CASCADE = "FALSE",
+    parameter integer CLKOUT4_DIVIDE = 1,
+    parameter real CLKOUT4_PHASE = 0.0,
+    parameter real CLKOUT4_DUTY_CYCLE = 0.5,
+    parameter CLKOUT4_USE_FINE_PS = "FALSE",
+    parameter integer CLKOUT5_DIVIDE = 1,
+    parameter real CLKOUT5_PHASE = 0.0,
+    parameter real CLKOUT5_DUTY_CYCLE = 0.5,
+    parameter CLKOUT5_USE_FINE_PS = "FALSE",
+    parameter integer CLKOUT6_DIVIDE = 1,
+    parameter real CLKOUT6_PHASE = 0.0,
+    parameter real CLKOUT6_DUTY_CYCLE = 0.5,
+    parameter CLKOUT6_USE_FINE_PS = "FALSE",
+    parameter SS_EN = "FALSE",
+    parameter SS_MODE = "CENTER_HIGH",
+    parameter integer SS_MOD_PERIOD = 10000,
+    parameter integer LOCK_CYCLES = 16
+) (
+    output CLKFBOUT,
+    output CLKFBOUTB,
+    output CLKFBSTOPPED,
+    output CLKINSTOPPED,
+    output CLKOUT0,
+    output CLKOUT0B,
+    output CLKOUT1,
+    output CLKOUT1B,
+    output CLKOUT2,
+    output CLKOUT2B,
+    output CLKOUT3,
+    output CLKOUT3B,
+    output CLKOUT4,
+    output CLKOUT5,
+    output CLKOUT6,
+    output [15:0] DO,
+    output DRDY,
+    output LOCKED,
+    output PSDONE,
+    input  CLKFBIN,
+    input  CLKIN1,
+    input  CLKIN2,
+    input  CLKINSEL,
+    input  [6:0] DADDR,
+    input  DCLK,
+    input  DEN,
+    input  [15:0] DI,
+    input  DWE,
+    input  PSCLK,
+    input  PSEN,
+    input  PSINCDEC,
+    input  PWRDWN,
+    input  RST
+);
+
+// VCO period, in ns
+localparam real VCO_PERIOD = CLKIN1_PERIOD * DIVCLK_DIVIDE / CLKFBOUT_MULT_F;
+
+reg [$clog2(LOCK_CYCLES + 1) - 1:0] lock_count = 0;
+always @(posedge CLKIN1 or posedge RST)
+    if (RST)
+        lock_count <= 0;
+    else if (!PWRDWN && lock_count != LOCK_CYCLES)
+        lock_count <= lock_count + 1;
+
+wire running = lock_count == LOCK_CYCLES;
+assign LOCKED = running;
+
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKFBOUT_MULT_F), .PHASE(CLKFBOUT_PHASE), .DUTY_CYCLE(0.5))
+    fb (.run(running), .clk(CLKFBOUT));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT0_DIVIDE_F), .PHASE(CLKOUT0_PHASE), .DUTY_CYCLE(CLKOUT0_DUTY_CYCLE))
+    out0 (.run(running), .clk(CLKOUT0));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT1_DIVIDE), .PHASE(CLKOUT1_PHASE), .DUTY_CYCLE(CLKOUT1_DUTY_CYCLE))
+    out1 (.run(running), .clk(CLKOUT1));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT2_DIVIDE), .PHASE(CLKOUT2_PHASE), .DUTY_CYCLE(CLKOUT2_DUTY_CYCLE))
+    out2 (.run(running), .clk(CLKOUT2));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT3_DIVIDE), .PHASE(CLKOUT3_PHASE), .DUTY_CYCLE(CLKOUT3_DUTY_CYCLE))
+    out3 (.run(running), .clk(CLKOUT3));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT4_DIVIDE), .PHASE(CLKOUT4_PHASE), .DUTY_CYCLE(CLKOUT4_DUTY_CYCLE))
+    out4 (.run(running), .clk(CLKOUT4));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT5_DIVIDE), .PHASE(CLKOUT5_PHASE), .DUTY_CYCLE(CLKOUT5_DUTY_CYCLE))
+    out5 (.run(running), .clk(CLKOUT5));
+MMCME2_ADV_clkout #(.PERIOD(VCO_PERIOD * CLKOUT6_DIVIDE), .PHASE(CLKOUT6_PHASE), .DUTY_CYCLE(CLKOUT6_DUTY_CYCLE))
+    out6 (.run(running), .clk(CLKOUT6));
+
+assign CLKFBOUTB = ~CLKFBOUT;
+assign CLKOUT0B = ~CLKOUT0;
+assign CLKOUT1B = ~CLKOUT1;
+assign CLKOUT2B = ~CLKOUT2;
+assign CLKOUT3B = ~CLKOUT3;
+assign CLKFBSTOPPED = 1'b0;
+assign CLKINSTOPPED = 1'b0;
+assign DO = 16'h0;
+assign DRDY = 1'b0;
+assign PSDONE = 1'b0;
+
+endmodule
+
+// One output of the MMCM model: a clock of the given period (ns), phase (degrees) and
+// duty cycle, running while `run` is high
+module MMCME2_ADV_clkout #(
+    parameter real PERIOD = 10.0,
+    parameter real PHASE = 0.0,
+    parameter real DUTY_CYCLE = 0.5
+) (
+    input      run,
+    output reg clk
+);
+
+localparam real OFFSET = PERIOD * (PHASE < 0.0 ? PHASE + 360.0 : PHASE) / 360.0;
+localparam real HIGH = PERIOD * DUTY_CYCLE;
+
+initial clk = 1'b0;
+
+always begin
+    clk = 1'b0;
+    wait (run);
+    #(OFFSET);
+    while (run) begin
+        clk = 1'b1;
+        #(HIGH);
+        clk = 1'b0;
+        #(PERIOD - HIGH);
+    end
+end
+
+endmodule
@@ -0,0 +1,69 @@
+`timescale 1ns/1ps
+
+// Behavioural model of the 7-series output DDR register, for simulators without unisims.
+// With DDR_CLK_EDGE = "SAME_EDGE" both D1 and D2 are sampled on the rising edge of C, and
+// D2 is presented on the following falling edge; with "OPPOSITE_EDGE" D2 is sampled on
+// the falling edge. R and S are synchronous unless SRTYPE = "ASYNC".
+module ODDR #(
+    parameter DDR_CLK_EDGE = "OPPOSITE_EDGE",
+    parameter [0:0] INIT = 1'b0,
+    parameter SRTYPE = "SYNC",
+    parameter [0:0] IS_C_INVERTED = 1'b0,
+    parameter [0:0] IS_D1_INVERTED = 1'b0,
+    parameter [0:0] IS_D2_INVERTED = 1'b0
+) (
+    output Q,
+    input  C,
+    input  CE,
+    input  D1,
+    input  D2,
+    input  R,
+    input  S
+);
+
+localparam SAME_EDGE = DDR_CLK_EDGE == "SAME_EDGE";
+
+wire clk = C ^ IS_C_INVERTED;
+wire d1 = D1 ^ IS_D1_INVERTED;
+wire d2 = D2 ^ IS_D2_INVERTED;
+reg rise = INIT;
+reg fall = INIT;
+reg d2_held = INIT;
+
+generate if (SRTYPE == "ASYNC") begin : async_sr
+    always @(posedge clk or posedge R or posedge S)
+        if (R)
+            {rise, d2_held} <= 2'b00;
+        else if (S)
+            {rise, d2_held} <= 2'b11;
+        else if (CE)
+            {rise, d2_held} <= {d1, d2};
+
+    always @(negedge clk or posedge R or posedge S)
+        if (R)
+            fall <= 1'b0;
+        else if (S)
+            fall <= 1'b1;
+        else if (CE)
+            fall <= SAME_EDGE ? d2_held : d2;
+end else begin : sync_sr
+    always @(posedge clk)
+        if (R)
+            {rise, d2_held} <= 2'b00;
+        else if (S)
+            {rise, d2_held} <= 2'b11;
+        else if (CE)
+            {rise, d2_held} <= {d1, d2};
+
+    always @(negedge clk)
+        if (R)
+            fall <= 1'b0;
+        else if (S)
+            fall <= 1'b1;
+        else if (CE)
+            fall <= SAME_EDGE ? d2_held : d2;
+end endgenerate
+
+assign Q = clk ? rise : fall;
+
+endmodule
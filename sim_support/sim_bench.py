@@ -4,7 +4,13 @@ from operator import floordiv
 import sys
 import os
 import shutil
+import subprocess
 import argparse
+import hashlib
+import json
+import re
+from fnmatch import fnmatch
+from itertools import takewhile
 
 # ASSUME: project structure is <project_root>/deps/gateware/sim/<sim_proj>/this_script
 # where the "gateware" repository is cloned into <project_root>/deps/
@@ -17,6 +23,9 @@ sys.path.insert(0, script_path)
 
 import lxbuildenv
 
+from sim_support.tasks import TaskGraph, TaskError, copy_files, cargo_tool
+from sim_support.timing import timer
+
 # This variable defines all the external programs that this module
 # relies on.  lxbuildenv reads this variable in order to ensure
 # the build will finish without exiting due to missing third-party
@@ -158,8 +167,120 @@ class Sim(SoCCore):
         self.submodules.simstatus = SimStatus(platform.request("sim"))
         self.add_csr("simstatus")
 
+# build products of earlier runs, keyed on the hashes of their inputs (see CachedBuild)
+BUILD_CACHE = os.path.join('run', 'build_cache')
+# Rust sources that go into a BIOS build; generated.rs and pac.rs are written by build scripts
+RUST_SOURCES = ['*.rs', '*.toml', '*.x', 'Cargo.lock']
+RUST_GENERATED = ['generated.rs', 'pac.rs']
+
+def hash_tree(digest, root, patterns, exclude=[]):
+    """Add the names and contents of the files under `root` matching `patterns` to
+    `digest`, skipping build directories and PACs generated by DoPac"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in ('target', 'run', '__pycache__', '.git')
+                             and not os.path.isfile(os.path.join(dirpath, d, '.svd-hash')))
+        for name in sorted(filenames):
+            if any(fnmatch(name, p) for p in patterns) and name not in exclude:
+                path = os.path.join(dirpath, name)
+                digest.update(path.encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+
+def hash_file(path):
+    """Hash of a file's contents, or '' if it doesn't exist"""
+    if not os.path.isfile(path):
+        return ''
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def tool_versions(*cmds):
+    """The version banners of external tools, as a string to hash"""
+    versions = []
+    for cmd in cmds:
+        try:
+            versions.append(subprocess.run(cmd, capture_output=True, text=True).stdout)
+        except OSError:
+            versions.append('')
+    return '\n'.join(versions)
+
+# this bench's copy of the SVD; every bench writes its own to the shared ../../target/soc.svd
+BENCH_SVD = os.path.join('run', 'soc.svd')
+
+def rust_key(*extra):
+    """Hash of everything a BIOS build depends on: the testbench and support crates,
+    the workspace manifest (with its [patch] overrides) and lockfile, this bench's
+    SVD, the linker scripts and the Rust toolchain"""
+    digest = hashlib.sha256()
+    hash_tree(digest, 'testbench', RUST_SOURCES, RUST_GENERATED)
+    hash_tree(digest, os.path.join('..', '..', 'sim_support', 'rust'), RUST_SOURCES, RUST_GENERATED)
+    for path in ['../../Cargo.toml', '../../Cargo.lock', '../../sim_support/memory_spi.x', '../../sim_support/memory_rom.x', BENCH_SVD]:
+        digest.update(hash_file(path).encode())
+    digest.update(tool_versions(['rustc', '-Vv'], ['cargo', '-V']).encode())
+    for item in extra:
+        digest.update(str(item).encode())
+    return digest.hexdigest()
+
+def module_fingerprint(module):
+    """Location and newest source mtime of an installed Python package (LiteX, Migen),
+    so that updating it invalidates the build cache without hashing all of it"""
+    root = os.path.dirname(module.__file__)
+    newest = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith('.py'):
+                newest = max(newest, os.stat(os.path.join(dirpath, name)).st_mtime_ns)
+    return "{}:{}".format(root, newest)
+
+class CachedBuild():
+    """Run `generate_top`, unless none of its inputs changed since the last time it
+    completed: the gateware Python sources, this file, every file of the sim's own
+    directory outside of run/ and the build directories (dut.py, and any data it
+    reads at elaboration, such as test vectors), the Rust support crates, the Cargo
+    workspace, and the LiteX/Migen/Rust toolchains. Even when generate_top does run, DoPac and BiosHelper skip their
+    steps if their own inputs are unchanged."""
+    def __init__(self, generate_top):
+        key = self.key()
+
+        stamp = os.path.join(BUILD_CACHE, 'generate_top.json')
+        outputs = [os.path.join('run', 'gateware'), os.path.join('run', 'software', 'bios', 'bios.bin'), BENCH_SVD]
+        try:
+            with open(stamp) as f:
+                cached = json.load(f).get('key')
+        except (OSError, ValueError):
+            cached = None
+        if cached == key and all(os.path.exists(output) for output in outputs):
+            print("generate_top: sources unchanged since the last build, reusing run/")
+            timer.info['generate_top'] = 'cached'
+            return
+
+        generate_top()
+        timer.mark(None)  # the end of the second LiteX pass
+        os.makedirs(BUILD_CACHE, exist_ok=True)
+        with open(stamp, 'w') as f:
+            # rehashed, as the build has just written this bench's SVD
+            json.dump({'key': self.key()}, f)
+
+    @staticmethod
+    def key():
+        import litex, migen
+
+        digest = hashlib.sha256()
+        hash_tree(digest, os.path.join('..', '..', 'gateware'), ['*.py'])
+        hash_tree(digest, os.path.join('..', '..', 'sim_support'), ['*.py'])
+        hash_tree(digest, '.', ['*'])
+        digest.update(module_fingerprint(litex).encode())
+        digest.update(module_fingerprint(migen).encode())
+        digest.update(rust_key().encode())
+        return digest.hexdigest()
+
 class BiosHelper():
     def __init__(self, soc, spiboot, nightly=False, target=TARGET):
+        timer.mark('bios')
+        self.build(spiboot, nightly, target)
+        # generate_top goes on to the second LiteX pass, with the BIOS in the ROM
+        timer.mark('litex_pass2')
+
+    def build(self, spiboot, nightly, target):
         sim_name = os.path.basename(os.getcwd())
 
         # setup the correct linker script for the BIOS build based on the SoC's boot vector settings
@@ -167,107 +288,413 @@ class BiosHelper():
             shutil.copyfile('../../sim_support/memory_spi.x', '../../target/memory.x')
         else:
             shutil.copyfile('../../sim_support/memory_rom.x', '../../target/memory.x')
-
-        # run the BIOS build
-        ret = 0
-        try:
-            os.system("mkdir run" + os.path.sep + "software" + os.path.sep + "bios") # make the directory if it doesn't exist
-        except:
-            pass
-        if nightly:
-            ret += os.system("cd testbench && cargo +nightly build --target {} --release".format(target))
-        else:
-            ret += os.system("cd testbench && cargo build --target {} --release".format(target))
-        ret += os.system("riscv64-unknown-elf-objcopy -j .text -j .rodata -j .data -O binary ../../target/{}/release/{} run/software/bios/bios.bin".format(target, sim_name))
+        # the first LiteX pass has just written the shared SVD; keep this bench's own copy
+        shutil.copyfile('../../target/soc.svd', BENCH_SVD)
+
+        # reuse the BIOS from an earlier build with the same inputs
+        cached = os.path.join(BUILD_CACHE, 'bios-' + rust_key(sim_name, nightly, target))
+        if os.path.isfile(os.path.join(cached, 'bios.bin')):
+            os.makedirs(os.path.join('run', 'software', 'bios'), exist_ok=True)
+            shutil.copyfile(os.path.join(cached, 'bios.bin'), os.path.join('run', 'software', 'bios', 'bios.bin'))
+            shutil.copyfile(os.path.join(cached, 'bios.S'), os.path.join('run', 'bios.S'))
+            return
+
+        # run the BIOS build; the binary and the listing are extracted in parallel
+        os.makedirs(os.path.join('run', 'software', 'bios'), exist_ok=True)
+        elf = os.path.join('..', '..', 'target', target, 'release', sim_name)
+        # cargo builds incrementally, and the extractions are skipped if the ELF is unchanged
+        tasks = TaskGraph(stamp_dir=os.path.join(BUILD_CACHE, 'tasks'))
+        tasks.add('cargo', ['cargo'] + (['+nightly'] if nightly else []) + ['build', '--target', target, '--release'], cwd='testbench')
+        tasks.add('objcopy', ['riscv64-unknown-elf-objcopy', '-j', '.text', '-j', '.rodata', '-j', '.data', '-O', 'binary',
+                              elf, os.path.join('run', 'software', 'bios', 'bios.bin')], after=['cargo'],
+                  inputs=[elf], outputs=[os.path.join('run', 'software', 'bios', 'bios.bin')])
         # -d makes a much smaller file; but you need -D to capture the .data section
-        ret += os.system("riscv64-unknown-elf-objdump -d ../../target/{}/release/{} > run/bios.S".format(target, sim_name))
-        if ret != 0:
+        tasks.add('objdump', ['riscv64-unknown-elf-objdump', '-d', elf], stdout=os.path.join('run', 'bios.S'), after=['cargo'],
+                  inputs=[elf], outputs=[os.path.join('run', 'bios.S')])
+        try:
+            tasks.run()
+        except TaskError as e:
+            print("BIOS build: {}".format(e))
             sys.exit(1)  # fail the build
 
+        # keep only the latest BIOS in the cache
+        if os.path.isdir(BUILD_CACHE):
+            for old in os.listdir(BUILD_CACHE):
+                if old.startswith('bios-'):
+                    shutil.rmtree(os.path.join(BUILD_CACHE, old))
+        os.makedirs(cached)
+        shutil.copyfile(os.path.join('run', 'software', 'bios', 'bios.bin'), os.path.join(cached, 'bios.bin'))
+        shutil.copyfile(os.path.join('run', 'bios.S'), os.path.join(cached, 'bios.S'))
+
 class DoPac():
     def __init__(self, name):
-        if os.name == 'nt':
-            subprocess.run("rd /S /Q testbench\\{}".format(name), shell=True)
-            subprocess.run("mkdir testbench\\{}".format(name), shell=True)
-            subprocess.run("copy pac-cargo-template testbench\\{}\\Cargo.toml".format(name), shell=True)
-            subprocess.run("cargo install svd2rust --version 0.30.3") # make sure dependencies are installed
-            subprocess.run("cargo install form") # make sure dependencies are installed
-            subprocess.run("cd testbench\\{} && svd2rust --target riscv -i ..\\..\\..\\..\\target\\soc.svd".format(name), shell=True)
-            subprocess.run("cd testbench\\{} && rd /S /Q src".format(name), shell=True)
-            subprocess.run("cd testbench\\{} && form -i lib.rs -o src\\".format(name), shell=True)
-            subprocess.run("cd testbench\\{} && del lib.rs\\".format(name), shell=True)
-        else:
-            os.system("rm -rf testbench/{}".format(name))  # nuke the old PAC if it exists
-            os.system("mkdir -p testbench/{}".format(name)) # rebuild it from scratch every time
-            os.system("cp pac-cargo-template testbench/{}/Cargo.toml".format(name))
-            os.system("cargo install svd2rust --version 0.30.3") # sv2drust breaks after this version, due to requiring a method call instead of a reference to a struct element to access peripherals
-            os.system("cargo install form") # make sure dependencies are installed
-            os.system("cd testbench/{} && svd2rust --target riscv -i ../../../../target/soc.svd && rm -rf src; form -i lib.rs -o src/; rm lib.rs".format(name))
+        timer.mark('pac')
+        # the PAC only depends on the SVD (and the pinned svd2rust), so keep it if that is unchanged
+        svd_hash = hash_file('../../target/soc.svd')
+        stamp = os.path.join('testbench', name, '.svd-hash')
+        if os.path.isfile(stamp) and os.path.isdir(os.path.join('testbench', name, 'src')):
+            with open(stamp) as f:
+                if f.read() == svd_hash:
+                    return
+
+        pac = os.path.join('testbench', name)
+
+        def fresh_pac():
+            shutil.rmtree(pac, ignore_errors=True)  # nuke the old PAC if it exists
+            os.makedirs(pac) # rebuild it from scratch every time
+            shutil.copyfile('pac-cargo-template', os.path.join(pac, 'Cargo.toml'))
+
+        def remove_lib():
+            os.remove(os.path.join(pac, 'lib.rs'))
+
+        # the tools are only installed if missing, and meanwhile the PAC directory is reset
+        tasks = TaskGraph()
+        tasks.add('svd2rust', func=cargo_tool('svd2rust', '0.30.3')) # sv2drust breaks after this version, due to requiring a method call instead of a reference to a struct element to access peripherals
+        tasks.add('form', func=cargo_tool('form'))
+        tasks.add('fresh', func=fresh_pac)
+        tasks.add('generate', ['svd2rust', '--target', 'riscv', '-i', os.path.join('..', '..', '..', '..', 'target', 'soc.svd')],
+                  cwd=pac, after=['svd2rust', 'fresh'])
+        tasks.add('split', ['form', '-i', 'lib.rs', '-o', 'src' + os.path.sep], cwd=pac, after=['form', 'generate'])
+        tasks.add('cleanup', func=remove_lib, after=['split'])
+        try:
+            tasks.run()
+        except TaskError as e:
+            print("PAC generation: {}".format(e))
+            sys.exit(1)
+        with open(stamp, 'w') as f:
+            f.write(svd_hash)
 
 class Preamble():
     def __init__(self):
-        if os.name == 'nt':
-            # windows is really, really hard to do this right. Apparently mkdir and copy aren't "commands", they are shell built-ins
-            # plus path separators are different plus calling os.mkdir() is different from the mkdir version in the windows shell. ugh.
-            # just...i give up. we can't use a single syscall for both. we just have to do it differently for each platform.
-            subprocess.run("mkdir run\\software\\bios", shell=True)
-            subprocess.run("mkdir ..\\..\\target", shell=True)
-            subprocess.run("copy ..\\..\\sim_support\\placeholder_bios.bin run\\software\\bios\\bios.bin", shell=True)
-        else:
-            os.system("mkdir -p run/software/bios")
-            os.system("mkdir -p ../../target")  # this doesn't exist on the first run
-            os.system("cp ../../sim_support/placeholder_bios.bin run/software/bios/bios.bin")
+        # the first LiteX pass follows, up to DoPac or BiosHelper
+        timer.mark('litex_pass1')
+        os.makedirs(os.path.join('run', 'software', 'bios'), exist_ok=True)
+        os.makedirs(os.path.join('..', '..', 'target'), exist_ok=True)  # this doesn't exist on the first run
+        shutil.copyfile(os.path.join('..', '..', 'sim_support', 'placeholder_bios.bin'), os.path.join('run', 'software', 'bios', 'bios.bin'))
+
+VERILOG_SOURCES = ('.v', '.sv', '.vh', '.svh')
+# behavioural models of the Xilinx primitives, for simulators without the unisims
+# and unimacro libraries; one module per file, named after the module
+MODELS_DIR = os.path.join('..', '..', 'sim_support', 'models')
+
+def verilog_sources(args):
+    """The source files named on an xvlog command line (run from run/), with the
+    files they `include, as paths relative to the current directory"""
+    include_dirs = ['run'] + [os.path.join('run', value) for option, value in zip(args, args[1:]) if option in ('-i', '--include')]
+    pending = [os.path.join('run', arg) for arg in args if arg.endswith(VERILOG_SOURCES)]
+    found = []
+    while pending:
+        path = os.path.normpath(pending.pop(0))
+        if path in found or not os.path.isfile(path):
+            continue
+        found.append(path)
+        with open(path, errors='replace') as f:
+            for name in re.findall(r'^\s*`include\s+"([^"]+)"', f.read(), re.MULTILINE):
+                for folder in [os.path.dirname(path)] + include_dirs:
+                    if os.path.isfile(os.path.join(folder, name)):
+                        pending.append(os.path.join(folder, name))
+                        break
+    return found
+
+class IncrementalXvlog():
+    """Run `cd run && xvlog ...` commands against the libraries kept in run/xsim.dir,
+    skipping those whose command line and sources (including `include`d files) are
+    unchanged since they last compiled. Once a file declaring a SystemVerilog
+    package is recompiled, every later command is rerun too, as it may import it.
+    Any other command is just passed to os.system. The hashes are kept in
+    run/xvlog_cache.json, and are dropped with xsim.dir when Vivado changes."""
+    CACHE = os.path.join('run', 'xvlog_cache.json')
 
-class SimRunner():
-    def __init__(self, ci, os_cmds, vex_verilog_path=VEX_CPU_PATH):
-        # we need to use wildcards, so shutil is rather hard to code around. Use this hack instead.
-        if os.name == 'nt':
-            cpname = 'copy'
+    def __init__(self):
+        self.version = tool_versions(['xvlog', '--version'])
+        self.compiled = False
+        self.invalidated = False
+        try:
+            with open(self.CACHE) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        xsim_dir = os.path.join('run', 'xsim.dir')
+        if cache.get('version') != self.version or not os.path.isdir(xsim_dir):
+            shutil.rmtree(xsim_dir, ignore_errors=True)
+            cache = {}
+        self.commands = cache.get('commands', {})
+
+    def save(self):
+        with open(self.CACHE, 'w') as f:
+            json.dump({'version': self.version, 'commands': self.commands}, f, indent=1)
+
+    def run(self, cmd):
+        match = re.match(r'cd run && xvlog (.*)$', cmd)
+        if match is None:
+            return os.system(cmd)
+
+        sources = verilog_sources(match.group(1).split())
+        digest = hashlib.sha256(cmd.encode())
+        package = False
+        for path in sources:
+            with open(path, 'rb') as f:
+                contents = f.read()
+            digest.update(path.encode())
+            digest.update(contents)
+            package = package or re.search(rb'^\s*package\s+\w+\s*;', contents, re.MULTILINE) is not None
+        key = digest.hexdigest()
+        if not self.invalidated and self.commands.get(cmd) == key:
+            return 0
+
+        ret = os.system(cmd)
+        self.compiled = True
+        if ret == 0:
+            self.commands[cmd] = key
         else:
-            cpname = 'cp'
+            self.commands.pop(cmd, None)
+        if package:
+            self.invalidated = True
+        self.save()
+        return ret
+
+    def elaborate(self, cmd):
+        """Run xelab, unless nothing was recompiled and the snapshot is up to date"""
+        snapshot = os.path.join('run', 'xsim.dir', 'top_tb_sim')
+        if self.compiled or self.commands.get(cmd) != 'elaborated' or not os.path.isdir(snapshot):
+            ret = os.system(cmd)
+            if ret == 0:
+                self.commands[cmd] = 'elaborated'
+            else:
+                self.commands.pop(cmd, None)
+            self.save()
+            return ret
+        return 0
 
-        try:
-            os.system("mkdir run") # was "mkdir -p run"
-        except:
-            pass
 
-        if os.name == 'nt':
-            os.system('rmdir /S /Q run\\xsim.dir')
+class SimBackend():
+    """Common flow of the simulator backends: set up run/ with the testbench, the
+    common code and the LiteX outputs, then `compile` the sources and `simulate`.
+
+    The sources are given as xvlog command lines, `cd run && xvlog [options] files`,
+    as dut.py's extra commands are; each backend translates those for its own
+    tools. Any other command is run as is, in order."""
+    def __init__(self, ci, os_cmds, vex_verilog_path=VEX_CPU_PATH):
+        os.makedirs('run', exist_ok=True)
+        cmds = ["cd run && xvlog sim_bench.v -sv"]
+        if ci:
+            # in CI mode the dump is set up by the backend instead of common.v's $dumpvars
+            cmds.append("cd run && xvlog top_tb.v -sv -d TCL_DUMP")
         else:
-            os.system("rm -rf run/xsim.dir")
+            cmds.append("cd run && xvlog top_tb.v -sv ")
+        cmds.append("cd run && xvlog {}".format(".." + os.path.sep + vex_verilog_path)) # "cd run && xvlog {}".format("../" + vex_verilog_path)
+        # run user dependencies
+        cmds += os_cmds
 
+        # the compile only waits for the sources; the memory images are copied meanwhile
+        tasks = TaskGraph()
         # copy over the top test bench and common code
-        os.system("{} top_tb.v run".format(cpname) + os.path.sep + "top_tb.v") # "cp top_tb.v run/top_tb.v"
-        os.system("{} ..".format(cpname) + os.path.sep + ".." + os.path.sep + "sim_support" + os.path.sep + "common.v run" + os.path.sep) # "cp ../../sim_support/common.v run/"
+        tasks.add('testbench', func=copy_files(['top_tb.v', os.path.join('..', '..', 'sim_support', 'common.v')], 'run'))
+        # load up simulator dependencies
+        tasks.add('sources', func=copy_files([os.path.join('run', 'gateware', '*.v')], 'run'))
+        tasks.add('init', func=copy_files([os.path.join('run', 'gateware', '*.init')], 'run'))
+        # copy any relevant .bin files into the run directory as well
+        tasks.add('vex', func=copy_files([os.path.join(os.path.dirname(VEX_CPU_PATH), '*.bin')], 'run'))
+        self.prepare(tasks)
+        tasks.add('compile', func=lambda: self.compile(ci, cmds), after=['testbench', 'sources'])
+        timer.info.update(backend=self.name, ci=ci)
+        with timer.phase('setup'):
+            try:
+                tasks.run()
+            except TaskError as e:
+                print("Simulation build: {}".format(e))
+                sys.exit(1)  # don't simulate what did not compile
 
+        if ci:
+            global sim_dump_root
+            if os.path.isfile('run/ci.vcd'):
+                os.remove('run/ci.vcd')
+            sim_dump_root = self.dump_root
+            # the simulation runs in the background until CheckSim stops it
+            timer.start('simulate')
+        self.simulate(ci)
+
+    # scope that the simulator wraps around top_tb in its dumps, if any
+    dump_root = None
+    # name in SIM_BACKENDS, recorded with the phase timings
+    name = None
+
+    def prepare(self, tasks):
+        """Add tasks copying any backend specific files into run/"""
+
+    def compile(self, ci, cmds):
+        """Build the simulation; raises TaskError if that fails, once any output of an
+        earlier build that `simulate` would run instead is removed"""
+        raise NotImplementedError
+
+    def simulate(self, ci):
+        """Run the simulation. In CI mode, start it in the background as `sim_process`,
+        writing run/ci.vcd, which CheckSim follows and stops once the outcome is known"""
+        raise NotImplementedError
+
+    @staticmethod
+    def ci_xmrs():
+        """The signals that CheckSim's watchers need dumped"""
+        parser = vcd.VCDParser()
+        CiWatchers(parser)
+        return parser.watched_xmrs()
+
+
+class SimRunner(SimBackend):
+    """The Vivado xsim backend"""
+    name = 'xsim'
+
+    def prepare(self, tasks):
         # initialize with a default waveform that contains the most basic execution tracing
         if os.path.isfile('run/top_tb_sim.wcfg') != True:
             if os.path.isfile('top_tb_sim.wcfg'):
-                os.system('{} top_tb_sim.wcfg run'.format(cpname) + os.path.sep) # 'cp top_tb_sim.wcfg run/'
+                tasks.add('wcfg', func=copy_files(['top_tb_sim.wcfg'], 'run'))
             else:
-                os.system('{} ..'.format(cpname)+os.path.sep+'..'+os.path.sep+'sim_support'+os.path.sep+'top_tb_sim.wcfg run' + os.path.sep) # 'cp ../../sim_support/top_tb_sim.wcfg run/'
-
-        # load up simulator dependencies
-        os.system("cd run && {} gateware".format(cpname)+os.path.sep+"*.init .") # "cd run && cp gateware/*.init ."
-        os.system("cd run && {} gateware".format(cpname)+os.path.sep+"*.v .") # "cd run && cp gateware/*.v ."
-        os.system("cd run && xvlog .."+os.path.sep+".."+os.path.sep+".."+os.path.sep+"sim_support"+os.path.sep+"glbl.v") # "cd run && xvlog ../../../sim_support/glbl.v"
-        os.system("cd run && xvlog sim_bench.v -sv")
-        os.system("cd run && xvlog top_tb.v -sv ")
-        vex_dir = os.path.dirname(VEX_CPU_PATH)
-        # copy any relevant .bin files into the run directory as well
-        os.system("{} {} ".format(cpname, vex_dir.replace("/",os.path.sep) + os.path.sep + "*.bin") + " run" + os.path.sep) # "{} {} run/".format(cpname, vex_dir + "/*.bin")
-        os.system("cd run && xvlog {}".format(".." + os.path.sep + vex_verilog_path)) # "cd run && xvlog {}".format("../" + vex_verilog_path)
+                tasks.add('wcfg', func=copy_files([os.path.join('..', '..', 'sim_support', 'top_tb_sim.wcfg')], 'run'))
+
+    def compile(self, ci, cmds):
+        # run/xsim.dir is kept between runs; sources are only recompiled when they change
+        xvlog = IncrementalXvlog()
+        snapshot = os.path.join('run', 'xsim.dir', 'top_tb_sim')
+        with timer.phase('xvlog'):
+            for cmd in ["cd run && xvlog .."+os.path.sep+".."+os.path.sep+".."+os.path.sep+"sim_support"+os.path.sep+"glbl.v"] + cmds: # "cd run && xvlog ../../../sim_support/glbl.v"
+                if xvlog.run(cmd) != 0:
+                    shutil.rmtree(snapshot, ignore_errors=True)
+                    raise TaskError("failed: {}".format(cmd))
+
+        with timer.phase('xelab'):
+            cmd = "cd run && xelab -debug typical top_tb glbl -s top_tb_sim -L unisims_ver -L unimacro_ver -L SIMPRIM_VER -L secureip -L $xsimdir/xil_defaultlib -timescale 1ns/1ps"
+            if xvlog.elaborate(cmd) != 0:
+                shutil.rmtree(snapshot, ignore_errors=True)
+                raise TaskError("failed: {}".format(cmd))
+
+    def simulate(self, ci):
+        if ci:
+            # run xsim in the background; CheckSim follows run/ci.vcd as it is written
+            # and stops the simulation as soon as the outcome is known
+            global sim_process
+            DumpScript('run' + os.path.sep + 'ci_dump.tcl', self.ci_xmrs())
+            sim_process = subprocess.Popen(["xsim", "top_tb_sim", "-tclbatch", "ci_dump.tcl", "-wdb", "ci.wdb"], cwd="run", shell=(os.name == 'nt'))
+        else:
+            os.system("cd run && xsim top_tb_sim -gui")
 
-        # run user dependencies
-        for cmd in os_cmds:
-            os.system(cmd)
 
-        os.system(
-            "cd run && xelab -debug typical top_tb glbl -s top_tb_sim -L unisims_ver -L unimacro_ver -L SIMPRIM_VER -L secureip -L $xsimdir/xil_defaultlib -timescale 1ns/1ps")
+class VerilatorRunner(SimBackend):
+    """The Verilator backend, for machines without Vivado: the whole testbench is
+    built into a multi-threaded executable (run/obj_dir/Vtop_tb), with the Xilinx
+    primitives taken from the behavioural models in sim_support/models. Verilation is
+    skipped when the sources, models and options are unchanged since the last build.
+    Outside of CI mode the simulation runs in the foreground, and the dumps set up by
+    top_tb.v and common.v can be viewed with GTKWave."""
+    OBJ_DIR = 'obj_dir'
+    STAMP = os.path.join('run', OBJ_DIR, 'inputs.sha256')
+    # simulation threads; the verilated model rarely scales beyond a few
+    THREADS = min(4, os.cpu_count() or 1)
+    dump_root = 'TOP'
+    name = 'verilator'
+
+    def compile(self, ci, cmds):
+        options = [
+            'verilator', '--binary', '--timing', '--trace', '-Wno-fatal', '-Wno-lint', '-Wno-style',
+            '--timescale', '1ns/1ps', '--top-module', 'top_tb', '-Mdir', self.OBJ_DIR,
+            '--threads', str(self.THREADS), '-j', '0', '-I.', '-y', os.path.join('..', MODELS_DIR),
+        ]
         if ci:
-            os.system("cd run && xsim top_tb_sim -runall -wdb ci.wdb")
+            # dump what the CI watchers need, listed in ci_dump.vh for common.v to include
+            options.append('-DDUMP_INCLUDE')
+            DumpInclude('run' + os.path.sep + 'ci_dump.vh', self.ci_xmrs())
+        files = []
+        sources = []
+        for cmd in cmds:
+            match = re.match(r'cd run && xvlog (.*)$', cmd)
+            if match is None:
+                if os.system(cmd) != 0:
+                    raise TaskError("failed: {}".format(cmd))
+                continue
+            args = match.group(1).split()
+            sources += verilog_sources(args)
+            args = iter(args)
+            for arg in args:
+                if arg in ('-d', '--define'):
+                    options.append('-D' + next(args))
+                elif arg in ('-i', '--include'):
+                    options.append('-I' + next(args))
+                elif arg in ('-L', '--lib', '--work', '-f', '--file', '--log'):
+                    next(args)
+                elif arg.endswith(VERILOG_SOURCES):
+                    files.append(arg)
+        cmd = options + list(dict.fromkeys(files))
+
+        digest = hashlib.sha256(' '.join(cmd).encode())
+        digest.update(tool_versions(['verilator', '--version']).encode())
+        for path in sources:
+            digest.update(path.encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        hash_tree(digest, MODELS_DIR, ['*.v'])
+        key = digest.hexdigest()
+        binary = os.path.join('run', self.OBJ_DIR, 'Vtop_tb')
+        if os.path.isfile(binary) and os.path.isfile(self.STAMP):
+            with open(self.STAMP) as f:
+                if f.read() == key:
+                    return
+        with timer.phase('verilate'):
+            ret = subprocess.run(cmd, cwd='run').returncode
+        if ret != 0:
+            # don't leave an earlier build behind for simulate() to run
+            for path in (binary, self.STAMP):
+                if os.path.isfile(path):
+                    os.remove(path)
+            raise TaskError("verilator exited with status {}".format(ret))
+        with open(self.STAMP, 'w') as f:
+            f.write(key)
+
+    def simulate(self, ci):
+        if ci:
+            global sim_process
+            sim_process = subprocess.Popen([os.path.join('.', self.OBJ_DIR, 'Vtop_tb')], cwd='run')
         else:
-            os.system("cd run && xsim top_tb_sim -gui")
+            subprocess.run([os.path.join('.', self.OBJ_DIR, 'Vtop_tb')], cwd='run')
+
+# the simulator backends, by the name that dut.py's --sim option takes
+SIM_BACKENDS = {
+    'xsim': SimRunner,
+    'verilator': VerilatorRunner,
+}
+
+
+class DumpScript():
+    """Write an xsim Tcl batch script that dumps only the given XMRs to ci.vcd and
+    runs the simulation. Glob patterns dump the whole scope above their first
+    wildcard, which is always enough for the watchers to match against."""
+    def __init__(self, path, xmrs):
+        lines = ["open_vcd ci.vcd"]
+        for xmr in xmrs:
+            levels = xmr.split(".")
+            if vcd.VCDParser.is_pattern(xmr):
+                scope = list(takewhile(lambda level: not vcd.VCDParser.is_pattern(level), levels))
+                lines.append("log_vcd [get_objects -r /{}]".format("/".join(scope + ["*"])))
+            else:
+                lines.append("log_vcd /{}".format("/".join(levels)))
+        lines += ["run all", "close_vcd", "quit"]
+        with open(path, 'w') as script:
+            script.write("\n".join(lines) + "\n")
+
+
+class DumpInclude():
+    """Write the $dumpvars calls that dump only the given XMRs, for common.v to
+    include when DUMP_INCLUDE is defined; the counterpart of DumpScript for
+    simulators without a Tcl shell. Glob patterns dump the whole scope above their
+    first wildcard."""
+    def __init__(self, path, xmrs):
+        lines = []
+        for xmr in xmrs:
+            levels = xmr.split(".")
+            if vcd.VCDParser.is_pattern(xmr):
+                levels = list(takewhile(lambda level: not vcd.VCDParser.is_pattern(level), levels))
+            lines.append("$dumpvars(0, {});".format(".".join(levels)))
+        with open(path, 'w') as include:
+            include.write("\n".join(lines) + "\n")
 
 
 # for automated VCD checking after CI run
@@ -275,6 +702,14 @@ import vcd
 import logging
 
 ci_pass = False
+# the simulator started by the SimBackend in CI mode, while it is running
+sim_process = None
+# the scope the simulator wraps around top_tb in run/ci.vcd (e.g. Verilator's TOP)
+sim_dump_root = None
+# per-sim checks: functions taking a VCDParser and registering extra watchers (and
+# their trackers) on it. They are called by CheckSim, and by the SimBackend to find out
+# which signals to dump, so they should not depend on being called only once.
+ci_watchers = []
 
 class CiTracker(vcd.VCDTracker):
     skip = False
@@ -301,6 +736,7 @@ class CiTracker(vcd.VCDTracker):
         else:
             print("Failure: report code 0x{:08x}".format(vcd.v2d(self["top_tb.report"])), file=self.journal)
             self.state = self.states["STOP"]
+        self.finished = True  # the outcome is known; lets a followed simulation stop
 
     def stop_state(self):
         return
@@ -317,12 +753,10 @@ class CiWatcher(vcd.VCDWatcher):
 
         return False
 
-def CheckSim():
-    logging.basicConfig()
-
-    parser = vcd.VCDParser(log_level=logging.INFO)
-    tracker = CiTracker()
-    watcher = CiWatcher(
+def CiWatchers(parser, tracker=None):
+    """Register the watchers that CheckSim runs on `parser`: the CiWatcher (feeding
+    `tracker`, if given) followed by any per-sim `ci_watchers`"""
+    CiWatcher(
         parser,
         sensitive=["top_tb.done"],
         watch=[
@@ -330,15 +764,46 @@ def CheckSim():
             "top_tb.done",
             "top_tb.report",
         ],
-        trackers=[tracker],
+        trackers=[tracker] if tracker else [],
     )
+    for register in ci_watchers:
+        register(parser)
 
-    with open('run/ci.vcd') as vcd_file:
-        parser.parse(vcd_file)
+def CheckSim():
+    logging.basicConfig()
+
+    timer.start('check')
+    parser = vcd.VCDParser(log_level=logging.INFO, root=sim_dump_root)
+    tracker = CiTracker()
+    CiWatchers(parser, tracker)
+
+    global sim_process
+    if sim_process is not None:
+        # the simulator is still running: check the dump as it is written, and stop the
+        # simulation once `done` rises
+        try:
+            parser.follow('run/ci.vcd', alive=lambda: sim_process.poll() is None)
+        finally:
+            if sim_process.poll() is None:
+                sim_process.terminate()
+            sim_process.wait()
+            sim_process = None
+            timer.stop('simulate')
+    else:
+        # only the dump from the first rising edge of `done`, which decides the outcome,
+        # needs the watchers; finding that edge is a scan for the one signal, which
+        # skips the other lines without tokenising them
+        parser.map_file('run/ci.vcd')
+        try:
+            parser.parse_mapped(start_time=parser.first_change("top_tb.done", "1"))
+        finally:
+            parser.close()
 
     tracker.journal.close()
+    timer.stop('check')
 
     global ci_pass
+    timer.info['passed'] = ci_pass
     if ci_pass:
         return 0
     else:
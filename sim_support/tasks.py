@@ -0,0 +1,180 @@
+"""
+A small task graph executor for the simulation flow.
+
+Each task is a command line or a Python callable, with the names of the tasks it
+must run after. Tasks run on a thread pool as soon as their dependencies are done,
+so independent steps overlap. A task with `inputs` is skipped when its command,
+the contents of its inputs and its `key` are the same as the last time it
+succeeded, and its `outputs` are still as it left them; the hashes are kept in
+`stamp_dir`.
+"""
+
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+
+class TaskError(Exception):
+    pass
+
+
+def file_hash(path):
+    """Hash of a file's contents, or '' if it doesn't exist"""
+    if not os.path.isfile(path):
+        return ''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Task():
+    def __init__(self, name, cmd=None, func=None, after=(), inputs=(), outputs=(), key='', cwd=None, stdout=None):
+        self.name = name
+        self.cmd = cmd
+        self.func = func
+        self.after = list(after)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.key = key
+        self.cwd = cwd
+        self.stdout = stdout
+
+    def describe(self):
+        if self.cmd is not None:
+            return self.cmd if isinstance(self.cmd, str) else ' '.join(self.cmd)
+        return self.func.__name__
+
+    def digest(self):
+        """Hash of what the task does and depends on, or None if it is always run"""
+        if not self.inputs:
+            return None
+        digest = hashlib.sha256(self.describe().encode())
+        digest.update(str(self.key).encode())
+        for path in self.inputs:
+            digest.update(path.encode())
+            digest.update(file_hash(path).encode())
+        return digest.hexdigest()
+
+    def output_hashes(self):
+        return {path: file_hash(path) for path in self.outputs}
+
+    def execute(self):
+        if self.func is not None:
+            return self.func()
+        if self.stdout is not None:
+            with open(self.stdout, 'w') as out:
+                return subprocess.run(self.cmd, cwd=self.cwd, shell=isinstance(self.cmd, str), stdout=out).returncode
+        return subprocess.run(self.cmd, cwd=self.cwd, shell=isinstance(self.cmd, str)).returncode
+
+
+class TaskGraph():
+    def __init__(self, jobs=None, stamp_dir=None):
+        # at least two, as most tasks wait on a subprocess or the disk
+        self.jobs = jobs or max(2, os.cpu_count() or 1)
+        self.stamp_dir = stamp_dir
+        self.tasks = {}
+
+    def add(self, name, cmd=None, func=None, **kwds):
+        """Add a task running `cmd` (a string for the shell, or an argument list) or
+        calling `func`, which fails by raising or returning a non-zero value"""
+        if name in self.tasks:
+            raise ValueError("Duplicate task {}".format(name))
+        self.tasks[name] = Task(name, cmd, func, **kwds)
+        return name
+
+    def stamp(self, task):
+        return os.path.join(self.stamp_dir, task.name + '.json')
+
+    def up_to_date(self, task, digest):
+        if digest is None or self.stamp_dir is None:
+            return False
+        try:
+            with open(self.stamp(task)) as f:
+                stamp = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return stamp.get('key') == digest and stamp.get('outputs') == task.output_hashes() \
+            and all(os.path.exists(output) for output in task.outputs)
+
+    def run_task(self, task):
+        digest = task.digest()
+        if self.up_to_date(task, digest):
+            return True
+        try:
+            ret = task.execute()
+        except Exception as e:
+            print("{}: {}".format(task.name, e))
+            return False
+        if ret not in (None, 0):
+            return False
+        if digest is not None and self.stamp_dir is not None:
+            os.makedirs(self.stamp_dir, exist_ok=True)
+            with open(self.stamp(task), 'w') as f:
+                json.dump({'key': digest, 'outputs': task.output_hashes()}, f)
+        return True
+
+    def run(self):
+        """Run every task; raises TaskError naming the tasks that failed, or could
+        not run because something they depend on failed"""
+        for task in self.tasks.values():
+            for name in task.after:
+                if name not in self.tasks:
+                    raise ValueError("{} runs after unknown task {}".format(task.name, name))
+
+        done, failed = set(), set()
+        running = {}
+        pending = dict(self.tasks)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for name, task in list(pending.items()):
+                    if any(dep in failed for dep in task.after):
+                        failed.add(name)
+                        del pending[name]
+                    elif all(dep in done for dep in task.after):
+                        running[pool.submit(self.run_task, task)] = name
+                        del pending[name]
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    (done if future.result() else failed).add(name)
+        if pending:
+            raise TaskError("Dependency cycle between {}".format(', '.join(sorted(pending))))
+        if failed:
+            raise TaskError("Failed: {}".format(', '.join(name for name in self.tasks if name in failed)))
+
+
+def copy_files(patterns, dest):
+    """A callable that copies every file matching the glob patterns into directory
+    `dest`, like `cp` with wildcards; patterns matching nothing are ignored"""
+    def copy():
+        os.makedirs(dest, exist_ok=True)
+        for pattern in patterns:
+            for path in glob.glob(pattern):
+                shutil.copy(path, dest)
+    return copy
+
+
+def cargo_tool(crate, version=None):
+    """A callable that runs `cargo install` for a crate's binary only if it is missing,
+    or (when `version` is given) not that version"""
+    def install():
+        if shutil.which(crate) is not None:
+            if version is None:
+                return 0
+            result = subprocess.run([crate, '--version'], capture_output=True, text=True)
+            if version in result.stdout.split():
+                return 0
+        cmd = ['cargo', 'install', crate]
+        if version is not None:
+            cmd += ['--version', version]
+        return subprocess.run(cmd).returncode
+    install.__name__ = 'install_' + crate
+    return install
@@ -0,0 +1,95 @@
+"""Checks the UnitSim harness on two small modules: the Messible, through its 8-bit
+CSRs, and the PerfCounter, whose 64-bit CSRs are split into words. Run with
+`python -m unittest sim_support.test_unit_sim`."""
+
+import unittest
+
+from sim_support.unit_sim import UnitSim
+
+from gateware.messible import Messible
+from gateware.perfcounter import PerfCounter
+
+
+def wait(cycles):
+    for _ in range(cycles):
+        yield
+
+
+class MessibleTestCase(unittest.TestCase):
+    def test_loopback(self):
+        """Bytes written to IN come back out of OUT, in order, with `have` set until
+        the last one is read"""
+        sim = UnitSim()
+        sim.add_module("messible", Messible())
+        received = []
+
+        def test(sim):
+            self.assertEqual((yield from sim.csr_read("messible", "status")) & 2, 0)
+            for byte in b"hi!":
+                yield from sim.csr_write("messible", "in", byte)
+            yield from wait(4)
+            while (yield from sim.csr_read("messible", "status")) & 2:
+                received.append((yield from sim.csr_read("messible", "out")))
+                yield from wait(4)
+
+        sim.run(test(sim))
+        self.assertEqual(bytes(received), b"hi!")
+
+
+class PerfCounterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sim = UnitSim()
+        # PerfCounter adds its event sources to the SoC it is given
+        self.perfcounter = self.sim.add_module("perfcounter", PerfCounter(self.sim))
+
+    def test_csr_words(self):
+        """A 64-bit CSR has two words, most significant first, as the CSR bank maps
+        them"""
+        words = self.sim.csr_words("perfcounter", "saturate_limit")
+        self.assertEqual([offset for word, offset in words], [32, 0])
+
+    def test_wide_write(self):
+        """A 64-bit write reads back whole, and `re` pulses once, when the storage holds
+        all of it"""
+        sim = self.sim
+        limit = 0x0123_4567_89ab_cdef
+        strobes = []
+
+        def test(sim):
+            yield from sim.csr_write("perfcounter", "saturate_limit", limit)
+            yield from wait(2)
+            self.assertEqual((yield from sim.csr_read("perfcounter", "saturate_limit")), limit)
+
+        def monitor(sim):
+            for _ in range(16):
+                if (yield self.perfcounter.saturate_limit.re):
+                    strobes.append((yield self.perfcounter.saturate_limit.storage))
+                yield
+
+        sim.run([test(sim), monitor(sim)])
+        self.assertEqual(strobes, [limit])
+
+    def test_event(self):
+        """An event is logged with its code in the low bits and the timestamp above"""
+        sim = self.sim
+        events = []
+
+        def test(sim):
+            yield from sim.csr_write("perfcounter", "config", 7 << 17)  # 8-bit codes, no prescaler
+            yield from sim.csr_write("perfcounter", "run", 1)  # reset_run
+            yield from wait(10)
+            yield from sim.csr_write("event_source0", "perfevent", 0x42)
+            yield from wait(4)
+            while (yield from sim.csr_read("perfcounter", "status")) & 4:  # readable
+                events.append((yield from sim.csr_read("perfcounter", "event_raw")))
+                yield from sim.csr_read("perfcounter", "event_index")  # pops the FIFO
+                yield from wait(4)
+
+        sim.run(test(sim))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0] & 0xff, 0x42)
+        self.assertGreater(events[0] >> 8, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+#! /usr/bin/env python3
+
+"""
+Wall-clock timing of the phases of a simulation run, and a report across runs.
+
+sim_bench.py marks the phases of a run as they happen: the LiteX elaboration
+passes, PAC generation, the BIOS build, compilation, the simulation and the VCD
+check. When dut.py exits, the run's phases are appended to `run/timing.json` in
+the bench's directory, which keeps the last `HISTORY` runs.
+
+`python3 sim_support/timing.py [bench patterns]` summarises those files. For each
+phase of each bench it shows the latest time and the median of the runs before it,
+and flags regressions: phases that took `--threshold` times longer than the median,
+and at least `--min-seconds` longer.
+"""
+
+import argparse
+import atexit
+import contextlib
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SUITES = ["sim", "sim_noci"]
+TIMING_FILE = os.path.join("run", "timing.json")
+# runs kept per bench
+HISTORY = 50
+
+
+class PhaseTimer():
+    """Start and stop times of named phases, which may overlap (the VCD check runs
+    while the simulator is still writing the dump). `mark` ends the current
+    sequential phase and starts the next one."""
+    def __init__(self):
+        self.origin = time.time()
+        self.phases = []
+        self.running = {}
+        self.current = None
+        self.info = {}
+        self.saved = False
+
+    def start(self, name):
+        self.running[name] = time.time()
+
+    def stop(self, name):
+        if name in self.running:
+            start = self.running.pop(name)
+            self.phases.append({"name": name, "start": round(start - self.origin, 3), "seconds": round(time.time() - start, 3)})
+
+    def mark(self, name=None):
+        if self.current is not None:
+            self.stop(self.current)
+        self.current = name
+        if name is not None:
+            self.start(name)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def record(self):
+        for name in list(self.running):
+            self.stop(name)
+        self.current = None
+        return dict(self.info, **{
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.origin)),
+            "host": platform.node(),
+            "total": round(time.time() - self.origin, 3),
+            "phases": self.phases,
+        })
+
+    def save(self, path=TIMING_FILE):
+        """Append this run to the bench's timing history (once, and only if any
+        phase was timed)"""
+        if self.saved or not (self.phases or self.running) or not os.path.isdir(os.path.dirname(path)):
+            return
+        self.saved = True
+        runs = load(path)
+        runs.append(self.record())
+        with open(path, "w") as f:
+            json.dump({"runs": runs[-HISTORY:]}, f, indent=1)
+
+
+def load(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get("runs", [])
+    except (OSError, ValueError):
+        return []
+
+
+def phase_totals(run):
+    """Seconds per phase name in one run; a phase timed more than once is summed"""
+    totals = {}
+    for phase in run["phases"]:
+        totals[phase["name"]] = totals.get(phase["name"], 0) + phase["seconds"]
+    totals["total"] = run["total"]
+    return totals
+
+
+# the timer of this process; sim_bench marks its phases, and it is saved on exit
+timer = PhaseTimer()
+atexit.register(timer.save)
+
+
+def ci_roots():
+    """The per-bench copies of the repository that ci_runner.py runs in"""
+    parent = os.path.dirname(ROOT)
+    prefix = ".{}-ci-".format(os.path.basename(ROOT))
+    return [os.path.join(parent, name) for name in sorted(os.listdir(parent)) if name.startswith(prefix)]
+
+
+def discover(roots, patterns):
+    """(name, path) of the timing file of every bench found under `roots`; benches
+    run by ci_runner.py are prefixed with `ci:`"""
+    ci_copies = ci_roots()
+    found = []
+    for root in roots:
+        for suite in SUITES:
+            suite_dir = os.path.join(root, suite)
+            if not os.path.isdir(suite_dir):
+                continue
+            for bench in sorted(os.listdir(suite_dir)):
+                path = os.path.join(suite_dir, bench, TIMING_FILE)
+                name = suite + "/" + bench
+                if root in ci_copies:
+                    name = "ci:" + name
+                elif os.path.realpath(root) != ROOT:
+                    name = os.path.basename(os.path.realpath(root)) + ":" + name
+                if not os.path.isfile(path):
+                    continue
+                if patterns and not any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(bench, p) for p in patterns):
+                    continue
+                found.append((name, path))
+    return found
+
+
+def report(benches, threshold, min_seconds, window):
+    """Print the latest time and the median of the previous `window` runs for each
+    phase; returns the number of regressions found"""
+    regressions = 0
+    print("{:32} {:14} {:>9} {:>9} {:>5}".format("bench", "phase", "latest", "median", "runs"))
+    for name, path in benches:
+        runs = load(path)
+        if not runs:
+            continue
+        latest = phase_totals(runs[-1])
+        history = [phase_totals(run) for run in runs[-window - 1:-1]]
+        for phase, seconds in latest.items():
+            previous = [totals[phase] for totals in history if phase in totals]
+            median = statistics.median(previous) if previous else None
+            flag = ""
+            if median is not None and seconds > median * threshold and seconds - median >= min_seconds:
+                flag = "  REGRESSION"
+                regressions += 1
+            print("{:32} {:14} {:>8.1f}s {:>9} {:>5}{}".format(
+                name, phase, seconds, "-" if median is None else "{:.1f}s".format(median), len(previous), flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the phase timings of the simulation benches")
+    parser.add_argument(
+        "benches", nargs="*", help="Only report these benches (glob patterns, e.g. `sha*` or `sim_noci/*`)"
+    )
+    parser.add_argument(
+        "--root", nargs="+", help="Repository trees to collect timings from (default: this one and the ci_runner.py copies)"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=1.25, help="Flag phases slower than this multiple of their median (default: 1.25)"
+    )
+    parser.add_argument(
+        "--min-seconds", type=float, default=1.0, help="Ignore slowdowns smaller than this (default: 1s)"
+    )
+    parser.add_argument(
+        "--window", type=int, default=10, help="Number of earlier runs to take the median of (default: 10)"
+    )
+    parser.add_argument(
+        "--json", help="Also write the latest run of each bench, with the medians, to this file"
+    )
+    args = parser.parse_args()
+
+    benches = discover(args.root or [ROOT] + ci_roots(), args.benches)
+    if not benches:
+        print("No timings found; they are written to <bench>/{} when dut.py runs".format(TIMING_FILE))
+        return 1
+    regressions = report(benches, args.threshold, args.min_seconds, args.window)
+    if args.json:
+        summary = {}
+        for name, path in benches:
+            runs = load(path)
+            if runs:
+                history = [phase_totals(run) for run in runs[-args.window - 1:-1]]
+                summary[name] = {
+                    "latest": phase_totals(runs[-1]),
+                    "median": {phase: statistics.median([totals[phase] for totals in history if phase in totals])
+                               for phase in phase_totals(runs[-1]) if any(phase in totals for totals in history)},
+                }
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=1)
+    if regressions:
+        print("{} regression(s) over {:.0%} of the median".format(regressions, args.threshold - 1))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
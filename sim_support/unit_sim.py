@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+"""
+Simulate a single gateware module in Migen's simulator, without the SoC, CPU, BIOS
+or Vivado. Generators drive the module's CSRs and wishbone bus through a small
+transaction API, as the firmware would through the CSR bank:
+
+    from sim_support.unit_sim import UnitSim
+    from gateware.messible import Messible
+
+    sim = UnitSim()
+    sim.add_module("messible", Messible())
+
+    def test(sim):
+        yield from sim.csr_write("messible", "in", 0x41)
+        assert (yield from sim.csr_read("messible", "status")) & 2  # `have`
+        assert (yield from sim.csr_read("messible", "out")) == 0x41
+
+    sim.run(test(sim))
+
+Modules that take the SoC as an argument (e.g. `PerfCounter(soc)`) can be given the
+UnitSim instead, as it provides `add_csr`. Verilog instances cannot run in Migen's
+simulator; give a Migen model for them through `instance_models`, keyed by module
+name. A model is called with the instance's {port: expression} and
+{parameter: value} dicts and returns a Module.
+"""
+
+import os
+import re
+import sys
+
+# ASSUME: project structure is <project_root>/deps/gateware/sim_support/this_script
+# where the "gateware" repository is cloned into <project_root>/deps/
+#
+# We need to import lxbuildenv, which is in <project_root>. Add this to the path in an
+# os-independent fashion.
+script_path = os.path.dirname(os.path.realpath(
+    __file__)) + os.path.sep + os.path.pardir + os.path.sep + os.path.pardir + os.path.sep + os.path.pardir + os.path.sep
+sys.path.insert(0, script_path)
+
+import lxbuildenv
+
+# No external programs are needed: everything runs in Migen's simulator
+LX_DEPENDENCIES = []
+
+from migen import *
+from migen.fhdl.specials import Instance
+from migen.sim import run_simulation
+
+from litex.soc.interconnect.csr import _CompoundCSR
+
+# cycles a wishbone transaction may wait for `ack` before it is considered hung
+WISHBONE_TIMEOUT = 10000
+
+
+class UnitSim(Module):
+    """Harness around one or more gateware modules.
+
+    `clocks` maps clock domain names to their periods, in ns; domains other than
+    `sys` are created. CSRs are split into `csr_data_width` bit words, as in the SoC,
+    and accessed a word at a time with the same `re`/`we` strobes that the CSR bank
+    generates, so a multi-word write only takes effect on its last word."""
+    def __init__(self, clocks={"sys": 10}, csr_data_width=32, instance_models={}):
+        self.clocks = dict(clocks)
+        self.csr_data_width = csr_data_width
+        self.instance_models = dict(instance_models)
+        self.csr_modules = []
+        self.csr_map = {}
+        for name in self.clocks:
+            if name != "sys":
+                setattr(self.clock_domains, "cd_" + name, ClockDomain(name))
+
+    def add_csr(self, name):
+        """Expose the CSRs of the submodule `name`, as SoCCore.add_csr does"""
+        if name not in self.csr_modules:
+            self.csr_modules.append(name)
+
+    def add_module(self, name, module, csr=True):
+        setattr(self.submodules, name, module)
+        if csr:
+            self.add_csr(name)
+        return module
+
+    def do_finalize(self):
+        # the submodules are finalized by now, so event managers have their CSRs
+        for name in self.csr_modules:
+            registers = {}
+            for csr in getattr(self, name).get_csrs():
+                if isinstance(csr, _CompoundCSR):
+                    csr.finalize(self.csr_data_width)
+                    self.submodules += csr
+                    registers[csr.name] = csr.get_simple_csrs()
+                else:
+                    registers[csr.name] = [csr]
+            self.csr_map[name] = registers
+
+    def csr_words(self, name, register):
+        """The words of a CSR, in address order, with the bit offset of each"""
+        try:
+            words = self.csr_map[name][register]
+        except KeyError:
+            raise ValueError("No CSR {} in {}".format(register, name)) from None
+        if len(words) == 1:
+            return [(words[0], 0)]
+        # words of compound CSRs are named after their significance: <register><index>
+        return [(word, int(re.search(r"(\d+)$", word.name).group(1)) * self.csr_data_width) for word in words]
+
+    def csr_write(self, name, register, value):
+        for word, offset in self.csr_words(name, register):
+            yield word.r.eq((value >> offset) & ((1 << len(word.r)) - 1))
+            yield word.re.eq(1)
+            yield
+            yield word.re.eq(0)
+
+    def csr_read(self, name, register):
+        value = 0
+        for word, offset in self.csr_words(name, register):
+            value |= (yield word.w) << offset
+            if hasattr(word, "we"):
+                yield word.we.eq(1)
+            yield
+            if hasattr(word, "we"):
+                yield word.we.eq(0)
+        return value
+
+    def wishbone_transaction(self, bus, adr, dat_w=0, we=0, sel=None):
+        if sel is None:
+            sel = (1 << len(bus.sel)) - 1
+        yield bus.adr.eq(adr)
+        yield bus.dat_w.eq(dat_w)
+        yield bus.sel.eq(sel)
+        yield bus.we.eq(we)
+        yield bus.cyc.eq(1)
+        yield bus.stb.eq(1)
+        yield
+        cycles = 0
+        while not (yield bus.ack):
+            cycles += 1
+            if cycles > WISHBONE_TIMEOUT:
+                raise TimeoutError("No wishbone ack for address 0x{:x}".format(adr))
+            yield
+        dat_r = (yield bus.dat_r)
+        yield bus.cyc.eq(0)
+        yield bus.stb.eq(0)
+        yield bus.we.eq(0)
+        yield
+        return dat_r
+
+    def wishbone_write(self, bus, adr, dat, sel=None):
+        """Classic wishbone write of `dat` to word address `adr`"""
+        yield from self.wishbone_transaction(bus, adr, dat, 1, sel)
+
+    def wishbone_read(self, bus, adr):
+        """Classic wishbone read from word address `adr`"""
+        return (yield from self.wishbone_transaction(bus, adr))
+
+    def replace_instances(self, fragment):
+        for special in list(fragment.specials):
+            if not isinstance(special, Instance):
+                continue
+            if special.of not in self.instance_models:
+                raise ValueError("Instance of {} has no model to simulate it with; pass one in instance_models".format(special.of))
+            ports = {item.name: item.expr for item in special.items
+                     if isinstance(item, (Instance.Input, Instance.Output, Instance.InOut))}
+            parameters = {item.name: item.value for item in special.items if isinstance(item, Instance.Parameter)}
+            model = self.instance_models[special.of](ports, parameters)
+            fragment.specials.remove(special)
+            fragment += model.get_fragment()
+        return fragment
+
+    def run(self, generators, vcd_name=None):
+        """Run the simulation until the generators are done. `generators` is a
+        generator, a list of them or {clock domain: generators}, as for Migen's
+        run_simulation. `vcd_name` dumps every signal to that file."""
+        fragment = self.replace_instances(self.get_fragment())
+        run_simulation(fragment, generators, clocks=self.clocks, vcd_name=vcd_name)
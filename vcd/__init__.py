@@ -11,6 +11,10 @@
 # the License.
 
 from .parser import VCDParser
-from .watcher import VCDWatcher
+from .index import VCDTimeIndex
+from .cache import VCDCache
+from .history import SignalHistory
+from .fst import FSTReader
+from .watcher import VCDWatcher, GatedWatcher, RisingEdgeWatcher, FallingEdgeWatcher
 from .tracker import VCDTracker
-from .utils import v2d
+from .utils import v2d, v2int, decode
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Benchmark of VCDParser.update_time on a synthetic VCD.
+
+Compares the sensitivity reverse index against the original per-watcher scan
+(reproduced in `LegacyVCDParser`), and `RisingEdgeWatcher` against the same
+condition written as a `should_notify` override. Run with `python -m vcd.benchmark`.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from .parser import VCDParser
+from .tracker import VCDTracker
+from .watcher import VCDWatcher, RisingEdgeWatcher
+
+
+class LegacyVCDParser(VCDParser):
+    """The original update_time: every watcher's lists are rebuilt and scanned on
+    every timestep"""
+
+    def update_time(self, next_time):
+        current_time = self.now
+        for watcher in self.watchers:
+            update_needed = False
+            activity = {}
+            for id in watcher.get_sensitive_ids():
+                if id in self.changes:
+                    update_needed = True
+                    activity[id] = self.changes[id]
+
+            if update_needed:
+                collected_changes = {}
+                for id in watcher.get_watching_ids():
+                    collected_changes[id] = self.watched_changes[id]
+
+                watcher.notify(activity, collected_changes)
+
+        self.update_watched_changes()
+        self.changes = {}
+        self.then = current_time
+        self.now = next_time
+
+    def update_watched_changes(self):
+        for id in self.watched_changes:
+            if id in self.changes:
+                self.watched_changes[id] = self.changes[id]
+
+
+class CountingWatcher(VCDWatcher):
+    def should_notify(self):
+        return True
+
+
+class PythonEdgeWatcher(VCDWatcher):
+    """Rising clock edge while enabled, checked in Python on every clock change"""
+
+    def should_notify(self):
+        return (
+            self.get_active_2val("top_tb.clk") == 1
+            and self.values[self.get_id("top_tb.en")] == "1"
+        )
+
+
+class CountingTracker(VCDTracker):
+    def start(self):
+        self.count = 0
+
+    def update(self):
+        self.count += 1
+
+
+def identifier(n):
+    """VCD id code for signal number n"""
+    chars = []
+    while True:
+        n, digit = divmod(n, 94)
+        chars.append(chr(33 + digit))
+        if n == 0:
+            return "".join(chars)
+        n -= 1
+
+
+def write_vcd(path, changes, signals, per_step, seed=0):
+    """Write a synthetic VCD with `changes` value changes spread over `signals` 8-bit
+    nets, `per_step` changes per timestep. Net 0 is a strobe that toggles rarely.
+    There is also a `clk` that toggles every timestep, and an `en` that toggles
+    every 7 timesteps."""
+    rng = random.Random(seed)
+    ids = [identifier(n) for n in range(signals)]
+    clk, en = identifier(signals), identifier(signals + 1)
+    with open(path, "w") as fh:
+        fh.write("$timescale 1ps $end\n$scope module top_tb $end\n")
+        for n, id in enumerate(ids):
+            fh.write("$var wire 8 {} sig{} [7:0] $end\n".format(id, n))
+        fh.write("$var wire 1 {} clk $end\n$var wire 1 {} en $end\n".format(clk, en))
+        fh.write("$upscope $end\n$enddefinitions $end\n#0\n$dumpvars\n")
+        for id in ids:
+            fh.write("b0 {}\n".format(id))
+        fh.write("0{}\n0{}\n$end\n".format(clk, en))
+
+        written = 0
+        step = 0
+        lines = []
+        while written < changes:
+            step += 1
+            lines.append("#{}\n{}{}\n".format(step * 10, step & 1, clk))
+            if step % 7 == 0:
+                lines.append("{}{}\n".format((step // 7) & 1, en))
+            if step % 100 == 0:
+                lines.append("b{:b} {}\n".format(step & 0xFF, ids[0]))
+                written += 1
+            for id in rng.sample(ids[1:], per_step):
+                lines.append("b{:b} {}\n".format(rng.getrandbits(8), id))
+            written += per_step
+            if len(lines) > 100_000:
+                fh.write("".join(lines))
+                lines = []
+        fh.write("".join(lines))
+        fh.write("#{}\n".format((step + 1) * 10))
+
+
+def run(parser_class, path, watchers, watch, signals):
+    parser = parser_class()
+    trackers = []
+    for n in range(watchers):
+        tracker = CountingTracker()
+        CountingWatcher(
+            parser,
+            sensitive=["top_tb.sig0"],
+            watch=["top_tb.sig{}".format(1 + (n * watch + k) % (signals - 1)) for k in range(watch)],
+            trackers=[tracker],
+        )
+        trackers.append(tracker)
+    start = time.perf_counter()
+    parser.parse_file(path)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(tracker.count for tracker in trackers)
+
+
+def run_edge(watcher_class, path, watchers, watch, signals):
+    parser = VCDParser()
+    trackers = []
+    for n in range(watchers):
+        tracker = CountingTracker()
+        signals_watched = ["top_tb.sig{}".format(1 + (n * watch + k) % (signals - 1)) for k in range(watch)]
+        if watcher_class is RisingEdgeWatcher:
+            RisingEdgeWatcher(parser, "top_tb.clk", watch=signals_watched, trackers=[tracker], enable="top_tb.en")
+        else:
+            watcher_class(parser, sensitive=["top_tb.clk"], watch=signals_watched + ["top_tb.en"], trackers=[tracker])
+        trackers.append(tracker)
+    start = time.perf_counter()
+    parser.parse_file(path)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(tracker.count for tracker in trackers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VCDParser.update_time")
+    parser.add_argument("--changes", type=int, default=10_000_000, help="Number of value changes to generate")
+    parser.add_argument("--signals", type=int, default=1000, help="Number of nets in the synthetic VCD")
+    parser.add_argument("--per-step", type=int, default=10, help="Value changes per timestep")
+    parser.add_argument("--watchers", type=int, default=50, help="Number of watchers")
+    parser.add_argument("--watch", type=int, default=20, help="Signals watched per watcher")
+    parser.add_argument("--vcd", help="Reuse (or create) the synthetic VCD at this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.vcd or os.path.join(tmp, "bench.vcd")
+        if not os.path.exists(path):
+            print("Writing {} changes to {}...".format(args.changes, path))
+            write_vcd(path, args.changes, args.signals, args.per_step)
+
+        legacy, legacy_count = run(LegacyVCDParser, path, args.watchers, args.watch, args.signals)
+        print("original update_time: {:.2f}s ({} notifications)".format(legacy, legacy_count))
+        indexed, indexed_count = run(VCDParser, path, args.watchers, args.watch, args.signals)
+        print("reverse index:        {:.2f}s ({} notifications)".format(indexed, indexed_count))
+        assert legacy_count == indexed_count
+        print("speedup: {:.1f}x".format(legacy / indexed))
+
+        python, python_count = run_edge(PythonEdgeWatcher, path, args.watchers, args.watch, args.signals)
+        print("should_notify edge:   {:.2f}s ({} notifications)".format(python, python_count))
+        edge, edge_count = run_edge(RisingEdgeWatcher, path, args.watchers, args.watch, args.signals)
+        print("RisingEdgeWatcher:    {:.2f}s ({} notifications)".format(edge, edge_count))
+        assert python_count == edge_count
+        print("speedup: {:.1f}x".format(python / edge))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+from array import array
+from hashlib import blake2b
+from itertools import accumulate
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+
+logger = logging.getLogger("VCDCache")
+
+
+class VCDCache:
+    """Binary re-encoding of a VCD, so that it can be replayed for any set of
+    watchers without scanning the text again.
+
+    The `<vcd>.cache` sidecar holds the VCD's definitions, the times of all its
+    `#time` markers, and for every id code its change times (delta encoded uint64s)
+    and values. It is keyed on a hash of the VCD's contents; the hash is only
+    recomputed when the VCD's size or mtime differ from those recorded.
+    """
+
+    VERSION = 1
+    MAGIC = b"VCDCACHE"
+    # magic, version and length of the JSON layout that follows
+    PREAMBLE = struct.Struct("<8sII")
+
+    def __init__(self, path, data, layout):
+        self.path = path
+        self.data = data
+        self.layout = layout
+        self.base = self.PREAMBLE.size + layout["length"]
+        self.swap = layout["byteorder"] != sys.byteorder
+
+    @staticmethod
+    def sidecar(path):
+        return path + ".cache"
+
+    @staticmethod
+    def fingerprint(path):
+        """Hash of the contents of the file at `path`"""
+        digest = blake2b(digest_size=16)
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 24), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def load(cls, path):
+        """Open the cache for `path`, or return None if it is missing or stale"""
+        try:
+            with open(cls.sidecar(path), "rb") as fh:
+                data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, length = cls.PREAMBLE.unpack_from(data)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError("not a version {} cache".format(cls.VERSION))
+            layout = json.loads(data[cls.PREAMBLE.size : cls.PREAMBLE.size + length])
+            layout["length"] = length
+            stat = os.stat(path)
+            if (
+                layout["size"] != stat.st_size
+                or layout["mtime_ns"] != stat.st_mtime_ns
+            ) and layout["hash"] != cls.fingerprint(path):
+                raise ValueError("stale")
+        except (OSError, ValueError, struct.error) as e:
+            logger.info("Discarding cache for %s: %s", path, e)
+            data.close()
+            return None
+        return cls(path, data, layout)
+
+    @classmethod
+    def build(cls, scanner, path):
+        """Write the cache for `path`, which `scanner` (a `VCDParser` without
+        watchers) has mapped. Returns False if the cache could not be written."""
+        data = scanner.mapped
+        body_start = scanner.index.body_start
+        times = {id: array("Q") for id in scanner.idcode2references}
+        # values are packed as they come, each followed by a newline, rather than kept
+        # as one bytes object per change
+        values = {id: bytearray() for id in scanner.idcode2references}
+        last = dict.fromkeys(times, 0)
+        chunks = scanner.mapped_chunks(body_start, len(data))
+        for time, then, id, value in scanner.scan_changes(chunks, times):
+            if id is None:
+                continue
+            times[id].append(time - last[id])
+            last[id] = time
+            if isinstance(value, tuple):
+                value = value[0] + value[1]
+            values[id] += value.encode()
+            values[id] += b"\n"
+
+        markers = array("Q")
+        previous = 0
+        for match in re.compile(rb"^#(\d+)", re.MULTILINE).finditer(data, body_start):
+            time = int(match.group(1))
+            markers.append(time - previous)
+            previous = time
+
+        blobs = [data[:body_start], markers.tobytes()]
+        offset = len(blobs[0]) + len(blobs[1])
+        signals = {}
+        for id in times:
+            deltas = times[id].tobytes()
+            joined = memoryview(values[id])[:-1]  # without the last newline
+            signals[id] = [offset, len(times[id]), offset + len(deltas), len(joined)]
+            blobs += [deltas, joined]
+            offset += len(deltas) + len(joined)
+
+        stat = os.stat(path)
+        layout = json.dumps(
+            {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "hash": cls.fingerprint(path),
+                "byteorder": sys.byteorder,
+                "definitions": [0, len(blobs[0])],
+                "markers": [len(blobs[0]), len(markers)],
+                "signals": signals,
+            }
+        ).encode()
+        try:
+            with open(cls.sidecar(path), "wb") as fh:
+                fh.write(cls.PREAMBLE.pack(cls.MAGIC, cls.VERSION, len(layout)))
+                fh.write(layout)
+                for blob in blobs:
+                    fh.write(blob)
+        except OSError as e:
+            logger.warning("Could not write cache for %s: %s", path, e)
+            return False
+        return True
+
+    def close(self):
+        self.data.close()
+
+    def definitions(self):
+        """The VCD's declaration section, as bytes"""
+        offset, length = self.layout["definitions"]
+        return self.data[self.base + offset : self.base + offset + length]
+
+    def deltas(self, offset, count):
+        deltas = array("Q")
+        deltas.frombytes(self.data[self.base + offset : self.base + offset + 8 * count])
+        if self.swap:
+            deltas.byteswap()
+        return list(accumulate(deltas))
+
+    def markers(self):
+        """Times of all the `#time` markers"""
+        return self.deltas(*self.layout["markers"])
+
+    def changes(self, id):
+        """(times, values) of every change of id code `id`, with values in the same
+        form as `VCDParser.changes`"""
+        times_offset, count, values_offset, length = self.layout["signals"][id]
+        times = self.deltas(times_offset, count)
+        if not count:
+            return times, []
+        start = self.base + values_offset
+        values = self.data[start : start + length].decode().split("\n")
+        return times, [
+            (value[0].lower(), value[1:]) if value[0] in "bBrR" else value
+            for value in values
+        ]
@@ -0,0 +1,544 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Pure Python reader for FST, GTKWave's compressed waveform format.
+
+The file is a sequence of blocks: a header, the hierarchy, the signal geometry and
+value change blocks. Each value change block holds one independently compressed
+change list per signal plus a table of their offsets, so only the lists of
+watched signals ever get decompressed. Layouts follow GTKWave's fstapi.c.
+"""
+
+import gzip
+import heapq
+import mmap
+import struct
+import zlib
+
+# Block types
+FST_BL_HDR = 0
+FST_BL_VCDATA = 1
+FST_BL_BLACKOUT = 2
+FST_BL_GEOM = 3
+FST_BL_HIER = 4
+FST_BL_VCDATA_DYN_ALIAS = 5
+FST_BL_HIER_LZ4 = 6
+FST_BL_HIER_LZ4DUO = 7
+FST_BL_VCDATA_DYN_ALIAS2 = 8
+FST_BL_ZWRAPPER = 254
+FST_BL_SKIP = 255
+
+VCDATA_BLOCKS = (FST_BL_VCDATA, FST_BL_VCDATA_DYN_ALIAS, FST_BL_VCDATA_DYN_ALIAS2)
+
+# Hierarchy record tags; anything below FST_ST_GEN_ATTRBEGIN is a variable type
+FST_ST_GEN_ATTRBEGIN = 252
+FST_ST_GEN_ATTREND = 253
+FST_ST_VCD_SCOPE = 254
+FST_ST_VCD_UPSCOPE = 255
+
+VAR_TYPES = [
+    "event", "integer", "parameter", "real", "real_parameter", "reg", "supply0",
+    "supply1", "time", "tri", "triand", "trior", "trireg", "tri0", "tri1", "wand",
+    "wire", "wor", "port", "sparray", "realtime", "string", "bit", "logic", "int",
+    "shortint", "longint", "byte", "enum", "shortreal",
+]
+REAL_TYPES = ("real", "real_parameter", "realtime", "shortreal")
+
+SCOPE_TYPES = [
+    "module", "task", "function", "begin", "fork", "generate", "struct", "union",
+    "class", "interface", "package", "program", "vhdl_architecture",
+    "vhdl_procedure", "vhdl_function", "vhdl_record", "vhdl_process", "vhdl_block",
+    "vhdl_for_generate", "vhdl_if_generate", "vhdl_generate", "vhdl_package",
+]
+
+# Non-0/1 scalar values, as encoded in single bit change lists
+SCALAR_STATES = "xzhuwl-?"
+
+# Endianness probe stored in the header
+ENDIAN_TEST = 2.7182818284590452354
+
+TIME_UNITS = {0: "s", -3: "ms", -6: "us", -9: "ns", -12: "ps", -15: "fs"}
+
+
+def varint(data, pos):
+    """Decode an unsigned LEB128 varint at `pos`; returns (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def svarint(data, pos):
+    """Decode a signed LEB128 varint at `pos`; returns (value, next position)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                value -= 1 << shift
+            return value, pos
+
+
+def lz4_decompress(src, size):
+    """Decompress a raw LZ4 block into `size` bytes"""
+    out = bytearray()
+    pos = 0
+    end = len(src)
+    while pos < end:
+        token = src[pos]
+        pos += 1
+        literals = token >> 4
+        if literals == 15:
+            while True:
+                byte = src[pos]
+                pos += 1
+                literals += byte
+                if byte != 255:
+                    break
+        out += src[pos : pos + literals]
+        pos += literals
+        if pos >= end:
+            break
+        offset = src[pos] | (src[pos + 1] << 8)
+        pos += 2
+        length = token & 15
+        if length == 15:
+            while True:
+                byte = src[pos]
+                pos += 1
+                length += byte
+                if byte != 255:
+                    break
+        copy_overlapping(out, offset, length + 4)
+    return bytes(out[:size])
+
+
+def fastlz_decompress(src, size):
+    """Decompress a FastLZ (level 1 or 2) block into `size` bytes"""
+    out = bytearray()
+    level = (src[0] >> 5) + 1
+    ctrl = src[0] & 31
+    pos = 1
+    end = len(src)
+    while True:
+        if ctrl >= 32:
+            length = (ctrl >> 5) - 1
+            offset = (ctrl & 31) << 8
+            if length == 6:
+                if level == 1:
+                    length += src[pos]
+                    pos += 1
+                else:
+                    while True:
+                        code = src[pos]
+                        pos += 1
+                        length += code
+                        if code != 255:
+                            break
+            code = src[pos]
+            pos += 1
+            distance = offset + code + 1
+            if level == 2 and code == 255 and offset == 31 << 8:
+                distance = (src[pos] << 8) + src[pos + 1] + 8191 + 1
+                pos += 2
+            copy_overlapping(out, distance, length + 3)
+        else:
+            out += src[pos : pos + ctrl + 1]
+            pos += ctrl + 1
+        if pos >= end:
+            break
+        ctrl = src[pos]
+        pos += 1
+    return bytes(out[:size])
+
+
+def copy_overlapping(out, distance, length):
+    """Append `length` bytes starting `distance` back from the end of `out`"""
+    start = len(out) - distance
+    if distance >= length:
+        out += out[start : start + length]
+    else:
+        while length > 0:
+            piece = out[start : start + min(distance, length)]
+            out += piece
+            length -= len(piece)
+
+
+class FSTReader:
+    """Reads the definitions and value changes of an FST file.
+
+    `read_hierarchy(handler)` replays the scope tree through `handler.fst_scope`,
+    `fst_upscope` and `fst_var`; `changes(handles)` then yields (time, handle,
+    value) in time order for the selected handles, with values in the same form
+    the VCD parser stores them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as fh:
+            self.data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.blocks = self.scan_blocks()
+        if self.blocks and self.blocks[0][0] == FST_BL_ZWRAPPER:
+            (kind, pos, length) = self.blocks[0]
+            wrapped = self.data
+            self.data = gzip.decompress(wrapped[pos + 16 : pos + length])
+            wrapped.close()
+            self.blocks = self.scan_blocks()
+        self.read_header()
+        self.read_geometry()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def scan_blocks(self):
+        """List the blocks as (type, offset of the length field, length)"""
+        blocks = []
+        pos = 0
+        size = len(self.data)
+        while pos + 9 <= size:
+            kind = self.data[pos]
+            (length,) = struct.unpack_from(">Q", self.data, pos + 1)
+            if length == 0:
+                break
+            blocks.append((kind, pos + 1, length))
+            pos += 1 + length
+        return blocks
+
+    def block(self, kind):
+        for block in self.blocks:
+            if block[0] == kind:
+                return block
+        return None
+
+    def read_header(self):
+        if not self.blocks or self.blocks[0][0] != FST_BL_HDR:
+            raise ValueError("{} is not an FST file".format(self.path))
+        pos = self.blocks[0][1] + 8
+        (
+            self.start_time,
+            self.end_time,
+        ) = struct.unpack_from(">QQ", self.data, pos)
+        self.real_format = (
+            "<d" if struct.unpack_from("<d", self.data, pos + 16)[0] == ENDIAN_TEST else ">d"
+        )
+        (
+            self.memory_used,
+            self.scope_count,
+            self.var_count,
+            self.maxhandle,
+            self.vc_section_count,
+            self.timescale_exponent,
+        ) = struct.unpack_from(">QQQQQb", self.data, pos + 24)
+        self.version = self.cstring(pos + 65, 128)
+        self.date = self.cstring(pos + 193, 119)
+
+    def cstring(self, pos, size):
+        raw = self.data[pos : pos + size]
+        return raw.split(b"\0", 1)[0].decode(errors="replace")
+
+    @property
+    def timescale(self):
+        """Timescale as a VCD `$timescale` string, e.g. `1ps`"""
+        exponent = self.timescale_exponent
+        unit = -15
+        while unit < 0 and unit + 3 <= exponent:
+            unit += 3
+        return "{}{}".format(10 ** (exponent - unit), TIME_UNITS[unit])
+
+    def read_geometry(self):
+        """Signal widths per handle; width 0 marks variable length values"""
+        block = self.block(FST_BL_GEOM)
+        if block is None:
+            raise ValueError("{} has no geometry block".format(self.path))
+        (kind, pos, length) = block
+        uclen, maxhandle = struct.unpack_from(">QQ", self.data, pos + 8)
+        raw = self.data[pos + 24 : pos + length]
+        if len(raw) != uclen:
+            raw = zlib.decompress(raw)
+        self.lengths = []
+        self.reals = []
+        pos = 0
+        for handle in range(maxhandle):
+            value, pos = varint(raw, pos)
+            if value == 0:
+                self.lengths.append(8)
+                self.reals.append(True)
+            else:
+                self.lengths.append(0 if value == 0xFFFFFFFF else value)
+                self.reals.append(False)
+
+    def hierarchy(self):
+        """The decompressed hierarchy records"""
+        for (kind, pos, length) in self.blocks:
+            if kind == FST_BL_HIER:
+                return gzip.decompress(self.data[pos + 16 : pos + length])
+            if kind == FST_BL_HIER_LZ4:
+                (uclen,) = struct.unpack_from(">Q", self.data, pos + 8)
+                return lz4_decompress(self.data[pos + 16 : pos + length], uclen)
+            if kind == FST_BL_HIER_LZ4DUO:
+                (uclen,) = struct.unpack_from(">Q", self.data, pos + 8)
+                inner, start = varint(self.data, pos + 16)
+                once = lz4_decompress(self.data[start : pos + length], inner)
+                return lz4_decompress(once, uclen)
+        # a writer that did not close the file leaves the records, uncompressed, in a
+        # `.hier` file next to it, as fstapi.c's reader also expects
+        try:
+            with open(self.path + ".hier", "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            raise ValueError(
+                "{} has no hierarchy block, and no {}.hier next to it".format(self.path, self.path)
+            ) from None
+
+    def read_hierarchy(self, handler):
+        raw = self.hierarchy()
+        pos = 0
+        handles = 0
+        while pos < len(raw):
+            tag = raw[pos]
+            pos += 1
+            if tag == FST_ST_VCD_SCOPE:
+                scope_type = raw[pos]
+                name, pos = self.hier_string(raw, pos + 1)
+                component, pos = self.hier_string(raw, pos)
+                if scope_type < len(SCOPE_TYPES):
+                    handler.fst_scope(SCOPE_TYPES[scope_type], name)
+                else:
+                    handler.fst_scope("module", name)
+            elif tag == FST_ST_VCD_UPSCOPE:
+                handler.fst_upscope()
+            elif tag == FST_ST_GEN_ATTRBEGIN:
+                name, pos = self.hier_string(raw, pos + 2)
+                arg, pos = varint(raw, pos)
+            elif tag == FST_ST_GEN_ATTREND:
+                pass
+            else:
+                name, pos = self.hier_string(raw, pos + 1)
+                length, pos = varint(raw, pos)
+                alias, pos = varint(raw, pos)
+                if alias == 0:
+                    handles += 1
+                    alias = handles
+                var_type = VAR_TYPES[tag] if tag < len(VAR_TYPES) else "wire"
+                handler.fst_var(var_type, length, alias, name.split(" ")[0])
+
+    @staticmethod
+    def hier_string(raw, pos):
+        end = raw.index(b"\0", pos)
+        return raw[pos:end].decode(errors="replace"), end + 1
+
+    def decode_frame_value(self, raw, pos, handle):
+        """Value of `handle` in a block's initial frame; returns (value, next position)"""
+        index = handle - 1
+        length = self.lengths[index]
+        if self.reals[index]:
+            (real,) = struct.unpack_from(self.real_format, raw, pos)
+            return ("r", repr(real)), pos + 8
+        text = bytes(raw[pos : pos + length]).decode()
+        if length == 1:
+            return text, pos + 1
+        return ("b", text), pos + length
+
+    def frame(self, pos, handles):
+        """Values of `handles` at the start of the value change block at `pos`;
+        returns ({handle: value}, offset of the value change data)"""
+        start = pos + 32
+        uclen, start = varint(self.data, start)
+        clen, start = varint(self.data, start)
+        maxhandle, start = varint(self.data, start)
+        raw = self.data[start : start + clen]
+        if clen != uclen:
+            raw = zlib.decompress(raw)
+        values = {}
+        offset = 0
+        for handle in range(1, maxhandle + 1):
+            if self.lengths[handle - 1] == 0:
+                continue
+            value, next_offset = self.decode_frame_value(raw, offset, handle)
+            if handle in handles:
+                values[handle] = value
+            offset = next_offset
+        vc_maxhandle, vc_start = varint(self.data, start + clen)
+        return values, vc_start
+
+    def time_table(self, pos, length):
+        """Timestamps of a value change block, indexed by the change lists"""
+        uclen, clen, count = struct.unpack_from(">QQQ", self.data, pos + length - 24)
+        raw = self.data[pos + length - 24 - clen : pos + length - 24]
+        if clen != uclen:
+            raw = zlib.decompress(raw)
+        times = []
+        time = 0
+        offset = 0
+        for item in range(count):
+            delta, offset = varint(raw, offset)
+            time += delta
+            times.append(time)
+        return times
+
+    def chain(self, kind, pos, length, vc_start):
+        """Offsets (relative to `vc_start`) and lengths of each handle's change list"""
+        (tsec_clen,) = struct.unpack_from(">Q", self.data, pos + length - 16)
+        pointer = pos + length - 24 - tsec_clen - 8
+        (chain_clen,) = struct.unpack_from(">Q", self.data, pointer)
+        index_pos = pointer - chain_clen
+        raw = self.data[index_pos:pointer]
+
+        offsets = []
+        lengths = []
+        value = 0
+        previous = None
+        previous_alias = 0
+        cursor = 0
+        while cursor < len(raw):
+            if kind == FST_BL_VCDATA_DYN_ALIAS2 and raw[cursor] & 1:
+                shift, cursor = svarint(raw, cursor)
+                shift >>= 1
+                if shift > 0:
+                    value += shift
+                    if previous is not None:
+                        lengths[previous] = value - offsets[previous]
+                    previous = len(offsets)
+                    offsets.append(value)
+                    lengths.append(0)
+                else:
+                    if shift < 0:
+                        previous_alias = shift
+                    offsets.append(0)
+                    lengths.append(previous_alias)
+                continue
+
+            code, cursor = varint(raw, cursor)
+            if kind == FST_BL_VCDATA_DYN_ALIAS and code == 0:
+                alias, cursor = varint(raw, cursor)
+                offsets.append(0)
+                lengths.append(-alias)
+            elif code & 1:
+                value += code >> 1
+                if previous is not None:
+                    lengths[previous] = value - offsets[previous]
+                previous = len(offsets)
+                offsets.append(value)
+                lengths.append(0)
+            else:
+                offsets.extend([0] * (code >> 1))
+                lengths.extend([0] * (code >> 1))
+
+        if previous is not None:
+            lengths[previous] = (index_pos - vc_start) - offsets[previous]
+        for handle, length in enumerate(lengths):
+            if length < 0 and offsets[handle] == 0:
+                alias = -length - 1
+                if alias < handle:
+                    offsets[handle] = offsets[alias]
+                    lengths[handle] = lengths[alias]
+        return offsets, lengths
+
+    def change_list(self, vc_start, packtype, offset, length):
+        """Decompress one handle's change list"""
+        raw = self.data[vc_start + offset : vc_start + offset + length]
+        uclen, start = varint(raw, 0)
+        if uclen == 0:
+            return raw[start:]
+        if packtype == ord("4"):
+            return lz4_decompress(raw[start:], uclen)
+        if packtype == ord("F"):
+            return fastlz_decompress(raw[start:], uclen)
+        return zlib.decompress(raw[start:])
+
+    def decode_changes(self, raw, handle, times):
+        """Yield (time, value) from one handle's change list"""
+        index = handle - 1
+        width = self.lengths[index]
+        real = self.reals[index]
+        pos = 0
+        tindex = 0
+        end = len(raw)
+        while pos < end:
+            code, pos = varint(raw, pos)
+            if width == 1 and not real:
+                if code & 1:
+                    tindex += code >> 4
+                    value = SCALAR_STATES[(code >> 1) & 7]
+                else:
+                    tindex += code >> 2
+                    value = "1" if code & 2 else "0"
+            elif real:
+                tindex += code >> 1
+                (number,) = struct.unpack_from(self.real_format, raw, pos)
+                pos += 8
+                value = ("r", repr(number))
+            elif width == 0:
+                tindex += code >> 1
+                size, pos = varint(raw, pos)
+                value = ("s", bytes(raw[pos : pos + size]).decode(errors="replace"))
+                pos += size
+            elif code & 1:
+                tindex += code >> 1
+                value = ("b", bytes(raw[pos : pos + width]).decode())
+                pos += width
+            else:
+                tindex += code >> 1
+                size = (width + 7) // 8
+                bits = int.from_bytes(raw[pos : pos + size], "big") >> (size * 8 - width)
+                value = ("b", format(bits, "0{}b".format(width)))
+                pos += size
+            yield times[tindex], value
+
+    def changes(self, handles):
+        """Yield (time, handle, value) for the selected handles in time order. The
+        first block's frame supplies the initial values. Blocks with no changes to
+        the selected handles are skipped after reading their offset table."""
+        handles = set(handles)
+        first = True
+        for (kind, pos, length) in self.blocks:
+            if kind not in VCDATA_BLOCKS:
+                continue
+            (begin,) = struct.unpack_from(">Q", self.data, pos + 8)
+            initial, vc_start = self.frame(pos, handles if first else ())
+            if first:
+                for handle in sorted(initial):
+                    yield begin, handle, initial[handle]
+                first = False
+
+            offsets, lengths = self.chain(kind, pos, length, vc_start)
+            present = [
+                handle
+                for handle in sorted(handles)
+                if handle - 1 < len(offsets) and offsets[handle - 1]
+            ]
+            if not present:
+                continue
+
+            times = self.time_table(pos, length)
+            packtype = self.data[vc_start]
+            lists = []
+            for handle in present:
+                raw = self.change_list(
+                    vc_start, packtype, offsets[handle - 1], lengths[handle - 1]
+                )
+                lists.append(self.tagged_changes(raw, handle, times))
+            yield from heapq.merge(*lists, key=lambda change: change[0])
+
+    def tagged_changes(self, raw, handle, times):
+        for time, value in self.decode_changes(raw, handle, times):
+            yield time, handle, value
@@ -0,0 +1,78 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+from array import array
+import sys
+
+from .utils import v2int
+
+
+class SignalHistory:
+    """Full value history of one signal, stored column-wise.
+
+    `times` is an int64 array with one timestamp per change. For signals up to 64
+    bits `values` is a uint64 array with one entry per change; wider signals are
+    packed into `words` uint64s per change, least significant word first. X/Z bits
+    read as 0 in `values` and are set in `unknown`, which has the same layout.
+    Real variables keep their samples in a float64 `values` array and have no
+    `unknown` array.
+    """
+
+    def __init__(self, xmr, id, width, real=False):
+        self.xmr = xmr
+        self.id = id
+        self.width = width
+        self.real = real
+        self.words = 1 if real else max(1, (width + 63) // 64)
+        self.times = array("q")
+        self.values = array("d" if real else "Q")
+        self.unknown = None if real else array("Q")
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, time, value):
+        """Append one change, as stored by the parser (a scalar string or a
+        (format, number) tuple)"""
+        self.times.append(time)
+        if self.real:
+            self.values.append(float(value[1]))
+            return
+        number, unknown = v2int(value, self.width)
+        if self.words == 1:
+            self.values.append(number)
+            self.unknown.append(unknown)
+        else:
+            size = self.words * 8
+            self.values.frombytes(number.to_bytes(size, "little"))
+            self.unknown.frombytes(unknown.to_bytes(size, "little"))
+
+    def finish(self):
+        """Fix up the word layout after the last `append`"""
+        if not self.real and self.words > 1 and sys.byteorder == "big":
+            self.values.byteswap()
+            self.unknown.byteswap()
+
+    def to_numpy(self):
+        """Return (times, values, unknown) as NumPy arrays, with wide signals shaped
+        (changes, words). Requires numpy."""
+        import numpy
+
+        times = numpy.frombuffer(self.times, dtype=numpy.int64)
+        if self.real:
+            return times, numpy.frombuffer(self.values, dtype=numpy.float64), None
+        values = numpy.frombuffer(self.values, dtype=numpy.uint64)
+        unknown = numpy.frombuffer(self.unknown, dtype=numpy.uint64)
+        if self.words > 1:
+            values = values.reshape(-1, self.words)
+            unknown = unknown.reshape(-1, self.words)
+        return times, values, unknown
@@ -0,0 +1,131 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+from bisect import bisect_right
+import json
+import logging
+import os
+
+logger = logging.getLogger("VCDTimeIndex")
+
+
+class VCDTimeIndex:
+    """Sparse index of `#time` markers to byte offsets in a VCD file.
+
+    One marker is recorded roughly every `stride` bytes of value changes, so building
+    the index only touches a page or two per stride. The index is cached in a
+    `<vcd>.idx` sidecar, and is rebuilt when the VCD's size or mtime no longer match.
+    """
+
+    VERSION = 1
+    STRIDE = 1 << 20
+
+    def __init__(self, path, size, mtime_ns, body_start, entries, stride=STRIDE):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.body_start = body_start
+        self.stride = stride
+        self.entries = entries
+        self.times = [time for (time, offset) in entries]
+
+    @staticmethod
+    def sidecar(path):
+        return path + ".idx"
+
+    @classmethod
+    def load(cls, path):
+        """Load the cached index for `path`, or None if it is missing or stale"""
+        try:
+            with open(cls.sidecar(path)) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+        stat = os.stat(path)
+        if (
+            data.get("version") != cls.VERSION
+            or data.get("size") != stat.st_size
+            or data.get("mtime_ns") != stat.st_mtime_ns
+        ):
+            logger.info("Discarding stale index for %s", path)
+            return None
+        return cls(
+            path,
+            data["size"],
+            data["mtime_ns"],
+            data["body_start"],
+            [tuple(entry) for entry in data["entries"]],
+            data["stride"],
+        )
+
+    def save(self):
+        data = {
+            "version": self.VERSION,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "body_start": self.body_start,
+            "stride": self.stride,
+            "entries": self.entries,
+        }
+        try:
+            with open(self.sidecar(self.path), "w") as fh:
+                json.dump(data, fh)
+        except OSError as e:
+            logger.warning("Could not write index for %s: %s", self.path, e)
+
+    @classmethod
+    def build(cls, path, data, body_start, stride=STRIDE):
+        """Index the mapped VCD contents `data`, whose value changes start at `body_start`"""
+        stat = os.stat(path)
+        entries = []
+        pos = body_start
+        while True:
+            mark = data.find(b"\n#", pos)
+            if mark < 0:
+                break
+            mark += 1
+            end = data.find(b"\n", mark)
+            time = int(data[mark + 1 : end if end >= 0 else len(data)])
+            if not entries or time > entries[-1][0]:
+                entries.append((time, mark))
+            pos = max(mark, entries[-1][1] + stride)
+        return cls(path, stat.st_size, stat.st_mtime_ns, body_start, entries, stride)
+
+    @classmethod
+    def open(cls, path, data, body_start, stride=STRIDE):
+        """Return the cached index for `path`, building and saving it if needed"""
+        index = cls.load(path)
+        if index is None or index.body_start != body_start:
+            index = cls.build(path, data, body_start, stride)
+            index.save()
+        return index
+
+    def offset_before(self, time):
+        """Offset of the last indexed marker at or before `time`"""
+        entry = bisect_right(self.times, time) - 1
+        if entry < 0:
+            return self.body_start
+        return self.entries[entry][1]
+
+    def segments(self, end=None, start=None):
+        """(start, stop) byte ranges between consecutive indexed markers, from `start`
+        up to `end`"""
+        if end is None:
+            end = self.size
+        if start is None:
+            start = self.body_start
+        bounds = [self.body_start] + [offset for (time, offset) in self.entries]
+        bounds = [offset for offset in bounds if start <= offset < end] + [end]
+        return [
+            (start, stop) for (start, stop) in zip(bounds, bounds[1:]) if stop > start
+        ]
@@ -10,21 +10,46 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+from bisect import bisect_left
 from collections import defaultdict
-from itertools import dropwhile, takewhile
+from fnmatch import fnmatchcase
+from itertools import dropwhile, repeat, takewhile
+from operator import itemgetter
+import heapq
+import io
 import logging
+import mmap
+import os
+import re
 import sys
+import time
 
+from .cache import VCDCache
+from .history import SignalHistory
+from .fst import FSTReader
+from .index import VCDTimeIndex
 from .watcher import VCDWatcher
 
+# Size of the blocks read by the chunked (fast) parsing engine
+CHUNK_SIZE = 1 << 24
+# Above this many watched ids the scanner filters ids in Python instead of
+# building one big regex alternation
+MAX_ALTERNATION = 256
+# Seconds between checks for new data when following a VCD that is being written
+FOLLOW_POLL = 0.1
+
 
 class VCDParser:
     """
   A parser object for VCD files.  Reads definitions and walks through the value changes.
   """
 
-    def __init__(self, log_ident="VCDParser", log_level=logging.WARN):
-        """ Optional log_ident allows for making the logger output unique """
+    def __init__(self, log_ident="VCDParser", log_level=logging.WARN, fast=True, root=None):
+        """ Optional log_ident allows for making the logger output unique.
+        `fast` selects the chunked binary engine whenever the file handle allows it;
+        set it to False to force the original token-by-token parser.
+        `root` names a top level scope that the simulator wraps around the design
+        (such as Verilator's `TOP`), to leave out of the XMRs."""
         keyword_functions = {
             # declaration_keyword ::=
             "$comment": self.drop_declaration,
@@ -49,35 +74,100 @@ class VCDParser:
         self.keyword_dispatch = defaultdict(self.parse_error, keyword_functions)
 
         self.scope = []
+        self.root = root
+        self.in_root = False
         self.now = 0
         self.then = 0
         self.idcode2references = defaultdict(list)
         self.xmr_cache = {}
+        # full dotted path -> id code, and the scope tree as nested
+        # (child scopes, vars) dicts, both filled in while parsing `$var`s
+        self.xmr2id = {}
+        self.hierarchy = ({}, {})
+        self.scope_nodes = [self.hierarchy]
         self.end_of_definitions = False
         self.changes = {}
         self.watchers = []
         self.debug = False
         self.watched_changes = {}
+        self.fast = fast
+        self.mapped = None
+        self.index = None
+        self.following = False
+        # id code -> [(watcher order, watcher, edge, enable), ...], built in vcd_enddefinitions
+        self.sensitivity = {}
+        self.watching = {}
 
     # Convenience getters/setters
     def get_id(self, xmr):
         """Given a Cross Module Reference (XMR), find the associated VCD ID string"""
-        search_path = xmr.split(".")
-
-        for id in self.idcode2references:
-            (var_type, size, reference) = self.idcode2references[id][0]
-            match = True
-            for depth, node in enumerate(search_path):
-                var_type, name = reference[depth]
-                if node == name:
-                    continue
-                else:
-                    match = False
-                    break
-            if match:
-                return id
-
-        raise ValueError("No match for ", xmr)
+        try:
+            return self.xmr2id[xmr]
+        except KeyError:
+            raise ValueError("No match for ", xmr) from None
+
+    @staticmethod
+    def is_pattern(xmr):
+        return any(c in xmr for c in "*?[")
+
+    def get_ids(self, pattern):
+        """Find every net matching a glob pattern, as {xmr: id}.
+
+        The pattern is matched one hierarchy level at a time: `*`, `?` and `[...]`
+        work within a level (`top_tb.dut.engine.*` is every net directly inside
+        `engine`), and a `**` level matches any number of levels, so
+        `top_tb.dut.engine.**` is the whole subtree."""
+        if pattern in self.xmr2id:
+            return {pattern: self.xmr2id[pattern]}
+        found = {}
+        self.match_hierarchy(self.hierarchy, [], pattern.split("."), found)
+        return found
+
+    def resolve_ids(self, signals):
+        """Map signal names to ids as {xmr: id}, expanding glob patterns"""
+        ids = {}
+        for signal in signals:
+            if self.is_pattern(signal):
+                matches = self.get_ids(signal)
+                if not matches:
+                    raise ValueError("No match for ", signal)
+                ids.update(matches)
+            else:
+                ids[signal] = self.get_id(signal)
+        return ids
+
+    def match_hierarchy(self, node, path, levels, found):
+        scopes, vars = node
+        level, rest = levels[0], levels[1:]
+        if level == "**":
+            if rest:
+                self.match_hierarchy(node, path, rest, found)
+            else:
+                for name, id in vars.items():
+                    found.setdefault(".".join(path + [name]), id)
+            for name, child in scopes.items():
+                self.match_hierarchy(child, path + [name], levels, found)
+            return
+
+        if level in scopes or level in vars:
+            names = [level]
+        else:
+            names = [name for name in list(scopes) + list(vars) if fnmatchcase(name, level)]
+        for name in names:
+            if rest:
+                if name in scopes:
+                    self.match_hierarchy(scopes[name], path + [name], rest, found)
+            elif name in vars:
+                found.setdefault(".".join(path + [name]), vars[name])
+
+    def watched_xmrs(self):
+        """Every name or pattern on a registered watcher's sensitivity or watch list,
+        as given (before expansion), without duplicates. This is what a simulator
+        needs to dump for the watchers to work."""
+        xmrs = []
+        for watcher in self.watchers:
+            xmrs += watcher.sensitive + watcher.watching
+        return list(dict.fromkeys(xmrs))
 
     def get_xmr(self, id):
         """Given an ID, generate the hierarchical reference"""
@@ -103,6 +193,21 @@ class VCDParser:
     def deregister_watcher(self, watcher):
         """Remove a watcher from the list"""
         self.watchers.remove(watcher)
+        if self.end_of_definitions:
+            self.build_sensitivity()
+
+    def build_sensitivity(self):
+        """Precompute the reverse index from id code to the watchers sensitive to it,
+        plus each watcher's watch list, so update_time only has to look at the ids
+        that actually changed"""
+        self.sensitivity = defaultdict(list)
+        self.watching = {}
+        for order, watcher in enumerate(self.watchers):
+            edge, enable = watcher.get_trigger()
+            for id in set(watcher.get_sensitive_ids()):
+                self.sensitivity[id].append((order, watcher, edge, enable))
+            self.watching[watcher] = tuple(watcher.get_watching_ids())
+        self.sensitivity = dict(self.sensitivity)
 
     # Parsing helpers
     def scalar_value_change(self, value, id):
@@ -128,31 +233,65 @@ class VCDParser:
         )
 
     def vcd_scope(self, tokeniser, keyword):
-        self.scope.append(tuple(takewhile(lambda x: x != "$end", tokeniser)))
+        self.declare_scope(tuple(takewhile(lambda x: x != "$end", tokeniser)))
 
     def vcd_upscope(self, tokeniser, keyword):
-        self.scope.pop()
+        self.declare_upscope()
         next(tokeniser)
 
     def vcd_var(self, tokeniser, keyword):
         data = tuple(takewhile(lambda x: x != "$end", tokeniser))
         # ignore range on identifier ( TODO  Fix this )
         (var_type, size, identifier_code, reference) = data[:4]
+        self.declare_var(var_type, size, identifier_code, reference)
+
+    def vcd_enddefinitions(self, tokeniser, keyword):
+        self.drop_declaration(tokeniser, keyword)
+        self.end_definitions()
+
+    # Definitions, shared by the VCD keywords and the FST reader
+    def declare_scope(self, scope):
+        if not self.scope and not self.in_root and scope[-1] == self.root:
+            self.in_root = True
+            return
+        self.scope.append(scope)
+        scopes = self.scope_nodes[-1][0]
+        self.scope_nodes.append(scopes.setdefault(scope[-1], ({}, {})))
+
+    def declare_upscope(self):
+        if not self.scope and self.in_root:
+            self.in_root = False
+            return
+        self.scope.pop()
+        self.scope_nodes.pop()
+
+    def declare_var(self, var_type, size, identifier_code, reference):
+        self.scope_nodes[-1][1].setdefault(reference, identifier_code)
         reference = self.scope + [("var", reference)]
         self.idcode2references[identifier_code].append((var_type, size, reference))
+        self.xmr2id.setdefault(".".join(v for (k, v) in reference), identifier_code)
 
-    def vcd_enddefinitions(self, tokeniser, keyword):
+    def end_definitions(self):
         self.end_of_definitions = True
-        self.drop_declaration(tokeniser, keyword)
 
         for watcher in self.watchers:
             watcher.update_ids()
             for id in watcher.get_watching_ids():
                 self.watched_changes[id] = "x"
+        self.build_sensitivity()
         self.logger.debug("Finished parsing definitions! I know these vars:")
         for code, mytype in self.idcode2references.items():
             self.logger.debug("{}: {}".format(code, mytype))
 
+    def fst_scope(self, scope_type, name):
+        self.declare_scope((scope_type, name))
+
+    def fst_upscope(self):
+        self.declare_upscope()
+
+    def fst_var(self, var_type, size, handle, reference):
+        self.declare_var(var_type, str(size), str(handle), reference)
+
     # Simulation keywords are presently ignored...
     def vcd_dumpall(self, tokeniser, keyword):
         self.logger.info("Ignoring `$dumpall`...")
@@ -179,48 +318,69 @@ class VCDParser:
         """Reached an update point in time in the VCD - use the collected changes
      and update any watchers that are sensitive to a signal that has changed"""
         current_time = self.now
-        if self.logger.getEffectiveLevel == logging.DEBUG:
+        changes = self.changes
+        if self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug(
                 "End of time %s, processing sensitivity lists. Changes:", current_time
             )
-            for change in self.changes:
-                self.logger.debug(
-                    "  %s: %s", self.get_xmr(change), self.changes[change]
-                )
-
-        # Check watcher sensitivity lists, maybe notify
-        for watcher in self.watchers:
-            update_needed = False
-            activity = {}
-            # TODO cache this?
-            for id in watcher.get_sensitive_ids():
-                if id in self.changes:
-                    update_needed = True
-                    activity[id] = self.changes[id]
-
-            if update_needed:
-                collected_changes = {}
-                for id in watcher.get_watching_ids():
-                    collected_changes[id] = self.watched_changes[id]
-
+            for change in changes:
+                self.logger.debug("  %s: %s", self.get_xmr(change), changes[change])
+
+        # Find the watchers sensitive to something that changed, maybe notify.
+        # Edge and enable conditions are checked here, against the values from
+        # before this timestep, so filtered-out changes never reach the watcher
+        triggered = {}
+        sensitivity = self.sensitivity
+        watched_changes = self.watched_changes
+        for id in changes:
+            if id in sensitivity:
+                value = changes[id]
+                for order, watcher, edge, enable in sensitivity[id]:
+                    if edge is not None and (
+                        value not in edge or watched_changes[id] == value
+                    ):
+                        continue
+                    if enable is not None and watched_changes[enable[0]] not in enable[1]:
+                        continue
+                    if order not in triggered:
+                        triggered[order] = (watcher, {})
+                    triggered[order][1][id] = value
+
+        if triggered:
+            for order in sorted(triggered):
+                watcher, activity = triggered[order]
+                collected_changes = {
+                    id: watched_changes[id] for id in self.watching[watcher]
+                }
                 watcher.notify(activity, collected_changes)
 
         self.update_watched_changes()
         self.changes = {}
         self.then = current_time
         self.now = next_time
-        self.logger.debug("Time is now %s (was %s)", self.now, self.then)
+
+    def end_changes(self):
+        """Deliver the changes of the last timestep, which no `#time` marker closes.
+        Every parse calls this once it reaches the end of the dump."""
+        if self.changes:
+            self.update_time(self.now)
 
     def update_watched_changes(self):
         """Watched changes is a persistent store of changes to the list of signals
        considered by all watchers. Here it is updated after any watcher
        updates from update_time, to store the 'new' values"""
-        for id in self.watched_changes:
-            if id in self.changes:
-                self.watched_changes[id] = self.changes[id]
+        watched_changes = self.watched_changes
+        for id, value in self.changes.items():
+            if id in watched_changes:
+                watched_changes[id] = value
 
     def parse(self, fh):
         """Tokenize and parse the VCD file"""
+        stream = self.binary_stream(fh) if self.fast else None
+        if stream is not None:
+            self.parse_fast(stream)
+            return
+
         # open the VCD file and create a token generator
         tokeniser = (word for line in fh for word in line.split() if word)
 
@@ -235,7 +395,7 @@ class VCDParser:
                     # skip $dump* tokens and $end tokens in sim section
                     continue
                 elif c == "#":
-                    self.update_time(rest)
+                    self.update_time(int(rest))
                 elif c in "01xXzZ":
                     self.scalar_value_change(value=c, id=rest)
                 elif c in "bBrR":
@@ -244,3 +404,515 @@ class VCDParser:
                     )
                 else:
                     raise "Don't understand `{}` after {} words".format(token, count)
+        self.end_changes()
+
+    # Chunked parsing engine
+    @staticmethod
+    def binary_stream(fh):
+        """Return a binary stream for `fh`, or None if only the token parser can read it.
+        Text handles are accepted as long as nothing has been read from them yet."""
+        if not isinstance(fh, io.TextIOBase):
+            return fh
+        buffer = getattr(fh, "buffer", None)
+        if buffer is None or not fh.seekable() or fh.tell() != 0:
+            return None
+        fh.seek(0)
+        return buffer
+
+    @staticmethod
+    def read_chunks(stream, size=CHUNK_SIZE):
+        """Yield large blocks of a binary stream, each ending on a line boundary"""
+        tail = b""
+        while True:
+            data = stream.read(size)
+            if not data:
+                if tail:
+                    yield tail
+                return
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                tail += data
+                continue
+            yield tail + data[:cut]
+            tail = data[cut:]
+
+    @staticmethod
+    def definitions_end(data):
+        """Offset just past `$enddefinitions ... $end` in `data`, or -1"""
+        mark = data.find(b"$enddefinitions")
+        if mark < 0:
+            return -1
+        end = data.find(b"$end", mark + len(b"$enddefinitions"))
+        if end < 0:
+            return -1
+        return end + len(b"$end")
+
+    def parse_header(self, header):
+        """Run the declaration section (as bytes) through the keyword dispatch"""
+        tokeniser = iter(header.decode().split())
+        for token in tokeniser:
+            self.keyword_dispatch[token](tokeniser, token)
+
+    def parse_definitions(self, chunks):
+        """Run the declaration keywords through the regular dispatch, and return the
+        bytes following `$enddefinitions ... $end` (the start of the value changes)"""
+        header = b""
+        for chunk in chunks:
+            header += chunk
+            end = self.definitions_end(header)
+            if end >= 0:
+                break
+        else:
+            raise ValueError("No $enddefinitions found in VCD file")
+
+        self.parse_header(header[:end])
+        return header[end:]
+
+    def get_watched_ids(self):
+        """All ids that at least one registered watcher is interested in"""
+        ids = set(self.watched_changes)
+        for watcher in self.watchers:
+            ids.update(watcher.get_sensitive_ids())
+        return ids
+
+    @staticmethod
+    def change_pattern(ids):
+        """Regex matching value change lines, restricted to `ids` if that is practical.
+        Groups are (scalar value, vector format, vector number, id)."""
+        if ids and len(ids) <= MAX_ALTERNATION:
+            alternation = b"|".join(
+                re.escape(id) for id in sorted(ids, key=len, reverse=True)
+            )
+        elif ids:
+            alternation = rb"\S+"
+        else:
+            alternation = rb"(?!)"
+        return re.compile(
+            rb"^(?:([01xXzZ])|([bBrR])(\S+)[ \t]+)(" + alternation + rb")[ \t\r]*$",
+            re.MULTILINE,
+        )
+
+    @staticmethod
+    def last_marker(chunk, lo, hi):
+        """Position of the last `#time` line starting in chunk[lo:hi], or -1"""
+        mark = chunk.rfind(b"\n#", lo, hi)
+        if mark >= 0:
+            return mark + 1
+        if lo == 0 and hi > 0 and chunk.startswith(b"#"):
+            return 0
+        return -1
+
+    @staticmethod
+    def marker_time(chunk, mark):
+        """Decode the `#time` line starting at `mark`"""
+        end = chunk.find(b"\n", mark)
+        return int(chunk[mark + 1 : end if end >= 0 else len(chunk)])
+
+    def scan_changes(self, chunks, ids):
+        """Walk the value change section without tokenising it.
+
+        Yields (time, then, id, value) for each change to one of `ids`, where `then`
+        is the timestamp preceding `time` and `value` takes the same form as in
+        `self.changes`. Lines for other ids never become Python objects. If the dump
+        moves past the last reported change by the end of a chunk, a
+        (time, then, None, None) is yielded so the caller can close off the timestep."""
+        names = {id.encode(): id for id in ids}
+        pattern = self.change_pattern(names)
+        filtered = len(names) > MAX_ALTERNATION
+        last_marker, marker_time = self.last_marker, self.marker_time
+        now, then = self.now, self.then
+        reported = now
+
+        for chunk in chunks:
+            pos = 0
+            for match in pattern.finditer(chunk):
+                value, fmt, number, id = match.groups()
+                if filtered and id not in names:
+                    continue
+                start = match.start()
+                mark = last_marker(chunk, pos, start)
+                if mark >= 0:
+                    prev = last_marker(chunk, pos, mark)
+                    then = marker_time(chunk, prev) if prev >= 0 else now
+                    now = marker_time(chunk, mark)
+                pos = match.end()
+                if value is not None:
+                    yield now, then, names[id], value.decode()
+                else:
+                    yield now, then, names[id], (fmt.lower().decode(), number.decode())
+                reported = now
+
+            mark = last_marker(chunk, pos, len(chunk))
+            if mark >= 0:
+                prev = last_marker(chunk, pos, mark)
+                then = marker_time(chunk, prev) if prev >= 0 else now
+                now = marker_time(chunk, mark)
+
+            # close off timesteps at chunk ends, so a followed dump is not held
+            # back waiting for the next watched change
+            if now != reported:
+                yield now, then, None, None
+                reported = now
+
+    def parse_fast(self, stream):
+        """Parse a binary VCD stream with the chunked engine.
+
+        Assumes one value change per line in the simulation section, which is what
+        xsim, Icarus and Verilator all write."""
+        chunks = self.read_chunks(stream)
+        body = self.parse_definitions(chunks)
+        self.parse_changes(self.body_chunks(body, chunks))
+        self.end_changes()
+
+    @staticmethod
+    def body_chunks(body, chunks):
+        """Re-attach the leftover header bytes to the rest of the chunk stream"""
+        if body:
+            yield body
+        yield from chunks
+
+    def parse_changes(self, chunks):
+        """Feed the scanned value changes to the watchers"""
+        changes = self.changes
+        for time, then, id, value in self.scan_changes(chunks, self.get_watched_ids()):
+            if time != self.now:
+                self.update_time(time)
+                self.then = then
+                changes = self.changes
+            if id is not None:
+                changes[id] = value
+
+    # Following a VCD that is still being written
+    def stop_following(self):
+        """Make `follow` return after the chunk being processed; trackers can call
+        this (as `self.parser.stop_following()`) once they have seen enough"""
+        self.following = False
+
+    def still_following(self):
+        """False once `stop_following` was called or every tracker has finished"""
+        return self.following and any(watcher.trackers for watcher in self.watchers)
+
+    def follow_chunks(self, stream, alive=None, poll=FOLLOW_POLL):
+        """Yield what the writer appends to `stream`, in blocks ending on line
+        boundaries, polling every `poll` seconds while there is nothing new. Ends
+        when `still_following` says so, or once `alive()` returns False and the
+        rest of the file has been read."""
+        tail = b""
+        draining = False
+        while self.still_following():
+            data = stream.read(CHUNK_SIZE)
+            if data:
+                tail += data
+                cut = tail.rfind(b"\n") + 1
+                if cut:
+                    yield tail[:cut]
+                    tail = tail[cut:]
+            elif draining:
+                if tail:
+                    yield tail
+                return
+            elif alive is not None and not alive():
+                # the writer is gone; one more pass picks up its last writes
+                draining = True
+            else:
+                time.sleep(poll)
+
+    def follow(self, path, alive=None, poll=FOLLOW_POLL):
+        """Parse a VCD while a simulator is still writing it, firing the watchers as
+        timesteps complete. `alive` is a callable that returns False once the writer
+        has exited, e.g. `lambda: process.poll() is None`; without it, following only
+        ends through `stop_following` or when all the trackers have finished."""
+        self.following = True
+        while not os.path.exists(path):
+            if alive is not None and not alive():
+                raise FileNotFoundError(path)
+            time.sleep(poll)
+        with open(path, "rb") as fh:
+            chunks = self.follow_chunks(fh, alive, poll)
+            body = self.parse_definitions(chunks)
+            self.parse_changes(self.body_chunks(body, chunks))
+            if self.still_following():
+                # the writer is gone and the whole dump was read, not stopped part way
+                self.end_changes()
+
+    # Memory-mapped access
+    def map_file(self, path):
+        """Memory-map a VCD file, parse its definitions and load (or build) its time
+        index. Register watchers before calling this; follow up with `last_change`
+        and/or `parse_mapped`, then `close`."""
+        with open(path, "rb") as fh:
+            self.mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        body_start = self.definitions_end(self.mapped)
+        if body_start < 0:
+            raise ValueError("No $enddefinitions found in VCD file")
+        self.parse_header(self.mapped[:body_start])
+        self.index = VCDTimeIndex.open(path, self.mapped, body_start)
+        return self
+
+    def close(self):
+        if self.mapped is not None:
+            self.mapped.close()
+        self.mapped = None
+
+    def mapped_chunks(self, start, stop, size=CHUNK_SIZE):
+        """Yield the mapped file between two offsets, in blocks ending on line boundaries"""
+        data = self.mapped
+        while start < stop:
+            end = min(start + size, stop)
+            if end < stop:
+                cut = data.rfind(b"\n", start, end)
+                if cut >= start:
+                    end = cut + 1
+            yield data[start:end]
+            start = end
+
+    def scan_last(self, ids, stop=None, value=None, start=None):
+        """Scan backward from `stop` (default: end of file), one indexed segment at a
+        time, for the last change of each of `ids`, optionally only changes to
+        `value`, and not looking before the indexed marker at `start`.
+        Returns {id: (time, value)} for the ids that were found."""
+        remaining = set(ids)
+        found = {}
+        names = {id.encode(): id for id in remaining}
+        pattern = self.change_pattern(names)
+        for lo, hi in reversed(self.index.segments(stop, start)):
+            if not remaining:
+                break
+            chunk = self.mapped[lo:hi]
+            last = {}
+            for match in pattern.finditer(chunk):
+                scalar, fmt, number, id = match.groups()
+                if id not in names or names[id] not in remaining:
+                    continue
+                if scalar is not None:
+                    change = scalar.decode()
+                else:
+                    change = (fmt.lower().decode(), number.decode())
+                if value is None or change == value:
+                    last[names[id]] = (match.start(), change)
+            for id, (pos, change) in last.items():
+                mark = self.last_marker(chunk, 0, pos)
+                if mark >= 0:
+                    time = self.marker_time(chunk, mark)
+                else:
+                    # only possible ahead of the first marker, i.e. at time zero
+                    time = 0
+                found[id] = (time, change)
+                remaining.discard(id)
+        return found
+
+    def last_change(self, xmr, value=None):
+        """Time of the last change of `xmr` (to `value`, if given) in the mapped file,
+        found by scanning backward from the end. None if it never changes."""
+        id = self.get_id(xmr)
+        found = self.scan_last([id], value=value)
+        if id in found:
+            return found[id][0]
+        return None
+
+    def first_change(self, xmr, value=None):
+        """Time of the first change of `xmr` (to `value`, if given) in the mapped file,
+        found by scanning forward from the start. None if it never changes."""
+        id = self.get_id(xmr)
+        chunks = self.mapped_chunks(self.index.body_start, len(self.mapped))
+        for time, then, changed, change in self.scan_changes(chunks, [id]):
+            if changed is not None and (value is None or change == value):
+                return time
+        return None
+
+    def time_before(self, offset):
+        """Time of the last marker before `offset` in the mapped file, or None if
+        there is none. The search starts at the indexed marker below `offset`."""
+        marks = [mark for (time, mark) in self.index.entries]
+        entry = bisect_left(marks, offset) - 1
+        lo = marks[entry] if entry >= 0 else self.index.body_start
+        mark = self.mapped.rfind(b"\n#", max(lo - 1, 0), offset)
+        if mark < 0 or mark + 1 < self.index.body_start:
+            return None
+        return self.marker_time(self.mapped, mark + 1)
+
+    def parse_mapped(self, start_time=None):
+        """Run the watchers over the mapped file, optionally starting at the first
+        marker at or after `start_time`. When starting part way, the watched values
+        are seeded with each signal's last change before that point, and the parse
+        resumes from the marker before it, so `then` is right from the first timestep."""
+        start = self.index.body_start
+        if start_time is not None:
+            start = self.index.offset_before(start_time)
+            for match in re.compile(rb"^#(\d+)", re.MULTILINE).finditer(
+                self.mapped, start
+            ):
+                if int(match.group(1)) >= start_time:
+                    start = match.start()
+                    break
+            else:
+                start = len(self.mapped)
+            if start > self.index.body_start:
+                ids = self.get_watched_ids()
+                for id, (time, value) in self.scan_last(ids, stop=start).items():
+                    if id in self.watched_changes:
+                        self.watched_changes[id] = value
+                before = self.time_before(start)
+                if before is not None:
+                    self.now = self.then = before
+        self.parse_changes(self.mapped_chunks(start, len(self.mapped)))
+        self.end_changes()
+
+    def parse_file(self, path, start_time=None, cache=False):
+        """Memory-map and parse a VCD file, optionally starting at `start_time`.
+        FST files are recognised and handed to `parse_fst`. With `cache`, the VCD is
+        replayed from its binary cache, which is written first if need be; see
+        `parse_cached`."""
+        with open(path, "rb") as fh:
+            if fh.read(1) in (b"\x00", b"\xfe"):
+                self.parse_fst(path)
+                return
+        if cache and self.parse_cached(path, start_time):
+            return
+        try:
+            self.map_file(path)
+            self.parse_mapped(start_time)
+        finally:
+            self.close()
+
+    def parse_cached(self, path, start_time=None):
+        """Run the watchers over the `VCDCache` of a VCD file, building the cache
+        from the text first if it is missing or stale. Only the change lists of
+        watched ids are read. Returns False if no cache could be written."""
+        cache = VCDCache.load(path)
+        if cache is None:
+            scanner = VCDParser(self.logger.name, self.logger.level)
+            scanner.map_file(path)
+            try:
+                VCDCache.build(scanner, path)
+            finally:
+                scanner.close()
+            cache = VCDCache.load(path)
+            if cache is None:
+                return False
+
+        try:
+            self.parse_header(cache.definitions())
+            markers = cache.markers()
+            start = 0
+            if start_time is not None:
+                start = bisect_left(markers, start_time)
+                if 0 < start < len(markers):
+                    # resume from the marker before, which the first timestep's `then` is
+                    self.now = self.then = markers[start - 1]
+
+            streams = []
+            for id in self.get_watched_ids():
+                times, values = cache.changes(id)
+                if start:
+                    # seed the watched value from its last change before the start
+                    first = len(times)
+                    if start < len(markers):
+                        first = bisect_left(times, markers[start])
+                    if first and id in self.watched_changes:
+                        self.watched_changes[id] = values[first - 1]
+                    times, values = times[first:], values[first:]
+                streams.append(zip(times, repeat(id), values))
+
+            changes = self.changes
+            for time, id, value in heapq.merge(*streams, key=itemgetter(0)):
+                if time != self.now:
+                    self.update_time(time)
+                    position = bisect_left(markers, time)
+                    self.then = markers[position - 1] if position else self.now
+                    changes = self.changes
+                changes[id] = value
+            if start < len(markers) and markers[-1] > self.now:
+                self.update_time(markers[-1])
+                self.then = markers[-2] if len(markers) > 1 else self.now
+            self.end_changes()
+        finally:
+            cache.close()
+        return True
+
+    def parse_fst(self, path):
+        """Parse an FST file through the same watchers. Only the change lists of
+        watched signals are decompressed."""
+        reader = FSTReader(path)
+        try:
+            self.timescale = reader.timescale
+            self.version = reader.version
+            self.date = reader.date
+            reader.read_hierarchy(self)
+            self.end_definitions()
+
+            ids = {int(id): id for id in self.get_watched_ids()}
+            for time, handle, value in reader.changes(ids):
+                if time != self.now:
+                    self.update_time(time)
+                self.changes[ids[handle]] = value
+            self.end_changes()
+        finally:
+            reader.close()
+
+    def parse_parallel(self, path, jobs=None):
+        """Parse a VCD file over a pool of `jobs` processes; see `vcd.shards`"""
+        from .shards import parse_parallel
+
+        parse_parallel(self, path, jobs)
+
+    # Bulk extraction
+    def extract_history(self, path, signals):
+        """Collect the full value history of each of `signals` (names or glob
+        patterns) in one streaming pass over the VCD at `path`.
+
+        Returns {xmr: SignalHistory}; each history holds int64 timestamps and uint64
+        values (packed into several words per change for signals wider than 64
+        bits), ready for `SignalHistory.to_numpy`."""
+        self.map_file(path)
+        try:
+            histories = {}
+            by_id = defaultdict(list)
+            for xmr, id in self.resolve_ids(signals).items():
+                (var_type, size, reference) = self.idcode2references[id][0]
+                history = SignalHistory(
+                    xmr, id, int(size), real=var_type in ("real", "realtime")
+                )
+                histories[xmr] = history
+                by_id[id].append(history)
+
+            chunks = self.mapped_chunks(self.index.body_start, len(self.mapped))
+            for time, then, id, value in self.scan_changes(chunks, by_id):
+                if id is not None:
+                    for history in by_id[id]:
+                        history.append(time, value)
+        finally:
+            self.close()
+
+        for history in histories.values():
+            history.finish()
+        return histories
+
+    def collect_stats(self, path, signals=None):
+        """Count toggles, high time and first/last change of every net in the VCD at
+        `path`, or just of `signals` (names or glob patterns), in one streaming
+        pass. Returns a `VCDStats`; see also `python -m vcd.stats`."""
+        from .stats import VCDStats
+
+        self.map_file(path)
+        try:
+            if signals is None:
+                nets = dict(self.xmr2id)
+            else:
+                nets = self.resolve_ids(signals)
+            widths = {
+                id: int(self.idcode2references[id][0][1]) for id in nets.values()
+            }
+            entries = self.index.entries
+            stats = VCDStats(nets, widths, start=entries[0][0] if entries else 0)
+
+            chunks = self.mapped_chunks(self.index.body_start, len(self.mapped))
+            for time, then, id, value in self.scan_changes(chunks, stats.slots):
+                if id is not None:
+                    stats.change(time, id, value)
+            last = self.last_marker(self.mapped, self.index.body_start, len(self.mapped))
+            if last >= 0:
+                stats.finish(self.marker_time(self.mapped, last))
+        finally:
+            self.close()
+        return stats
@@ -0,0 +1,164 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Parallel VCD parsing over time shards.
+
+The definitions are parsed once, in the calling process, and the value change
+section is cut into shards at indexed `#time` markers. A process pool forked from
+the caller then works in two rounds: first each worker finds the last value of
+every watched signal within its shard, from which the state at each shard
+boundary is derived; then each worker runs the watchers over its shard, starting
+from that state. Only watchers whose trackers are all `shard_safe` take part; the
+tracker copies from each shard are folded back with `VCDTracker.merge`, in time
+order, up to the shard in which the tracker finished. All other watchers run
+sequentially in the calling process meanwhile.
+"""
+
+import copy
+import multiprocessing
+import os
+
+# The parser being sharded, inherited by the forked workers, along with the
+# initial tracker results that each shard starts from
+_parser = None
+_trackers = []
+_initial = []
+
+# Per-run tracker attributes that are not results, and cannot be pickled
+TRANSIENT = ("watcher", "parser", "activity", "values")
+
+
+def shard_bounds(parser, count):
+    """Split the mapped value changes into up to `count` (start, stop) ranges of
+    similar size, cut at indexed markers"""
+    index = parser.index
+    size = len(parser.mapped)
+    offsets = [offset for (time, offset) in index.entries]
+    bounds = [index.body_start]
+    for shard in range(1, count):
+        target = index.body_start + (size - index.body_start) * shard // count
+        candidates = [offset for offset in offsets if bounds[-1] < offset <= target]
+        if candidates:
+            bounds.append(candidates[-1])
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def last_values(bounds):
+    """Worker: last change of each watched id in one shard"""
+    start, stop = bounds
+    found = _parser.scan_last(_parser.get_watched_ids(), stop=stop, start=start)
+    return {id: value for id, (time, value) in found.items()}
+
+
+def tracker_results(tracker):
+    return {key: value for key, value in vars(tracker).items() if key not in TRANSIENT}
+
+
+def run_shard(args):
+    """Worker: run the shard-safe watchers over one shard, return tracker results"""
+    start, stop, seed = args
+    parser = _parser
+    # workers are reused between shards, so start every shard from scratch
+    for tracker, (watcher, initial) in zip(_trackers, _initial):
+        tracker.__dict__.update(copy.deepcopy(initial))
+        if tracker not in watcher.trackers and not tracker.finished:
+            watcher.trackers.append(tracker)
+    parser.watched_changes.update(seed)
+    parser.changes = {}
+    # resume from the previous shard's last marker, which the first timestep's `then` is
+    before = parser.time_before(start) if start > parser.index.body_start else None
+    parser.now = parser.then = before if before is not None else 0
+    parser.parse_changes(parser.mapped_chunks(start, stop))
+    if stop < len(parser.mapped):
+        # the changes after the shard's last marker are due at the next shard's first
+        parser.update_time(parser.marker_time(parser.mapped, stop))
+    else:
+        parser.end_changes()
+    return [tracker_results(tracker) for tracker in _trackers]
+
+
+def parse_parallel(parser, path, jobs=None):
+    global _parser, _trackers, _initial
+
+    jobs = jobs or os.cpu_count() or 1
+    parser.map_file(path)
+    try:
+        watchers = list(parser.watchers)
+        sharded = [
+            watcher
+            for watcher in watchers
+            if watcher.trackers
+            and all(tracker.shard_safe for tracker in watcher.trackers)
+        ]
+        if (
+            jobs < 2
+            or not sharded
+            or "fork" not in multiprocessing.get_all_start_methods()
+        ):
+            parser.parse_mapped()
+            return
+
+        shards = shard_bounds(parser, jobs * 4)
+        sequential = [watcher for watcher in watchers if watcher not in sharded]
+
+        _parser = parser
+        _trackers = [tracker for watcher in sharded for tracker in watcher.trackers]
+        _initial = [
+            (tracker.watcher, copy.deepcopy(tracker_results(tracker)))
+            for tracker in _trackers
+        ]
+        parser.watchers = sharded
+        parser.build_sensitivity()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(jobs) as pool:
+            # the pool has forked; this process is free to run the other watchers
+            parser.watchers = sequential
+            parser.build_sensitivity()
+
+            seeds = [dict(parser.watched_changes)]
+            for last in pool.map(last_values, shards):
+                seeds.append(dict(seeds[-1], **last))
+            results = pool.map_async(
+                run_shard,
+                [(start, stop, seed) for (start, stop), seed in zip(shards, seeds)],
+            )
+            if sequential:
+                parser.parse_mapped()
+            results = results.get()
+
+        for states in results:
+            for tracker, state in zip(_trackers, states):
+                if tracker.finished:
+                    # run sequentially, it would not have seen the later shards
+                    continue
+                shard = copy.copy(tracker)
+                shard.__dict__.update(state)
+                tracker.merge(shard)
+        for watcher in sharded:
+            watcher.trackers = [
+                tracker for tracker in watcher.trackers if not tracker.finished
+            ]
+
+        parser.watchers = watchers
+        parser.build_sensitivity()
+        parser.watched_changes.update(
+            {id: value for id, value in seeds[-1].items() if id in parser.watched_changes}
+        )
+        last = parser.last_marker(parser.mapped, 0, len(parser.mapped))
+        if last >= 0:
+            parser.now = parser.then = parser.marker_time(parser.mapped, last)
+    finally:
+        _parser = None
+        _trackers = []
+        _initial = []
+        parser.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Per-net activity statistics for a VCD, for power estimates.
+
+Run with `python -m vcd.stats run/ci.vcd 'top_tb.dut.engine.**' -o engine.tsv`; the
+resulting table is sorted by net name, so the tables from two builds can be diffed.
+"""
+
+from array import array
+import argparse
+import sys
+
+from .utils import v2int
+
+COLUMNS = ("net", "width", "changes", "toggles", "high_time", "duty", "first", "last")
+
+
+class VCDStats:
+    """Activity counters for a set of nets, kept in arrays with one slot per id code.
+
+    For each net: `changes` is the number of value changes, `toggles` the number of
+    individual bits that flipped between known values, `high_time` the time spent
+    non-zero (at 1, for single bit nets), and `first`/`last` the times of the first
+    and last change (-1 if it never changes). Nets declared as aliases of the same
+    id code share a slot.
+    """
+
+    def __init__(self, nets, widths, start=0):
+        """`nets` is {xmr: id}, `widths` is {id: width}"""
+        self.nets = nets
+        self.slots = {id: slot for slot, id in enumerate(dict.fromkeys(nets.values()))}
+        count = len(self.slots)
+        self.widths = array("Q", (widths[id] for id in self.slots))
+        self.changes = array("Q", bytes(8 * count))
+        self.toggles = array("Q", bytes(8 * count))
+        self.high_time = array("Q", bytes(8 * count))
+        self.first = array("q", [-1]) * count
+        self.last = array("q", [-1]) * count
+        # current state of each net: value, X/Z mask and since when it is non-zero
+        self.value = [0] * count
+        self.unknown = [(1 << width) - 1 for width in self.widths]
+        self.high_since = array("q", [-1]) * count
+        self.start = start
+        self.end = start
+
+    def change(self, time, id, value):
+        """Count one value change, as stored by the parser (a scalar string or a
+        (format, number) tuple)"""
+        slot = self.slots[id]
+        self.changes[slot] += 1
+        if self.first[slot] < 0:
+            self.first[slot] = time
+        self.last[slot] = time
+        if isinstance(value, tuple) and value[0] == "r":
+            number, unknown = float(value[1]) != 0, 0
+        else:
+            number, unknown = v2int(value, self.widths[slot])
+            known = ~(unknown | self.unknown[slot])
+            self.toggles[slot] += bin((number ^ self.value[slot]) & known).count("1")
+        self.value[slot] = number
+        self.unknown[slot] = unknown
+
+        since = self.high_since[slot]
+        if since >= 0 and not number:
+            self.high_time[slot] += time - since
+            self.high_since[slot] = -1
+        elif since < 0 and number:
+            self.high_since[slot] = time
+
+    def finish(self, end):
+        """Close off the nets that are still high at `end`, the last time in the dump"""
+        self.end = end
+        for slot, since in enumerate(self.high_since):
+            if since >= 0:
+                self.high_time[slot] += end - since
+                self.high_since[slot] = end
+
+    def rows(self):
+        """One tuple per net, in `COLUMNS` order, sorted by net name"""
+        span = self.end - self.start
+        for xmr in sorted(self.nets):
+            slot = self.slots[self.nets[xmr]]
+            high_time = self.high_time[slot]
+            yield (
+                xmr,
+                self.widths[slot],
+                self.changes[slot],
+                self.toggles[slot],
+                high_time,
+                high_time / span if span else 0.0,
+                self.first[slot],
+                self.last[slot],
+            )
+
+    def write(self, fh):
+        """Write the table as tab separated values"""
+        fh.write("\t".join(COLUMNS) + "\n")
+        for row in self.rows():
+            fh.write("{}\t{}\t{}\t{}\t{}\t{:.4f}\t{}\t{}\n".format(*row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-net toggle counts and duty cycles of a VCD")
+    parser.add_argument("vcd", help="VCD file to analyse")
+    parser.add_argument("signals", nargs="*", help="Nets or glob patterns (default: every net)")
+    parser.add_argument("-o", "--output", help="Write the table here instead of stdout")
+    args = parser.parse_args()
+
+    from .parser import VCDParser
+
+    stats = VCDParser().collect_stats(args.vcd, args.signals or None)
+    if args.output:
+        with open(args.output, "w") as fh:
+            stats.write(fh)
+    else:
+        stats.write(sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
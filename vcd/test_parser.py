@@ -0,0 +1,524 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Checks that parsing part of a VCD (from `start_time`, from the binary cache, or
+over time shards) delivers the same timesteps as a full parse, with the same
+`now` and `then`, and that an FST delivers the same as the equivalent VCD; then
+the behaviour of glob patterns, value decoding, edge watchers, follow mode, history
+extraction and statistics. Run with `python -m unittest vcd.test_parser`."""
+
+import gzip
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+from . import fst
+from .index import VCDTimeIndex
+from .parser import VCDParser
+from .tracker import VCDTracker
+from .utils import decode, v2d, v2int
+from .watcher import VCDWatcher, GatedWatcher, RisingEdgeWatcher, FallingEdgeWatcher
+
+STEPS = 400
+
+
+class EveryChange(VCDWatcher):
+    def should_notify(self):
+        return True
+
+
+class TimestepTracker(VCDTracker):
+    """Records (now, then, data) at every notification; finishes at time `until`"""
+
+    shard_safe = True
+
+    def __init__(self, until=None):
+        super().__init__()
+        self.until = until
+
+    def start(self):
+        self.seen = []
+
+    def update(self):
+        self.seen.append((self.parser.now, self.parser.then, self["top_tb.data"]))
+        if self.until is not None and self.parser.now >= self.until:
+            self.finished = True
+
+    def merge(self, other):
+        super().merge(other)
+        self.seen += other.seen
+
+
+def write_vcd(path):
+    """A clock that toggles every 10 time units, with `data` following a counter,
+    and `done` rising at steps 150 and 300. Timesteps 20 and 21 have no changes,
+    so their markers are followed directly by others."""
+    with open(path, "w") as fh:
+        fh.write("$timescale 1ps $end\n$scope module top_tb $end\n")
+        fh.write("$var wire 1 ! clk $end\n$var wire 8 \" data [7:0] $end\n$var wire 1 # done $end\n")
+        fh.write("$upscope $end\n$enddefinitions $end\n#0\n$dumpvars\n0!\nb0 \"\n0#\n$end\n")
+        for step in range(1, STEPS):
+            fh.write("#{}\n".format(step * 10))
+            if step in (20, 21):
+                continue
+            fh.write("{}!\n".format(step & 1))
+            if step & 1:
+                fh.write("b{:b} \"\n".format(step & 0xFF))
+            if step in (150, 300):
+                fh.write("1#\n")
+            elif step in (160, 310):
+                fh.write("0#\n")
+        fh.write("#{}\n".format(STEPS * 10))
+
+
+# FST_STEPS timesteps 10 apart, each changing `clk` and `data`; the last one is not
+# followed by a marker in the VCD
+FST_STEPS = 12
+
+
+def fst_values(step):
+    return step & 1, (step * 37) & 0xFF
+
+
+def write_fst_vcd(path):
+    """The VCD that `write_fst` encodes, with vectors written at full width as FST
+    stores them"""
+    with open(path, "w") as fh:
+        fh.write("$timescale 1ps $end\n$scope module top_tb $end\n")
+        fh.write("$var wire 1 ! clk $end\n$var wire 8 \" data [7:0] $end\n")
+        fh.write("$upscope $end\n$enddefinitions $end\n")
+        for step in range(FST_STEPS):
+            clk, data = fst_values(step)
+            fh.write("#{}\n{}!\nb{:08b} \"\n".format(step * 10, clk, data))
+
+
+def varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def fst_block(kind, body):
+    return bytes([kind]) + struct.pack(">Q", len(body) + 8) + body
+
+
+def fst_hierarchy():
+    """Hierarchy records for `top_tb.clk` (handle 1) and `top_tb.data` (handle 2)"""
+    records = bytes([fst.FST_ST_VCD_SCOPE, 0]) + b"top_tb\0\0"
+    for name, width in ((b"clk", 1), (b"data", 8)):
+        records += bytes([fst.VAR_TYPES.index("wire"), 0]) + name + b"\0" + varint(width) + varint(0)
+    return records + bytes([fst.FST_ST_VCD_UPSCOPE])
+
+
+def write_fst(path, hierarchy=True):
+    """The same dump as `write_fst_vcd`, as an FST with one uncompressed value
+    change block. Without `hierarchy`, the records go to a `.hier` file instead,
+    as a writer that was not closed leaves them."""
+    end = (FST_STEPS - 1) * 10
+    header = struct.pack(">QQ", 0, end) + struct.pack("<d", fst.ENDIAN_TEST)
+    header += struct.pack(">QQQQQb", 0, 1, 2, 2, 1, -12) + bytes(128 + 119 + 1)
+
+    records = fst_hierarchy()
+    geometry = varint(1) + varint(8)
+
+    clk, data = fst_values(0)
+    frame = str(clk).encode() + format(data, "08b").encode()
+    lists = [bytearray(varint(0)), bytearray(varint(0))]  # 0: not compressed
+    for step in range(1, FST_STEPS):
+        clk, data = fst_values(step)
+        lists[0] += varint(1 << 2 | clk << 1)  # one time index on, a 0/1 value
+        lists[1] += varint(1 << 1 | 1) + format(data, "08b").encode()
+    chain = varint(1 << 1 | 1) + varint(len(lists[0]) << 1 | 1)  # offsets after the packtype
+    times = b"".join(varint(10 if step else 0) for step in range(FST_STEPS))
+
+    block = struct.pack(">QQQ", 0, end, 0)
+    block += varint(len(frame)) + varint(len(frame)) + varint(2) + frame
+    block += varint(2) + b"Z" + bytes(lists[0]) + bytes(lists[1])
+    block += chain + struct.pack(">Q", len(chain))
+    block += times + struct.pack(">QQQ", len(times), len(times), FST_STEPS)
+
+    with open(path, "wb") as fh:
+        fh.write(fst_block(fst.FST_BL_HDR, header))
+        if hierarchy:
+            fh.write(fst_block(fst.FST_BL_HIER, struct.pack(">Q", len(records)) + gzip.compress(records)))
+        fh.write(fst_block(fst.FST_BL_GEOM, struct.pack(">QQ", len(geometry), 2) + geometry))
+        fh.write(fst_block(fst.FST_BL_VCDATA, block))
+    if not hierarchy:
+        with open(path + ".hier", "wb") as fh:
+            fh.write(records)
+
+
+class VCDTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "test.vcd")
+        write_vcd(self.path)
+        self.full = self.parse()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def parse(self, start_time=None, cache=False, until=None):
+        parser = VCDParser()
+        tracker = TimestepTracker(until)
+        EveryChange(parser, sensitive=["top_tb.clk"], watch=["top_tb.data"], trackers=[tracker])
+        parser.parse_file(self.path, start_time=start_time, cache=cache)
+        return tracker.seen
+
+
+class StartTimeTest(VCDTestCase):
+    def check_from(self, start_time, cache=False):
+        expected = [seen for seen in self.full if seen[0] >= start_time]
+        self.assertEqual(self.parse(start_time, cache), expected)
+
+    def test_full_parse(self):
+        # the values are those from before the timestep
+        self.assertEqual(self.full[2], (20, 10, ("b", "1")))
+        self.assertEqual(self.full[20][:2], (220, 210))
+
+    def test_start_time_between_markers(self):
+        self.check_from(1234)
+
+    def test_start_time_on_marker(self):
+        self.check_from(1230)
+
+    def test_start_time_after_empty_timesteps(self):
+        self.check_from(220)
+
+    def test_cached_start_time_on_marker(self):
+        self.check_from(1230, cache=True)
+        # again, from the cache written by the first call
+        self.check_from(1230, cache=True)
+
+    def test_first_and_last_change(self):
+        parser = VCDParser()
+        EveryChange(parser, sensitive=["top_tb.done"])
+        parser.map_file(self.path)
+        try:
+            self.assertEqual(parser.first_change("top_tb.done", "1"), 1500)
+            self.assertEqual(parser.last_change("top_tb.done", "1"), 3000)
+            self.assertEqual(parser.first_change("top_tb.done"), 0)
+        finally:
+            parser.close()
+
+
+class ParallelTest(VCDTestCase):
+    def setUp(self):
+        super().setUp()
+        # a small stride, so that the file is cut into several shards
+        with open(self.path, "rb") as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            VCDTimeIndex.build(self.path, data, VCDParser.definitions_end(data), stride=256).save()
+            data.close()
+
+    def parse_parallel(self, until=None):
+        parser = VCDParser()
+        tracker = TimestepTracker(until)
+        EveryChange(parser, sensitive=["top_tb.clk"], watch=["top_tb.data"], trackers=[tracker])
+        parser.parse_parallel(self.path, jobs=4)
+        return tracker
+
+    def test_parallel(self):
+        self.assertEqual(self.parse_parallel().seen, self.full)
+
+    def test_parallel_finished(self):
+        tracker = self.parse_parallel(until=1000)
+        self.assertTrue(tracker.finished)
+        self.assertEqual(tracker.seen, self.parse(until=1000))
+
+
+class FSTTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.vcd = os.path.join(self.dir, "test.vcd")
+        self.fst = os.path.join(self.dir, "test.fst")
+        write_fst_vcd(self.vcd)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def parse(self, path, **kwargs):
+        parser = VCDParser()
+        tracker = TimestepTracker()
+        EveryChange(parser, sensitive=["top_tb.clk"], watch=["top_tb.data"], trackers=[tracker])
+        parser.parse_file(path, **kwargs)
+        return tracker.seen
+
+    def test_same_as_vcd(self):
+        write_fst(self.fst)
+        expected = self.parse(self.vcd)
+        # every timestep, the last one included, though no marker follows it
+        self.assertEqual([now for now, then, data in expected], [step * 10 for step in range(FST_STEPS)])
+        self.assertEqual(self.parse(self.fst), expected)
+        self.assertEqual(self.parse(self.vcd, cache=True), expected)
+
+    def test_hierarchy_sidecar(self):
+        write_fst(self.fst, hierarchy=False)
+        self.assertEqual(self.parse(self.fst), self.parse(self.vcd))
+        os.remove(self.fst + ".hier")
+        with self.assertRaisesRegex(ValueError, "no hierarchy block"):
+            self.parse(self.fst)
+
+
+# id codes and declarations of the nets in `write_design`
+DESIGN_NETS = [
+    ("!", 1, "top_tb", "clk"),
+    ("#", 1, "top_tb", "en"),
+    ('"', 8, "top_tb", "data"),
+    ("$", 70, "top_tb.dut", "wide"),
+    ("%", 4, "top_tb.dut", "nib"),
+    ("&", 1, "top_tb.dut.core", "busy"),
+]
+DESIGN_STEPS = 40
+
+
+def design_steps():
+    """[(time, {id: value as written})]: `clk` toggles every step from X, `en` is
+    high over steps 10-19 and 30-34, `data` changes every step, and the others change
+    now and then, with X and Z bits"""
+    steps = [(0, {"!": "x", "#": "0", '"': "b0", "$": "bx", "%": "bz", "&": "0"})]
+    en = "0"
+    for step in range(1, DESIGN_STEPS):
+        changes = {"!": str(step & 1), '"': "b{:b}".format((step * 7) & 0xFF)}
+        high = "1" if 10 <= step < 20 or 30 <= step < 35 else "0"
+        if high != en:
+            changes["#"] = en = high
+        changes.update({
+            2: {"$": "b1" + "0" * 69},
+            3: {"%": "b1z"},
+            4: {"%": "b1010"},
+            5: {"&": "1"},
+            6: {"$": "b1x0"},
+            8: {"%": "b0101"},
+            25: {"&": "0"},
+        }.get(step, {}))
+        steps.append((step * 10, changes))
+    return steps
+
+
+def write_design(path, steps=None, pause=0):
+    """A VCD of `design_steps` with nested scopes, closed by a marker with no changes
+    at DESIGN_STEPS * 10; with `pause`, written slowly, as a simulator would"""
+    with open(path, "w") as fh:
+        fh.write("$timescale 1ps $end\n")
+        scope = []
+        for id, width, scope_path, name in DESIGN_NETS:
+            levels = scope_path.split(".")
+            while scope != levels[: len(scope)]:
+                fh.write("$upscope $end\n")
+                scope.pop()
+            for level in levels[len(scope):]:
+                fh.write("$scope module {} $end\n".format(level))
+                scope.append(level)
+            fh.write("$var wire {} {} {} $end\n".format(width, id, name))
+        fh.write("$upscope $end\n" * len(scope) + "$enddefinitions $end\n")
+        for at, changes in design_steps() if steps is None else steps:
+            fh.write("#{}\n".format(at))
+            for id, value in changes.items():
+                fh.write("{}{}{}\n".format(value, " " if value[0] == "b" else "", id))
+            if pause:
+                fh.flush()
+                time.sleep(pause)
+        fh.write("#{}\n".format(DESIGN_STEPS * 10))
+
+
+def stored(value):
+    """A value as written by `write_design`, in the form the parser stores it"""
+    return ("b", value[1:]) if value[0] == "b" else value
+
+
+class Sampler(VCDTracker):
+    """Records (now, value of `top_tb.data`) at every notification"""
+
+    def start(self):
+        self.seen = []
+
+    def update(self):
+        self.seen.append((self.parser.now, self["top_tb.data"]))
+
+
+def reference_samples(edge, gated=False):
+    """What a watcher on `clk` edges to `edge` sees: the time, and `data` as it was
+    before the timestep, only while `en` was high before it if `gated`"""
+    before = {"!": "x", "#": "x", '"': "x"}
+    seen = []
+    for at, changes in design_steps():
+        clk = changes.get("!")
+        if clk == edge and before["!"] != edge and (not gated or before["#"] == "1"):
+            seen.append((at, stored(before['"']) if before['"'] != "x" else "x"))
+        for id in before:
+            if id in changes:
+                before[id] = changes[id]
+    return seen
+
+
+class DesignTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "design.vcd")
+        write_design(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+class GlobTest(DesignTestCase):
+    def setUp(self):
+        super().setUp()
+        self.parser = VCDParser().map_file(self.path)
+
+    def tearDown(self):
+        self.parser.close()
+        super().tearDown()
+
+    def names(self, pattern):
+        return sorted(self.parser.get_ids(pattern))
+
+    def test_one_level(self):
+        self.assertEqual(self.names("top_tb.*"), ["top_tb.clk", "top_tb.data", "top_tb.en"])
+        self.assertEqual(self.names("top_tb.d?t.n[a-z]b"), ["top_tb.dut.nib"])
+
+    def test_subtree(self):
+        self.assertEqual(self.names("top_tb.dut.**"), ["top_tb.dut.core.busy", "top_tb.dut.nib", "top_tb.dut.wide"])
+        self.assertEqual(self.names("top_tb.**.busy"), ["top_tb.dut.core.busy"])
+        self.assertEqual(len(self.names("**")), len(DESIGN_NETS))
+
+    def test_no_match(self):
+        self.assertEqual(self.names("top_tb.core.*"), [])
+        with self.assertRaises(ValueError):
+            self.parser.resolve_ids(["top_tb.**.missing*"])
+
+
+class DecodeTest(unittest.TestCase):
+    def test_known(self):
+        self.assertEqual(v2int("1"), (1, 0))
+        self.assertEqual(v2int(("b", "0101"), 4), (5, 0))
+        self.assertEqual(v2d(("b", "1x1")), 0b101)
+        self.assertEqual(decode(("r", "1.5")), (1.5, 0))
+
+    def test_unknown_masks(self):
+        self.assertEqual(v2int("x"), (0, 1))
+        self.assertEqual(v2int(("b", "1z0x")), (0b1000, 0b0101))
+        # short values extend with X/Z when their leftmost bit is, otherwise with 0
+        self.assertEqual(v2int(("b", "x"), 4), (0, 0b1111))
+        self.assertEqual(v2int(("b", "z1"), 4), (1, 0b1110))
+        self.assertEqual(v2int(("b", "1z"), 4), (0b10, 0b01))
+
+
+class EdgeWatcherTest(DesignTestCase):
+    def sample(self, watcher_class, **kwargs):
+        parser = VCDParser()
+        sampler = Sampler()
+        watcher_class(parser, "top_tb.clk", watch=["top_tb.data"], trackers=[sampler], **kwargs)
+        parser.parse_file(self.path)
+        return sampler.seen
+
+    def test_rising(self):
+        self.assertEqual(self.sample(RisingEdgeWatcher), reference_samples("1"))
+
+    def test_falling(self):
+        self.assertEqual(self.sample(FallingEdgeWatcher), reference_samples("0"))
+
+    def test_gated(self):
+        seen = self.sample(RisingEdgeWatcher, enable="top_tb.en")
+        self.assertEqual(seen, reference_samples("1", gated=True))
+        self.assertTrue(seen)
+
+    def test_gated_any_change(self):
+        parser = VCDParser()
+        sampler = Sampler()
+        GatedWatcher(parser, sensitive=["top_tb.clk"], enable="top_tb.en", watch=["top_tb.data"], trackers=[sampler])
+        parser.parse_file(self.path)
+        expected = sorted(reference_samples("1", gated=True) + reference_samples("0", gated=True))
+        self.assertEqual(sampler.seen, expected)
+
+
+class FollowTest(DesignTestCase):
+    def setUp(self):
+        super().setUp()
+        self.expected = self.sample(lambda parser: parser.parse_file(self.path))
+        self.live = os.path.join(self.dir, "live.vcd")
+        self.writer = threading.Thread(target=write_design, args=(self.live,), kwargs={"pause": 0.002})
+
+    def tearDown(self):
+        self.writer.join()
+        super().tearDown()
+
+    def sample(self, parse, tracker=None):
+        parser = VCDParser()
+        tracker = tracker or Sampler()
+        RisingEdgeWatcher(parser, "top_tb.clk", watch=["top_tb.data"], trackers=[tracker])
+        parse(parser)
+        return tracker.seen
+
+    def test_follow(self):
+        self.writer.start()
+        seen = self.sample(lambda parser: parser.follow(self.live, alive=self.writer.is_alive, poll=0.001))
+        self.assertEqual(seen, self.expected)
+
+    def test_follow_until_finished(self):
+        class Until(Sampler):
+            def update(self):
+                super().update()
+                self.finished = self.parser.now >= 150
+
+        self.writer.start()
+        seen = self.sample(lambda parser: parser.follow(self.live, poll=0.001), Until())
+        self.assertEqual(seen, [sample for sample in self.expected if sample[0] <= 150])
+
+
+class HistoryTest(DesignTestCase):
+    def test_wide_and_unknown(self):
+        histories = VCDParser().extract_history(self.path, ["top_tb.dut.wide", "top_tb.dut.nib"])
+        wide = histories["top_tb.dut.wide"]
+        self.assertEqual(list(wide.times), [0, 20, 60])
+        self.assertEqual(wide.words, 2)
+        self.assertEqual(list(wide.values), [0, 0, 0, 1 << 5, 0b100, 0])
+        self.assertEqual(list(wide.unknown), [(1 << 64) - 1, (1 << 6) - 1, 0, 0, 0b010, 0])
+        nib = histories["top_tb.dut.nib"]
+        self.assertEqual(list(nib.times), [0, 30, 40, 80])
+        self.assertEqual(list(nib.values), [0, 0b10, 0b1010, 0b0101])
+        self.assertEqual(list(nib.unknown), [0b1111, 0b01, 0, 0])
+
+
+class StatsTest(DesignTestCase):
+    def test_toggles_and_high_time(self):
+        stats = VCDParser().collect_stats(self.path, ["top_tb.clk", "top_tb.data", "top_tb.dut.**"])
+        rows = {row[0]: row for row in stats.rows()}
+        end = DESIGN_STEPS * 10
+
+        # clk: X, then 1 at odd steps; the X to 1 change is not a toggle
+        net, width, changes, toggles, high_time, duty, first, last = rows["top_tb.clk"]
+        self.assertEqual((changes, toggles, high_time, first, last), (DESIGN_STEPS, DESIGN_STEPS - 2, end // 2, 0, end - 10))
+        self.assertEqual(duty, 0.5)
+
+        data = [(step * 7) & 0xFF for step in range(DESIGN_STEPS)]
+        toggles = sum(bin(a ^ b).count("1") for a, b in zip(data, data[1:]))
+        high_time = 10 * sum(1 for value in data if value)
+        self.assertEqual(rows["top_tb.data"][2:5], (DESIGN_STEPS, toggles, high_time))
+
+        # busy: high from step 5 to 25
+        self.assertEqual(rows["top_tb.dut.core.busy"][2:5], (3, 2, 200))
+        # nib: ZZZZ, 001Z, 1010, 0101; only bits known on both sides toggle (1, then 4)
+        self.assertEqual(rows["top_tb.dut.nib"][2:5], (4, 5, end - 30))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,6 +15,11 @@ class VCDTracker:
     """Abstract tracker class. Subclass this to implement a tracker.
     Examples are provided."""
 
+    # Trackers whose results can be computed independently over time shards of the
+    # VCD and combined afterwards (counters, histograms) set this to True and
+    # implement `merge`. See `VCDParser.parse_parallel`.
+    shard_safe = False
+
     def __init__(self, watcher=None):
         self.watcher = watcher
         self.parser = None
@@ -34,6 +39,11 @@ class VCDTracker:
         id = self.watcher.get_id(name)
         return id
 
+    def decode(self, name):
+        """The watched signal's current value as (number, unknown mask); see
+        `VCDWatcher.decode`"""
+        return self.watcher.decode(name, self.values)
+
     def start(self):
         raise NotImplemented
 
@@ -45,3 +55,10 @@ class VCDTracker:
 
     def update(self):
         raise NotImplemented
+
+    def merge(self, other):
+        """Fold in the results of a copy of this tracker that ran over the next
+        time shard. Subclasses extend this to combine their own results; no
+        shard is merged after one that finished."""
+        self.trigger_count += other.trigger_count
+        self.finished = self.finished or other.finished
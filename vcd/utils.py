@@ -11,10 +11,40 @@
 # the License.
 
 
+UNKNOWN_BITS = str.maketrans("01xXzZ", "001111")
+KNOWN_BITS = str.maketrans("xXzZ", "0000")
+
+
 def v2d(value):
-    fmt, data = value
-    if fmt == "b":
-        return eval("0b" + data)
-    if fmt == "h":
-        return eval("0x" + data)
-    return eval(data)
+    """Convert a VCD value to a number: an int for scalars and binary vectors, with
+    X/Z bits read as 0 (use `decode` to get them as a mask), a float for reals"""
+    if isinstance(value, tuple):
+        fmt, data = value
+        if fmt == "r":
+            return float(data)
+        if fmt == "h":
+            return int(data.translate(KNOWN_BITS), 16)
+    return v2int(value)[0]
+
+
+def decode(value, width=1):
+    """Convert any VCD value to (number, unknown): `v2int` for scalars and binary
+    vectors, (float, 0) for reals"""
+    if isinstance(value, tuple) and value[0] == "r":
+        return float(value[1]), 0
+    return v2int(value, width)
+
+
+def v2int(value, width=1):
+    """Convert a scalar or binary vector value to (number, unknown), where X/Z bits
+    are 0 in `number` and set in the `unknown` mask. Values shorter than `width`
+    are extended as the VCD format specifies: with X/Z if the leftmost bit is X/Z,
+    otherwise with 0."""
+    bits = value if isinstance(value, str) else value[1]
+    number = int(bits.translate(KNOWN_BITS), 2)
+    if bits.isdigit():
+        return number, 0
+    unknown = int(bits.translate(UNKNOWN_BITS), 2)
+    if bits[0] in "xXzZ" and len(bits) < width:
+        unknown |= ((1 << width) - 1) ^ ((1 << len(bits)) - 1)
+    return number, unknown
@@ -10,12 +10,15 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+from .utils import decode
+
 
 class VCDWatcher:
     """Signal watching class, intended to work with the `VCDParser` class.
 
     Provide a list of XMRs that the watcher is sensitive to (i.e., a clock to sample on) 
-    and a list of signals to actually watch.
+    and a list of signals to actually watch. Glob patterns such as `top_tb.dut.engine.*`
+    (or `.**` for a whole subtree) are expanded once the VCD definitions are parsed.
 
     The VCD parser will call `watcher.should_notify` when it sees a change to a signal 
     on the sensitivity list and provide the changes to all watched signals. You can
@@ -39,6 +42,8 @@ class VCDWatcher:
         self._watching_ids = []
         self.values = None
         self.activity = None
+        self._widths = {}
+        self._decoded = {}
 
         self.trackers = [] + trackers
         for tracker in self.trackers:
@@ -71,6 +76,11 @@ class VCDWatcher:
         """Parser access function for watch list ids"""
         return list(self._watching_ids.values())
 
+    def get_trigger(self):
+        """Parser access function for the conditions it checks itself before
+        notifying: (edge values, (enable id, enable values)), either may be None"""
+        return None, None
+
     def get_id(self, signal):
         """Look up the signal id from a signal name and optional path"""
         if signal in self._watching_ids:
@@ -78,23 +88,38 @@ class VCDWatcher:
         else:
             return None
 
+    def decode(self, signal, values=None):
+        """Decode a watched signal's value (from `values`, default the current ones)
+        to (number, unknown), where X/Z bits are 0 in number and set in the unknown
+        mask. Decoding happens on demand and is memoized per signal, so a bus that
+        holds its value is only converted once."""
+        id = self.get_id(signal)
+        value = (self.values if values is None else values)[id]
+        cached = self._decoded.get(id)
+        if cached is not None and cached[0] == value:
+            return cached[1]
+        result = decode(value, self._widths.get(id, 1))
+        self._decoded[id] = (value, result)
+        return result
+
     def get2val(self, signal):
-        """Attempt to convert a scalar to a numerical 0/1 value"""
+        """Attempt to convert a value to a number, raising ValueError if it has X/Z bits"""
         id = self.get_id(signal)
         if id in self.values:
-            value = self.values[id]
-            if value in "xXzZ":
+            number, unknown = self.decode(signal, self.values)
+            if unknown:
                 raise ValueError
-            return eval(value)
+            return number
 
     def get_active_2val(self, signal):
-        """Attempt to convert a scalar to a numerical 0/1 value"""
+        """Attempt to convert a value that just changed to a number, raising
+        ValueError if it has X/Z bits"""
         id = self.get_id(signal)
         if id in self.activity:
-            value = self.activity[id]
-            if value in "xXzZ":
+            number, unknown = self.decode(signal, self.activity)
+            if unknown:
                 raise ValueError
-            return eval(value)
+            return number
 
     def add_sensitive(self, signal):
         """Add a signal to the sensitivity and watch lists"""
@@ -119,11 +144,70 @@ class VCDWatcher:
 
     def update_ids(self):
         """Callback after VCD header is parsed, to extract signal ids"""
-        self._sensitive_ids = {xmr: self.parser.get_id(xmr) for xmr in self.sensitive}
-        self._watching_ids = {xmr: self.parser.get_id(xmr) for xmr in self.watching}
+        self._sensitive_ids = self.parser.resolve_ids(self.sensitive)
+        self._watching_ids = self.parser.resolve_ids(self.watching)
+        self._widths = {
+            id: int(self.parser.idcode2references[id][0][1])
+            for id in self._watching_ids.values()
+        }
+        self._decoded = {}
 
     # Subclass and override this method to gate tracker updating
     # (for instance, only on rising clock edges)
     def should_notify(self):
         # Called every time something in the sensitivity list changes
-        return true
+        return True
+
+
+# Values of a 1-bit net that count as high or low, as scalar or vector changes
+HIGH = frozenset(("1", ("b", "1")))
+LOW = frozenset(("0", ("b", "0")))
+
+
+class GatedWatcher(VCDWatcher):
+    """Watcher that only notifies while a 1-bit `enable` signal is high.
+
+    The enable is sampled as it was just before the timestep, like a flop would see
+    it. The parser evaluates the condition itself, so changes while the enable is
+    low cost no Python calls at all. Subclasses set `edge` to the values of the
+    sensitive signals that count as a trigger (None for any change).
+    """
+
+    edge = None
+
+    def __init__(self, parser, sensitive=[], enable=None, watch=[], trackers=[]):
+        self.enable = enable
+        self._enable_id = None
+        if enable is not None:
+            watch = list(watch) + [enable]
+        super().__init__(parser, sensitive=sensitive, watch=watch, trackers=trackers)
+
+    def get_trigger(self):
+        enable = None
+        if self._enable_id is not None:
+            enable = (self._enable_id, HIGH)
+        return self.edge, enable
+
+    def update_ids(self):
+        super().update_ids()
+        if self.enable is not None:
+            self._enable_id = self.parser.get_id(self.enable)
+
+
+class RisingEdgeWatcher(GatedWatcher):
+    """Watcher that notifies on rising edges of `clock`, optionally only while
+    `enable` is high, e.g. `RisingEdgeWatcher(parser, "top_tb.clk", watch=[...])`"""
+
+    edge = HIGH
+
+    def __init__(self, parser, clock, watch=[], trackers=[], enable=None):
+        super().__init__(
+            parser, sensitive=[clock], enable=enable, watch=watch, trackers=trackers
+        )
+
+
+class FallingEdgeWatcher(RisingEdgeWatcher):
+    """Watcher that notifies on falling edges of `clock`, optionally only while
+    `enable` is high"""
+
+    edge = LOW